@@ -0,0 +1,148 @@
+# /config/workspace/todo-app/backend/benchmarks/codec_benchmark.py
+"""
+Compares encode/decode time of the available JSON codecs on real dsar.bpmn workflow states.
+
+Does not need a database; the workflows are built in memory and serialized with the
+same registry the app uses.
+
+    python benchmarks/codec_benchmark.py [--iterations 200] [--payload-kb 0]
+
+--payload-kb pads the website account data to approximate workflows with large task data
+(task data is copied to every task, so this grows the dict much faster than it sounds).
+"""
+import argparse
+import datetime
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from SpiffWorkflow import TaskState
+from SpiffWorkflow.bpmn import BpmnWorkflow
+from SpiffWorkflow.bpmn.specs.event_definitions.message import MessageEventDefinition
+from SpiffWorkflow.bpmn.util import BpmnEvent
+from SpiffWorkflow.bpmn.script_engine import PythonScriptEngine, TaskDataEnvironment
+from SpiffWorkflow.bpmn.serializer.workflow import BpmnWorkflowSerializer
+from SpiffWorkflow.spiff.parser import SpiffBpmnParser
+from SpiffWorkflow.spiff.serializer import DEFAULT_CONFIG
+
+from workflows.scripts.dsar import validate_website_account, formulate_dsar_email, DSAR_REQUEST_SENT_MESSAGE
+from workflows.serializer.codec import CODECS, available_codecs
+
+BPMN_FILE = os.path.join(os.path.dirname(__file__), '..', 'workflows', 'definitions', 'dsar.bpmn')
+
+
+def build_states(payload_kb):
+    """
+    Returns [(label, dict)] for the spec and for a DSAR workflow at its main stable points.
+    Raises RuntimeError if the workflow does not reach one of them.
+    """
+    parser = SpiffBpmnParser()
+    parser.add_bpmn_files([BPMN_FILE])
+    spec = parser.get_spec('Process_DSAR_Request')
+    script_engine = PythonScriptEngine(environment=TaskDataEnvironment({
+        'datetime': datetime,
+        'validate_website_account': validate_website_account,
+        'formulate_dsar_email': formulate_dsar_email,
+    }))
+    serializer = BpmnWorkflowSerializer(BpmnWorkflowSerializer.configure(DEFAULT_CONFIG))
+
+    account_info = {
+        'id': 1,
+        'user_id': 1,
+        'website_url': 'https://admin-sample-site.com',
+        'account_name': 'Admin Sample Account',
+        'account_email': 'admin@sample-site.com',
+        'compliance_contact': 'compliance@sample-site.com',
+        'notes': 'x' * (payload_kb * 1024),
+    }
+    workflow = BpmnWorkflow(spec, script_engine=script_engine)
+    workflow.get_tasks(state=TaskState.READY)[0].data['website_account_info'] = account_info
+
+    states = [('spec', serializer.to_dict(spec)), ('started', serializer.to_dict(workflow))]
+
+    # Validate, formulate and send (the send task only queues the email), then wait for the sender
+    run_until_stable(workflow)
+    expect_waiting(workflow, 'Event_RequestSent')
+    states.append(('waiting on send', serializer.to_dict(workflow)))
+
+    # Deliver the message the outbox sender sends once the email is out, as BpmnEngine.send_message does
+    event_definition = next(
+        task.task_spec.event_definition for task in workflow.get_tasks(state=TaskState.WAITING)
+        if isinstance(getattr(task.task_spec, 'event_definition', None), MessageEventDefinition)
+        and task.task_spec.event_definition.name == DSAR_REQUEST_SENT_MESSAGE
+    )
+    workflow.send_event(BpmnEvent(event_definition, {'gmail_message_id': 'benchmark'}))
+    run_until_stable(workflow)
+    expect_waiting(workflow, 'Event_WaitForResponse')
+    states.append(('waiting on timer', serializer.to_dict(workflow)))
+
+    # Fire the P30D timer by moving its fire time into the past
+    for task in workflow.get_tasks(state=TaskState.WAITING):
+        if 'event_value' in task.internal_data:
+            task.internal_data['event_value'] = datetime.datetime(2000, 1, 1, tzinfo=datetime.timezone.utc).isoformat()
+    run_until_stable(workflow)
+    expect_waiting(workflow, 'Task_CheckAndReceiveData')
+
+    # Complete the manual steps (check for and store the data file) as the user would
+    run_until_stable(workflow, manual=None)
+    if not workflow.completed:
+        raise RuntimeError(f"Expected the workflow to complete, it waits on {waiting_on(workflow)}")
+    states.append(('completed', serializer.to_dict(workflow)))
+    return states
+
+
+def run_until_stable(workflow, manual=False):
+    # Runs every ready task that needs no user, like Instance.run_until_user_input_required
+    # (manual=None runs the user's tasks as well)
+    workflow.refresh_timers()
+    task = workflow.get_next_task(state=TaskState.READY, manual=manual)
+    while task is not None:
+        task.run()
+        workflow.refresh_timers()
+        task = workflow.get_next_task(state=TaskState.READY, manual=manual)
+
+
+def waiting_on(workflow):
+    return sorted(task.task_spec.name for task in workflow.get_tasks(state=TaskState.READY | TaskState.WAITING))
+
+
+def expect_waiting(workflow, task_name):
+    # The samples are only meaningful if the workflow really stopped where the label says
+    if waiting_on(workflow) != [task_name]:
+        raise RuntimeError(f"Expected the workflow to wait on {task_name}, it waits on {waiting_on(workflow)}")
+
+
+def bench(codec, dct, iterations):
+    encoded = codec.dumps(dct)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        codec.dumps(dct)
+    encode_ms = (time.perf_counter() - started) * 1000 / iterations
+    started = time.perf_counter()
+    for _ in range(iterations):
+        codec.loads(encoded)
+    decode_ms = (time.perf_counter() - started) * 1000 / iterations
+    return len(encoded.encode('utf-8')), encode_ms, decode_ms
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--iterations', type=int, default=200)
+    arg_parser.add_argument('--payload-kb', type=int, default=0)
+    args = arg_parser.parse_args()
+
+    states = build_states(args.payload_kb)
+    codecs = [CODECS[name]() for name in available_codecs()]
+    print(f"Codecs: {', '.join(codec.name for codec in codecs)}; {args.iterations} iterations each\n")
+    print(f"{'state':<18} {'codec':<8} {'bytes':>10} {'encode ms':>10} {'decode ms':>10} {'pretty bytes':>13}")
+    for label, dct in states:
+        for codec in codecs:
+            size, encode_ms, decode_ms = bench(codec, dct, args.iterations)
+            pretty_size = len(codec.dumps(dct, pretty=True).encode('utf-8'))
+            print(f"{label:<18} {codec.name:<8} {size:>10} {encode_ms:>10.3f} {decode_ms:>10.3f} {pretty_size:>13}")
+
+
+if __name__ == '__main__':
+    main()
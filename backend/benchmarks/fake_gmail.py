@@ -0,0 +1,238 @@
+# /config/workspace/todo-app/backend/benchmarks/fake_gmail.py
+"""
+A local stand-in for the parts of the Gmail API that utils/email.py uses.
+
+    python benchmarks/fake_gmail.py [--port 8081] [--latency-ms 200] [--messages 50]
+
+Serves messages.list/get/send, users.getProfile, users.history.list (messageAdded)
+and the batch endpoint for any user id, answering each HTTP request after
+--latency-ms to imitate the round trip to Google (a batch costs one round trip,
+like the real one). Point the API at it with GMAIL_API_ENDPOINT=http://localhost:8081/
+(no OAuth is done then). POST /fake/messages with {"from", "to", "subject", "body"}
+delivers a message to the inbox, e.g. a website's reply to a DSAR request.
+
+With a fixed latency the request rate a worker configuration can sustain shows
+how many Gmail calls it keeps in flight. For example, against a sync worker and
+against a gevent worker:
+
+    GMAIL_API_ENDPOINT=http://localhost:8081/ gunicorn app:app
+    GMAIL_API_ENDPOINT=http://localhost:8081/ GUNICORN_WORKER_CLASS=gevent gunicorn app:app
+    python benchmarks/load_test.py --scenario gmail --concurrency 50 --duration 15
+
+A sync worker completes at most one call per latency period; a gevent worker
+keeps up to --concurrency calls waiting at once. benchmarks/gmail_fetch_benchmark.py
+compares per-message, batched and incremental fetching against this server.
+
+Only needs the standard library.
+"""
+import argparse
+import base64
+import email.parser
+import itertools
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+USERS_PATH = re.compile(r'^/(?:gmail/v1/)?users/(?P<user>[^/]+)/(?P<resource>messages|history|profile)(?:/(?P<rest>.*))?$')
+BATCH_PATH = '/batch/gmail/v1'
+# History older than this many records is "expired" (history.list answers 404)
+HISTORY_RETAINED = 10000
+
+
+class Mailbox:
+
+    def __init__(self, count):
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.history_id = 1000
+        # [(history id, message)] of added messages, oldest first
+        self.history = []
+        self.messages = {}
+        for _ in range(count):
+            self.add('sender@example.com', 'me', 'Fake message', 'Hello from the fake Gmail server.', unread=True)
+
+    def add(self, sender, to, subject, body, unread=False):
+        with self._lock:
+            message_id = f'{next(self._ids):016x}'
+            self.history_id += 1
+            message = self.messages[message_id] = {
+                'id': message_id,
+                'threadId': message_id,
+                'labelIds': ['INBOX', 'UNREAD'] if unread else ['SENT'],
+                'snippet': body[:100],
+                'historyId': str(self.history_id),
+                'internalDate': str(int(time.time() * 1000)),
+                'payload': {
+                    'mimeType': 'text/plain',
+                    'headers': [
+                        {'name': 'From', 'value': sender},
+                        {'name': 'To', 'value': to},
+                        {'name': 'Subject', 'value': subject},
+                    ],
+                    'body': {'data': base64.urlsafe_b64encode(body.encode('utf-8')).decode('ascii')},
+                },
+            }
+            self.history.append((self.history_id, message))
+            del self.history[:-HISTORY_RETAINED]
+            return message
+
+    def list(self, unread_only, limit, page_token=None):
+        with self._lock:
+            # Newest first, like Gmail
+            messages = [m for m in reversed(self.messages.values()) if not unread_only or 'UNREAD' in m['labelIds']]
+        start = int(page_token or 0)
+        page = [{'id': m['id'], 'threadId': m['threadId']} for m in messages[start:start + limit]]
+        next_token = str(start + limit) if start + limit < len(messages) else None
+        return page, next_token
+
+    def added_since(self, start_history_id, label_id, limit, page_token=None):
+        """Returns (records, next page token), or None if start_history_id has expired."""
+        with self._lock:
+            if self.history and start_history_id < self.history[0][0] - 1:
+                return None
+            records = [
+                {'id': str(history_id), 'messagesAdded': [{'message': {
+                    'id': m['id'], 'threadId': m['threadId'], 'labelIds': m['labelIds'],
+                }}]}
+                for history_id, m in self.history
+                if history_id > start_history_id and (not label_id or label_id in m['labelIds'])
+            ]
+        start = int(page_token or 0)
+        next_token = str(start + limit) if start + limit < len(records) else None
+        return records[start:start + limit], next_token
+
+
+class Handler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    mailbox = None
+    latency = 0.0
+
+    def _send(self, status, content_type, data):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _reply(self, status, body):
+        self._send(status, 'application/json', json.dumps(body).encode('utf-8'))
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length)
+
+    def handle_api(self, method, target, body):
+        """Answers one API call; returns (status, JSON body). Used directly and inside batches."""
+        path, _, query = target.partition('?')
+        params = {key: values[-1] for key, values in parse_qs(query).items()}
+        match = USERS_PATH.match(path)
+        if not match:
+            return 404, {'error': {'code': 404, 'message': 'Not found'}}
+        resource, rest = match.group('resource'), match.group('rest') or ''
+
+        if resource == 'profile' and method == 'GET':
+            return 200, {
+                'emailAddress': 'me@example.com',
+                'messagesTotal': len(self.mailbox.messages),
+                'historyId': str(self.mailbox.history_id),
+            }
+        if resource == 'history' and method == 'GET':
+            result = self.mailbox.added_since(
+                int(params.get('startHistoryId', 0)), params.get('labelId'),
+                int(params.get('maxResults', 100)), params.get('pageToken'),
+            )
+            if result is None:
+                return 404, {'error': {'code': 404, 'message': 'Requested entity was not found.'}}
+            records, next_token = result
+            response = {'history': records, 'historyId': str(self.mailbox.history_id)}
+            if next_token:
+                response['nextPageToken'] = next_token
+            return 200, response
+        if resource == 'messages' and method == 'GET' and rest == '':
+            unread_only = 'is:unread' in params.get('q', '')
+            messages, next_token = self.mailbox.list(unread_only, int(params.get('maxResults', 100)), params.get('pageToken'))
+            response = {'messages': messages, 'resultSizeEstimate': len(messages)}
+            if next_token:
+                response['nextPageToken'] = next_token
+            return 200, response
+        if resource == 'messages' and method == 'GET':
+            message = self.mailbox.messages.get(rest)
+            if message is None:
+                return 404, {'error': {'code': 404, 'message': 'Requested entity was not found.'}}
+            return 200, message
+        if resource == 'messages' and method == 'POST' and rest == 'send':
+            raw = json.loads(body or b'{}').get('raw', '')
+            text = base64.urlsafe_b64decode(raw + '=' * (-len(raw) % 4)).decode('utf-8', 'replace')
+            message = self.mailbox.add('me', '', 'Sent message', text)
+            return 200, {'id': message['id'], 'threadId': message['threadId'], 'labelIds': ['SENT']}
+        return 404, {'error': {'code': 404, 'message': 'Not found'}}
+
+    def handle_batch(self, body):
+        """Answers a multipart/mixed batch of application/http parts with one multipart response."""
+        document = email.parser.BytesParser().parsebytes(
+            b'Content-Type: ' + self.headers['Content-Type'].encode('ascii') + b'\r\n\r\n' + body
+        )
+        boundary = f'batch_{uuid.uuid4().hex}'
+        out = []
+        for part in document.get_payload():
+            inner = part.get_payload()
+            head, _, inner_body = inner.replace('\r\n', '\n').partition('\n\n')
+            method, target = head.split('\n', 1)[0].split(' ')[:2]
+            status, response = self.handle_api(method, target, inner_body.encode('utf-8'))
+            content_id = (part['Content-ID'] or '').strip('<>')
+            out.append(
+                f'--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <response-{content_id}>\r\n\r\n'
+                f'HTTP/1.1 {status} {"OK" if status == 200 else "Error"}\r\nContent-Type: application/json\r\n\r\n'
+                f'{json.dumps(response)}\r\n'
+            )
+        out.append(f'--{boundary}--\r\n')
+        self._send(200, f'multipart/mixed; boundary={boundary}', ''.join(out).encode('utf-8'))
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        self._reply(*self.handle_api('GET', self.path, b''))
+
+    def do_POST(self):
+        time.sleep(self.latency)
+        body = self._body()
+        if self.path.partition('?')[0] == BATCH_PATH:
+            return self.handle_batch(body)
+        if self.path == '/fake/messages':
+            data = json.loads(body or b'{}')
+            message = self.mailbox.add(
+                data.get('from', 'sender@example.com'), data.get('to', 'me'),
+                data.get('subject', ''), data.get('body', ''), unread=True,
+            )
+            return self._reply(200, message)
+        self._reply(*self.handle_api('POST', self.path, body))
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency-ms', type=float, default=200.0)
+    parser.add_argument('--messages', type=int, default=50, help='Unread messages in the mailbox at start')
+    args = parser.parse_args()
+
+    Handler.mailbox = Mailbox(args.messages)
+    Handler.latency = args.latency_ms / 1000
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    server.daemon_threads = True
+    print(f"Fake Gmail API on http://{args.host}:{args.port}/ ({args.latency_ms:.0f} ms latency)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
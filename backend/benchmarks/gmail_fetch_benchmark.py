@@ -0,0 +1,77 @@
+# /config/workspace/todo-app/backend/benchmarks/gmail_fetch_benchmark.py
+"""
+Compares ways of reading an inbox through utils/email.py against benchmarks/fake_gmail.py.
+
+    python benchmarks/fake_gmail.py --latency-ms 100 --messages 500 &
+    python benchmarks/gmail_fetch_benchmark.py [--endpoint http://localhost:8081/] [--messages 500]
+                                               [--batch-size 50] [--new 20]
+
+  per-message  list the ids, then get_email_details once per id (N+1 calls)
+  batch        list the ids, then get_emails in batches of --batch-size
+  history      deliver --new messages to the fake inbox, then list_new_message_ids
+               from the history id taken before and get_emails for just those
+
+Needs the backend's requirements (google-api-python-client); no database.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import urllib.request
+
+
+def deliver(endpoint, count):
+    for i in range(count):
+        body = json.dumps({'from': 'privacy@example.com', 'subject': f'Re: DSAR {i}', 'body': 'Your data.'}).encode()
+        req = urllib.request.Request(endpoint.rstrip('/') + '/fake/messages', data=body, method='POST')
+        urllib.request.urlopen(req).close()
+
+
+def timed(label, func):
+    started = time.perf_counter()
+    count = func()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<12} {count:6d} message(s) {elapsed * 1000:9.1f} ms")
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--endpoint', default='http://localhost:8081/')
+    parser.add_argument('--messages', type=int, default=500, help='Unread messages to read in the first two runs')
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--new', type=int, default=20, help='Messages delivered before the history run')
+    args = parser.parse_args()
+
+    # utils.email reads the endpoint at import time
+    os.environ['GMAIL_API_ENDPOINT'] = args.endpoint
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from utils.email import GmailUtils
+
+    gmail = GmailUtils()
+    if not gmail.service:
+        raise SystemExit(f"Could not reach the Gmail API at {args.endpoint}")
+
+    def per_message():
+        ids = gmail.list_message_ids('is:unread', limit=args.messages)
+        return sum(1 for message_id in ids if gmail.get_email_details(message_id) is not None)
+
+    def batch():
+        ids = gmail.list_message_ids('is:unread', limit=args.messages)
+        return len(gmail.get_emails(ids, batch_size=args.batch_size))
+
+    history_id = gmail.get_history_id()
+    deliver(args.endpoint, args.new)
+
+    def history():
+        ids, _ = gmail.list_new_message_ids(history_id)
+        return len(gmail.get_emails(ids, batch_size=args.batch_size))
+
+    timed('per-message', per_message)
+    timed('batch', batch)
+    timed('history', history)
+
+
+if __name__ == '__main__':
+    main()
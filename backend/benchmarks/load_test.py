@@ -0,0 +1,166 @@
+# /config/workspace/todo-app/backend/benchmarks/load_test.py
+"""
+Concurrent load test of the /workflows read endpoints against a running API.
+
+    python benchmarks/load_test.py --url http://localhost:5000 [--username admin --password admin]
+                                   [--concurrency 16] [--duration 30] [--seed 0] [--scenario all]
+                                   [--json results.json]
+
+The test user logs in once; each of --concurrency client threads then requests
+the scenario in a loop for --duration seconds. Reports requests/s and latency percentiles per scenario;
+errors are counted, not retried. --seed N first creates N workflows through
+POST /workflows so there is something to page through.
+
+To compare database profiles, start the stack in benchmarks/docker-compose.loadtest.yml
+with different DB_* / GUNICORN_* variables and run this against each, e.g.
+
+    for pool in 2 5 10; do
+        DB_POOL_SIZE=$pool docker compose -f benchmarks/docker-compose.loadtest.yml up -d --build --wait
+        python benchmarks/load_test.py --concurrency 32 --json pool-$pool.json
+        docker compose -f benchmarks/docker-compose.loadtest.yml down
+    done
+
+Only needs the standard library.
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+SCENARIOS = {
+    'page': ('/workflows', {'page': 1, 'per_page': 25}),
+    'deep-page': ('/workflows', {'page': 200, 'per_page': 25}),
+    'cursor': ('/workflows', {'cursor': '', 'per_page': 25}),
+    'filtered': ('/workflows', {'cursor': '', 'per_page': 25, 'workflow_status': 'Running'}),
+    'stats': ('/workflows/stats', {'days': 30}),
+    # Needs GMAIL_API_ENDPOINT pointing at benchmarks/fake_gmail.py; not part of 'all'
+    'gmail': ('/health/list-unread-emails', {'limit': 5}),
+}
+DEFAULT_SCENARIOS = ['page', 'deep-page', 'cursor', 'filtered', 'stats']
+
+
+def request(base_url, method, path, token=None, params=None, body=None, timeout=30):
+    url = base_url.rstrip('/') + path
+    if params:
+        url += '?' + urllib.parse.urlencode(params)
+    data = json.dumps(body).encode('utf-8') if body is not None else None
+    req = urllib.request.Request(url, data=data, method=method)
+    req.add_header('Content-Type', 'application/json')
+    if token:
+        req.add_header('Authorization', f'Bearer {token}')
+    with urllib.request.urlopen(req, timeout=timeout) as response:
+        return response.status, json.loads(response.read() or b'null')
+
+
+def login(base_url, username, password):
+    _, body = request(base_url, 'POST', '/login', body={'username': username, 'password': password})
+    return body['access_token']
+
+
+def seed(base_url, token, count, batch_size=50):
+    """Creates count workflows on the user's website accounts."""
+    _, body = request(base_url, 'GET', '/website-accounts', token, params={'per_page': 100})
+    accounts = body.get('accounts') or []
+    account_ids = [account['id'] for account in accounts]
+    if not account_ids:
+        raise SystemExit('The load test user has no website accounts to start workflows for.')
+    created = 0
+    while created < count:
+        batch = [account_ids[i % len(account_ids)] for i in range(min(batch_size, count - created))]
+        request(base_url, 'POST', '/workflows', token, body={'website_account_ids': batch, 'workflow_type': 'DSAR'})
+        created += len(batch)
+    print(f"Seeded {created} workflow(s).")
+
+
+class Client(threading.Thread):
+
+    def __init__(self, base_url, token, path, params, deadline):
+        super().__init__(daemon=True)
+        self.base_url = base_url
+        self.token = token
+        self.path = path
+        self.params = params
+        self.deadline = deadline
+        self.latencies = []
+        self.errors = 0
+
+    def run(self):
+        while time.monotonic() < self.deadline:
+            started = time.perf_counter()
+            try:
+                request(self.base_url, 'GET', self.path, self.token, params=self.params)
+            except (urllib.error.URLError, OSError, ValueError):
+                self.errors += 1
+                continue
+            self.latencies.append(time.perf_counter() - started)
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run_scenario(base_url, token, name, concurrency, duration):
+    path, params = SCENARIOS[name]
+    deadline = time.monotonic() + duration
+    clients = [Client(base_url, token, path, params, deadline) for _ in range(concurrency)]
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    latencies = sorted(latency for client in clients for latency in client.latencies)
+    return {
+        'scenario': name,
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': sum(client.errors for client in clients),
+        'rps': len(latencies) / duration,
+        'p50_ms': percentile(latencies, 0.50) * 1000 if latencies else None,
+        'p95_ms': percentile(latencies, 0.95) * 1000 if latencies else None,
+        'p99_ms': percentile(latencies, 0.99) * 1000 if latencies else None,
+        'mean_ms': statistics.mean(latencies) * 1000 if latencies else None,
+    }
+
+
+def format_ms(value):
+    return f"{value:8.1f}" if value is not None else '       -'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--username', default='admin')
+    parser.add_argument('--password', default='admin')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds per scenario')
+    parser.add_argument('--seed', type=int, default=0, help='Create this many workflows first')
+    parser.add_argument('--scenario', choices=['all'] + list(SCENARIOS), default='all')
+    parser.add_argument('--json', default=None, help='Also write the results to this file')
+    args = parser.parse_args()
+
+    token = login(args.url, args.username, args.password)
+    if args.seed:
+        seed(args.url, token, args.seed)
+
+    names = DEFAULT_SCENARIOS if args.scenario == 'all' else [args.scenario]
+    print(f"{'scenario':<10} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    results = []
+    for name in names:
+        result = run_scenario(args.url, token, name, args.concurrency, args.duration)
+        results.append(result)
+        print(
+            f"{name:<10} {result['rps']:8.1f} {format_ms(result['p50_ms'])} {format_ms(result['p95_ms'])} "
+            f"{format_ms(result['p99_ms'])} {result['errors']:7d}"
+        )
+    if args.json:
+        with open(args.json, 'w') as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
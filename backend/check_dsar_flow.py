@@ -0,0 +1,85 @@
+# /config/workspace/todo-app/backend/check_dsar_flow.py
+"""
+Smoke check of the DSAR workflow against the configured database.
+
+    python check_dsar_flow.py [--keep]
+
+Starts a DSAR for a made-up website account and checks each stable point:
+the send task queues its email in email_outbox and the workflow waits for the
+"Request Sent" message; delivering that message (as outbox_sender.py does)
+parks the workflow on the 30-day response timer with instance.next_wakeup set,
+so the timer scheduler will wake it. Nothing is sent. The workflow is deleted
+afterwards unless --keep is given. Exits with status 1 on the first failed check.
+"""
+import argparse
+import datetime
+import logging
+import sys
+
+from app import app, db, engine, dsar_spec_id
+from models.email_outbox import OutboxEmail, OUTBOX_PENDING
+from models.instance import Instance
+from workflows.scripts.dsar import DSAR_REQUEST_SENT_MESSAGE
+
+logger = logging.getLogger('check_dsar_flow')
+
+ACCOUNT_INFO = {
+    'id': 0,
+    'user_id': 0,
+    'website_url': 'https://dsar-check.example.com',
+    'account_name': 'DSAR Check',
+    'account_email': 'dsar-check@example.com',
+    'compliance_contact': 'privacy@example.com',
+}
+
+
+def check(condition, message):
+    if not condition:
+        logger.error(f"FAILED: {message}")
+        sys.exit(1)
+    logger.info(f"ok: {message}")
+
+
+def waiting_on(wf_id):
+    return sorted(task.task_spec.name for task in engine.get_workflow(wf_id).waiting_tasks)
+
+
+def run_checks(wf_id):
+    check(waiting_on(wf_id) == ['Event_RequestSent'], "the workflow waits for the Request Sent message")
+    emails = OutboxEmail.query.filter_by(workflow_id=wf_id).all()
+    check(
+        len(emails) == 1 and emails[0].status == OUTBOX_PENDING and emails[0].to_email == ACCOUNT_INFO['compliance_contact'],
+        "the send task queued one email to the compliance contact",
+    )
+
+    delivered = engine.send_message(DSAR_REQUEST_SENT_MESSAGE, {'gmail_message_id': 'check'}, wf_ids=[wf_id])
+    check(delivered == [wf_id], "the completion message resumed the workflow")
+    check(waiting_on(wf_id) == ['Event_WaitForResponse'], "the workflow is parked on the response timer")
+
+    db.session.expire_all()
+    next_wakeup = db.session.get(Instance, wf_id).next_wakeup
+    check(next_wakeup is not None, "instance.next_wakeup is set")
+    days = (next_wakeup - datetime.datetime.now(datetime.timezone.utc)).days
+    check(29 <= days <= 30, f"the timer fires in about 30 days ({next_wakeup})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--keep', action='store_true', help='Keep the workflow instead of deleting it')
+    args = parser.parse_args()
+
+    with app.app_context():
+        instance = engine.start_workflows(dsar_spec_id, [{'website_account_info': ACCOUNT_INFO}])[0]
+        try:
+            instance.run_until_user_input_required()
+            run_checks(instance.wf_id)
+            logger.info("DSAR flow check passed.")
+        finally:
+            if args.keep:
+                logger.info(f"Kept workflow {instance.wf_id}.")
+            else:
+                engine.delete_workflow(instance.wf_id)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+# /config/workspace/todo-app/backend/gunicorn.conf.py
+# Loaded by gunicorn from the working directory. Each worker process has its own
+# database pool (DB_POOL_SIZE + DB_MAX_OVERFLOW, see utils/db_profile.py), which
+# should be at least GUNICORN_THREADS so threads do not queue for connections.
+#
+# GUNICORN_WORKER_CLASS=gevent serves up to GUNICORN_WORKER_CONNECTIONS requests per
+# worker as greenlets: sockets (Gmail API calls, advisory lock waits) are patched by
+# gunicorn and psycopg2 is made cooperative below (DATABASE_URL must use the psycopg2
+# driver), so a request waiting on I/O does not hold the worker. Size the database pool for the requests that run queries at
+# once, not for GUNICORN_WORKER_CONNECTIONS.
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('GUNICORN_WORKERS', 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+# 'sync' for one thread per worker, 'gthread' when GUNICORN_THREADS > 1, or 'gevent'
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread' if threads > 1 else 'sync')
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 2))
+
+
+def post_fork(server, worker):
+    # Runs before the worker imports the app, so every database connection is opened
+    # in green mode; psycopg2 would otherwise block the whole worker on each query
+    if worker_class == 'gevent':
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+        server.log.info(f"Worker {worker.pid}: psycopg2 patched for gevent.")
+
+
+def post_worker_init(worker):
+    # The patch only covers psycopg2; any other driver blocks the worker on every query
+    if worker_class == 'gevent':
+        from app import app, db
+        with app.app_context():
+            driver = db.engine.dialect.driver
+        if driver != 'psycopg2':
+            worker.log.warning(
+                f"Worker {worker.pid}: the database driver is {driver}, not psycopg2, so queries are not "
+                f"cooperative under gevent. Use a postgresql+psycopg2:// DATABASE_URL."
+            )
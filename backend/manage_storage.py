@@ -0,0 +1,124 @@
+# /config/workspace/todo-app/backend/manage_storage.py
+"""
+Workflow storage maintenance.
+
+    python manage_storage.py measure [--sample 200]
+    python manage_storage.py migrate --to binary|jsonb [--batch-size 200] [--limit N]
+
+measure compares the stored size and load time of the JSONB and binary formats on a
+sample of existing workflows. migrate rewrites _workflow rows into the other format
+online: each batch is a short transaction and rows locked by a running save are
+skipped and picked up on a later pass. Set WORKFLOW_STORAGE to the target format
+before migrating so that live saves do not write the old format back.
+"""
+import argparse
+import json
+import logging
+import time
+
+from sqlalchemy import func
+
+from app import app, db, serializer
+from models.workflow import Workflow
+
+logger = logging.getLogger('manage_storage')
+
+
+def migrate(target, batch_size, limit=None):
+    to_binary = target == 'binary'
+    source_column = Workflow.serialization if to_binary else Workflow.serialization_bin
+    migrated = 0
+    while limit is None or migrated < limit:
+        size = batch_size if limit is None else min(batch_size, limit - migrated)
+        records = (
+            Workflow.query
+            .filter(source_column.isnot(None))
+            .limit(size)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        if not records:
+            break
+        for record in records:
+            dct = serializer._get_document(record)
+            if to_binary:
+                record.serialization_bin = serializer.binary_format.dumps(dct)
+                record.serialization = None
+            else:
+                record.serialization = dct
+                record.serialization_bin = None
+        db.session.commit()
+        migrated += len(records)
+        logger.info(f"Migrated {migrated} workflow row(s) to {target}.")
+    return migrated
+
+
+def measure(sample):
+    totals = db.session.query(
+        func.count(Workflow.serialization),
+        func.coalesce(func.sum(func.pg_column_size(Workflow.serialization)), 0),
+        func.count(Workflow.serialization_bin),
+        func.coalesce(func.sum(func.octet_length(Workflow.serialization_bin)), 0),
+    ).one()
+    print(f"Stored JSONB rows:  {totals[0]:>8}  {totals[1]:>14} bytes on disk (after TOAST compression)")
+    print(f"Stored binary rows: {totals[2]:>8}  {totals[3]:>14} bytes")
+
+    records = Workflow.query.limit(sample).all()
+    if not records:
+        print("No workflows to sample.")
+        return
+    json_bytes = binary_bytes = 0
+    json_load = binary_load = 0.0
+    for record in records:
+        dct = serializer._get_document(record)
+        text = json.dumps(dct)
+        blob = serializer.binary_format.dumps(dct)
+        json_bytes += len(text.encode('utf-8'))
+        binary_bytes += len(blob)
+        started = time.perf_counter()
+        json.loads(text)
+        json_load += time.perf_counter() - started
+        started = time.perf_counter()
+        serializer.binary_format.loads(blob)
+        binary_load += time.perf_counter() - started
+
+    count = len(records)
+    print(f"\nSample of {count} workflow(s), binary compression '{serializer.binary_format.compression}':")
+    print(f"  JSON:   avg {json_bytes / count:>10.0f} bytes, avg decode {json_load * 1000 / count:.3f} ms")
+    print(f"  binary: avg {binary_bytes / count:>10.0f} bytes, avg decode {binary_load * 1000 / count:.3f} ms")
+    print(f"  size ratio {binary_bytes / json_bytes:.2%}")
+
+    # End-to-end load time per stored format, including the database round trip
+    for label, column in (('jsonb', Workflow.serialization), ('binary', Workflow.serialization_bin)):
+        ids = [row.id for row in db.session.query(Workflow.id).filter(column.isnot(None)).limit(sample)]
+        if not ids:
+            continue
+        db.session.expunge_all()
+        started = time.perf_counter()
+        for wf_id in ids:
+            serializer._get_document(Workflow.query.get(wf_id))
+        elapsed = time.perf_counter() - started
+        print(f"  load from {label}: avg {elapsed * 1000 / len(ids):.3f} ms over {len(ids)} row(s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    migrate_parser = commands.add_parser('migrate', help='Rewrite workflow rows into another storage format')
+    migrate_parser.add_argument('--to', choices=['binary', 'jsonb'], required=True)
+    migrate_parser.add_argument('--batch-size', type=int, default=200)
+    migrate_parser.add_argument('--limit', type=int, default=None)
+    measure_parser = commands.add_parser('measure', help='Compare size and load time of the storage formats')
+    measure_parser.add_argument('--sample', type=int, default=200)
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.command == 'migrate':
+            count = migrate(args.to, args.batch_size, args.limit)
+            print(f"Migrated {count} workflow row(s) to {args.to}.")
+        else:
+            measure(args.sample)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+# /config/workspace/todo-app/backend/migrate_workflows.py
+"""
+Bulk workflow migration.
+
+    python migrate_workflows.py --spec-name Process_DSAR_Request [--to SPEC_ID] [--from SPEC_ID ...]
+                                [--workers 4] [--batch-size 200] [--dry-run] [--report report.json]
+
+Migrates every workflow running on an older version of the spec to the latest version
+(or --to) in place, so workflow ids and the UserWorkflow links stay the same. Batches
+run in a process pool; each batch is one transaction with a savepoint per workflow,
+and holds the workflow locks of its workflows, so workflows that a worker is advancing
+are reported as busy and picked up by running the command again. Workflows that are not
+safe to migrate (a completed or started task whose spec changed or was removed) are
+left alone and listed with the reason. --dry-run does all the work and rolls it back.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import time
+from uuid import UUID
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from app import app, db, engine
+from models.instance import Instance
+from models.workflow import Workflow
+from models.workflow_spec import WorkflowSpec
+
+logger = logging.getLogger('migrate_workflows')
+
+# One migrator per worker process, so spec diffs and verdicts are shared by all its batches
+_migrators = {}
+
+
+def _init_worker():
+    # Connections inherited from the parent must not be used by the child
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+def migrate_batch(spec_id, batch, dry_run=False):
+    """Migrates [(workflow id, original spec id)] in one transaction and returns the outcome of each."""
+    result = {'migrated': [], 'unsafe': [], 'failed': [], 'busy': []}
+    with app.app_context():
+        migrator = _migrators.get(spec_id)
+        if migrator is None:
+            migrator = _migrators[spec_id] = engine.migrate_workflows(spec_id)
+        # Workflow locks are held until the batch transaction has ended
+        with engine.lock_workflows([wf_id for wf_id, _ in batch]) as locked:
+            try:
+                for wf_id, original_spec_id in batch:
+                    if wf_id not in locked:
+                        result['busy'].append(str(wf_id))
+                        continue
+                    try:
+                        with db.session.begin_nested():
+                            reason = migrator.migrate(wf_id, original_spec_id, commit=False)
+                    except Exception as e:
+                        result['failed'].append({'workflow_id': str(wf_id), 'error': f"{type(e).__name__}: {e}"})
+                        continue
+                    if reason is None:
+                        result['migrated'].append(str(wf_id))
+                    else:
+                        result['unsafe'].append({'workflow_id': str(wf_id), 'reason': reason})
+                if dry_run:
+                    db.session.rollback()
+                else:
+                    db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            finally:
+                db.session.remove()
+    return result
+
+
+def find_workflows(spec_id, source_ids):
+    """Returns [(workflow id, spec id)] of the top-level workflows running on source_ids."""
+    rows = (
+        db.session.query(Workflow.id, Workflow.workflow_spec_id)
+        .join(Instance, Instance.id == Workflow.id)
+        .filter(Workflow.workflow_spec_id.in_(source_ids), Workflow.workflow_spec_id != spec_id)
+        .order_by(Workflow.id)
+        .all()
+    )
+    return [(row.id, row.workflow_spec_id) for row in rows]
+
+
+def run(spec_id, workflows, workers, batch_size, dry_run):
+    batches = [workflows[i:i + batch_size] for i in range(0, len(workflows), batch_size)]
+    totals = {'migrated': [], 'unsafe': [], 'failed': [], 'busy': []}
+    started = time.monotonic()
+
+    def record(result):
+        for key in totals:
+            totals[key].extend(result[key])
+        done = sum(len(items) for items in totals.values())
+        elapsed = time.monotonic() - started
+        logger.info(
+            f"{done}/{len(workflows)} processed: {len(totals['migrated'])} migrated, "
+            f"{len(totals['unsafe'])} unsafe, {len(totals['failed'])} failed, {len(totals['busy'])} busy "
+            f"({done / elapsed if elapsed else 0:.0f}/s)"
+        )
+
+    if workers <= 1:
+        for batch in batches:
+            record(migrate_batch(spec_id, batch, dry_run))
+    else:
+        # fork keeps the already loaded app and specs; _init_worker drops the inherited connections
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker) as executor:
+            futures = [executor.submit(migrate_batch, spec_id, batch, dry_run) for batch in batches]
+            for future in as_completed(futures):
+                record(future.result())
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--spec-name', required=True, help='Process id of the spec, e.g. Process_DSAR_Request')
+    parser.add_argument('--to', default=None, help='Target spec id (default: latest version)')
+    parser.add_argument('--from', dest='sources', action='append', default=None,
+                        help='Only migrate workflows on this spec id (repeatable; default: all older versions)')
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--batch-size', type=int, default=200)
+    parser.add_argument('--dry-run', action='store_true')
+    parser.add_argument('--report', default=None, help='Write unsafe, failed and busy workflows to this JSON file')
+    args = parser.parse_args()
+
+    with app.app_context():
+        spec_id = UUID(args.to) if args.to else engine.get_latest_spec_id(args.spec_name)
+        if spec_id is None:
+            parser.error(f"No stored spec named {args.spec_name}")
+        source_ids = [UUID(source) for source in args.sources] if args.sources else [
+            row.id for row in db.session.query(WorkflowSpec.id).filter(WorkflowSpec.name == args.spec_name)
+        ]
+        workflows = find_workflows(spec_id, source_ids)
+        db.session.remove()
+    logger.info(f"Migrating {len(workflows)} workflow(s) to spec {spec_id}{' (dry run)' if args.dry_run else ''}.")
+
+    totals = run(spec_id, workflows, args.workers, args.batch_size, args.dry_run)
+    print(
+        f"{'Checked' if args.dry_run else 'Migrated'} {len(totals['migrated'])} workflow(s); "
+        f"{len(totals['unsafe'])} unsafe, {len(totals['failed'])} failed, {len(totals['busy'])} busy."
+    )
+    for item in totals['unsafe']:
+        print(f"  unsafe {item['workflow_id']}: {item['reason']}")
+    for item in totals['failed']:
+        print(f"  failed {item['workflow_id']}: {item['error']}")
+    if args.report:
+        with open(args.report, 'w') as fh:
+            json.dump({key: totals[key] for key in ('unsafe', 'failed', 'busy')}, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -9,8 +9,12 @@ from .user_workflow import UserWorkflow, UserWorkflowTypeEnum, UserWorkflowStatu
 
 # New workflow-related models
 from .workflow_spec import WorkflowSpec, TaskSpec, SpecDependency
-from .workflow import Workflow, Task, TaskData, WorkflowData
+from .workflow import Workflow, Task, TaskData, WorkflowData, MessageSubscription
 from .instance import Instance
+from .workflow_job import WorkflowJob
+from .workflow_stats import WorkflowStatusDaily, WorkflowCompletionDaily
+from .mailbox_state import MailboxState
+from .email_outbox import OutboxEmail
 
 # You can optionally define an __all__ list to specify what gets imported
 # when using 'from models import *', though explicit imports are generally preferred.
@@ -19,6 +23,10 @@ __all__ = [
     'WebsiteAccount',
     'UserWorkflow', 'UserWorkflowTypeEnum', 'UserWorkflowStatusEnum',
     'WorkflowSpec', 'TaskSpec', 'SpecDependency',
-    'Workflow', 'Task', 'TaskData', 'WorkflowData',
-    'Instance'
+    'Workflow', 'Task', 'TaskData', 'WorkflowData', 'MessageSubscription',
+    'Instance',
+    'WorkflowJob',
+    'WorkflowStatusDaily', 'WorkflowCompletionDaily',
+    'MailboxState',
+    'OutboxEmail'
 ]
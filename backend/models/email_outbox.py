@@ -0,0 +1,54 @@
+# /config/workspace/todo-app/backend/models/email_outbox.py
+from app import db
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Index, UniqueConstraint
+
+# Outbox states
+OUTBOX_PENDING = 'pending'
+OUTBOX_SENDING = 'sending'
+# Sent, but the workflow has not been told yet
+OUTBOX_SENT = 'sent'
+OUTBOX_DONE = 'done'
+OUTBOX_FAILED = 'failed'
+
+
+class OutboxEmail(db.Model):
+    """
+    An email a workflow's send task asked for, written in the same transaction as the
+    workflow save that completed the task. outbox_sender.py sends it through Gmail and
+    then delivers completion_message (if any) to the workflow.
+    Rows are kept until their workflow is deleted: the (workflow_id, task_id) key is what
+    keeps a later save of the same workflow from queueing the email again.
+    """
+    __tablename__ = 'email_outbox'
+
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    workflow_id = db.Column(UUID(as_uuid=True), db.ForeignKey('_workflow.id', ondelete='CASCADE'), nullable=False)
+    # The send task that queued the email
+    task_id = db.Column(UUID(as_uuid=True), nullable=False)
+    to_email = db.Column(db.String(320), nullable=False)
+    subject = db.Column(db.Text, nullable=False, default='', server_default='')
+    body = db.Column(db.Text, nullable=False, default='', server_default='')
+    # Message delivered to the workflow once the email is sent (None: nothing to resume)
+    completion_message = db.Column(db.Text, nullable=True)
+    status = db.Column(db.String(16), nullable=False, default=OUTBOX_PENDING, server_default=OUTBOX_PENDING)
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Failed deliveries of completion_message after the send (a busy workflow does not count)
+    notify_attempts = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    last_error = db.Column(db.Text, nullable=True)
+    # Earliest time the row may be claimed (pushed back on retry)
+    run_after = db.Column(db.DateTime(timezone=True), nullable=False, server_default=db.func.now())
+    locked_by = db.Column(db.String(128), nullable=True)
+    locked_at = db.Column(db.DateTime(timezone=True), nullable=True)
+    gmail_message_id = db.Column(db.String(64), nullable=True)
+    created_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now())
+    sent_at = db.Column(db.DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint('workflow_id', 'task_id', name='uq_email_outbox_workflow_task'),
+        # Matches the claim query: status filter ordered by run_after
+        Index('ix_email_outbox_status_run_after', 'status', 'run_after'),
+    )
+
+    def __repr__(self):
+        return f'<OutboxEmail {self.id} Workflow={self.workflow_id} To={self.to_email} Status={self.status}>'
@@ -11,15 +11,24 @@ class Instance(db.Model):
     # Column name kept as 'bullshit' per schema, consider renaming for clarity
     bullshit = db.Column(db.Text, nullable=True)
     spec_name = db.Column(db.Text, nullable=True)
+    # Version of the spec the workflow was started with (see WorkflowSpec.version)
+    spec_version = db.Column(db.Integer, nullable=True)
     active_tasks = db.Column(db.Integer, nullable=True)
     # Use timezone=True for TIMESTAMP WITH TIME ZONE in PostgreSQL
     started = db.Column(db.DateTime(timezone=True), server_default=db.func.now())
     updated = db.Column(db.DateTime(timezone=True), onupdate=db.func.now())
     ended = db.Column(db.DateTime(timezone=True), nullable=True)
+    # Earliest fire time of a waiting timer event, maintained on every save (NULL if none)
+    next_wakeup = db.Column(db.DateTime(timezone=True), nullable=True)
 
     # Relationship (One-to-one)
     workflow = db.relationship('Workflow', back_populates='instance')
 
+    __table_args__ = (
+        # The timer scheduler only ever range-scans instances that are parked on a timer
+        db.Index('ix_instance_next_wakeup', 'next_wakeup', postgresql_where=db.text('next_wakeup IS NOT NULL')),
+    )
+
     def __repr__(self):
         return f'<Instance {self.id} Spec={self.spec_name}>'
 
@@ -0,0 +1,18 @@
+# /config/workspace/todo-app/backend/models/mailbox_state.py
+from app import db
+
+
+class MailboxState(db.Model):
+    """
+    Where InboxPoller resumes reading a Gmail mailbox: the historyId of its last sync.
+    A NULL history_id (or a missing row) makes the next poll a full sync.
+    """
+    __tablename__ = 'mailbox_state'
+
+    mailbox = db.Column(db.String(255), primary_key=True)
+    # Gmail history ids are unsigned 64-bit numbers sent as strings
+    history_id = db.Column(db.String(32), nullable=True)
+    synced_at = db.Column(db.DateTime(timezone=True), nullable=True)
+
+    def __repr__(self):
+        return f'<MailboxState {self.mailbox} history_id={self.history_id}>'
@@ -0,0 +1,159 @@
+# /config/workspace/todo-app/backend/models/schema.py
+import logging
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# Keys of the transaction-level advisory lock that serializes schema changes between processes
+# (the two-key form, so it cannot collide with the single-key workflow locks)
+SCHEMA_LOCK_KEYS = (0x5C4E, 0)
+
+# db.create_all() only creates missing tables, so columns and indexes added to
+# existing tables are listed here as (name, statements). Each patch runs once and is
+# recorded in schema_patch; append new patches, never rename or edit applied ones.
+# Statements must still be idempotent: databases set up before schema_patch existed
+# run every patch once more when they first meet it.
+SCHEMA_PATCHES = [
+    ('timer_scheduler', [
+        "ALTER TABLE instance ADD COLUMN IF NOT EXISTS next_wakeup TIMESTAMP WITH TIME ZONE",
+        "CREATE INDEX IF NOT EXISTS ix_instance_next_wakeup ON instance (next_wakeup) WHERE next_wakeup IS NOT NULL",
+    ]),
+    # Binary workflow storage; the blob is already compressed, so keep Postgres from compressing it again
+    ('binary_storage', [
+        "ALTER TABLE _workflow ADD COLUMN IF NOT EXISTS serialization_bin BYTEA",
+        # Takes an ACCESS EXCLUSIVE lock on _workflow, so only when the setting is missing
+        "DO $$ BEGIN"
+        " IF EXISTS (SELECT 1 FROM pg_attribute"
+        " WHERE attrelid = '_workflow'::regclass AND attname = 'serialization_bin' AND attstorage <> 'e') THEN"
+        " ALTER TABLE _workflow ALTER COLUMN serialization_bin SET STORAGE EXTERNAL;"
+        " END IF; END $$",
+    ]),
+    # Spec registry: fingerprint of the files a spec was parsed from
+    ('spec_content_hash', [
+        "ALTER TABLE _workflow_spec ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)",
+    ]),
+    # Spec versions; existing specs become version 1 (2, ... if a name was stored more than once)
+    ('spec_versions', [
+        "ALTER TABLE _workflow_spec ADD COLUMN IF NOT EXISTS name TEXT",
+        "ALTER TABLE _workflow_spec ADD COLUMN IF NOT EXISTS version INTEGER",
+        "UPDATE _workflow_spec SET name = serialization->>'name' WHERE name IS NULL",
+        # Specs have no creation time and their ids are random, so they are numbered in the order
+        # their first workflow started; specs no workflow ran from come last
+        "UPDATE _workflow_spec s SET version = v.rn"
+        " FROM (SELECT ws.id, row_number() OVER ("
+        " PARTITION BY ws.name ORDER BY min(i.started) NULLS LAST, ws.id) AS rn"
+        " FROM _workflow_spec ws"
+        " LEFT JOIN _workflow w ON w.workflow_spec_id = ws.id"
+        " LEFT JOIN instance i ON i.id = w.id"
+        " GROUP BY ws.id, ws.name) v"
+        " WHERE s.id = v.id AND s.version IS NULL",
+        "DROP INDEX IF EXISTS ix__workflow_spec_content_hash",
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_workflow_spec_name_version ON _workflow_spec (name, version)",
+        "CREATE INDEX IF NOT EXISTS ix_workflow_spec_name_content_hash ON _workflow_spec (name, content_hash)",
+        "ALTER TABLE instance ADD COLUMN IF NOT EXISTS spec_version INTEGER",
+    ]),
+    # Optimistic concurrency on workflow saves
+    ('workflow_version', [
+        "ALTER TABLE _workflow ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1",
+    ]),
+    # Keyset pagination of GET /workflows
+    ('userworkflows_keyset', [
+        "CREATE INDEX IF NOT EXISTS ix_userworkflows_user_id_created_at ON userworkflows (user_id, created_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_userworkflows_created_at ON userworkflows (created_at, id)",
+    ]),
+    # Workflow filters: active_tasks becomes JSONB (once) for the GIN containment index
+    ('userworkflows_active_tasks_jsonb', [
+        "DO $$ BEGIN"
+        " IF EXISTS (SELECT 1 FROM information_schema.columns"
+        " WHERE table_name = 'userworkflows' AND column_name = 'active_tasks' AND data_type = 'json') THEN"
+        " ALTER TABLE userworkflows ALTER COLUMN active_tasks TYPE JSONB USING active_tasks::jsonb;"
+        " END IF; END $$",
+        "CREATE INDEX IF NOT EXISTS ix_userworkflows_active_tasks ON userworkflows USING gin (active_tasks jsonb_path_ops)",
+    ]),
+    # Dashboard statistics rollups (models/workflow_stats.py), filled once from existing rows
+    ('workflow_stats_rollups', [
+        "INSERT INTO workflow_status_daily (day, workflow_type, workflow_status, workflow_count)"
+        " SELECT created_at::date, workflow_type::text, workflow_status::text, count(*) FROM userworkflows"
+        " WHERE NOT EXISTS (SELECT 1 FROM workflow_status_daily)"
+        " GROUP BY 1, 2, 3",
+        "INSERT INTO workflow_completion_daily (day, workflow_type, workflow_status, completed_count, total_seconds)"
+        " SELECT (i.ended AT TIME ZONE 'UTC')::date, u.workflow_type::text, u.workflow_status::text,"
+        " count(*), sum(extract(epoch FROM i.ended - i.started))"
+        " FROM userworkflows u JOIN instance i ON i.id = u.workflow_id::uuid"
+        " WHERE u.workflow_status::text IN ('COMPLETED', 'FAILED', 'TERMINATED', 'CANCELLED')"
+        " AND i.started IS NOT NULL AND i.ended IS NOT NULL"
+        " AND NOT EXISTS (SELECT 1 FROM workflow_completion_daily)"
+        " GROUP BY 1, 2, 3",
+        # Keeps the rollups current on every insert, status change and delete of a userworkflow.
+        # Counter rows are updated by one INSERT in key order, so concurrent transitions cannot deadlock.
+        "CREATE OR REPLACE FUNCTION userworkflows_rollup() RETURNS trigger AS $$"
+        " DECLARE started_at TIMESTAMPTZ; ended_at TIMESTAMPTZ;"
+        " BEGIN"
+        " IF TG_OP = 'UPDATE' AND OLD.workflow_status = NEW.workflow_status"
+        " AND OLD.workflow_type = NEW.workflow_type AND OLD.created_at = NEW.created_at THEN RETURN NULL; END IF;"
+        " INSERT INTO workflow_status_daily AS r (day, workflow_type, workflow_status, workflow_count)"
+        " SELECT * FROM (VALUES"
+        " (CASE WHEN TG_OP <> 'INSERT' THEN OLD.created_at::date END, OLD.workflow_type::text, OLD.workflow_status::text, -1),"
+        " (CASE WHEN TG_OP <> 'DELETE' THEN NEW.created_at::date END, NEW.workflow_type::text, NEW.workflow_status::text, 1)"
+        " ) AS v (day, workflow_type, workflow_status, workflow_count)"
+        " WHERE v.day IS NOT NULL ORDER BY 1, 2, 3"
+        " ON CONFLICT (day, workflow_type, workflow_status)"
+        " DO UPDATE SET workflow_count = r.workflow_count + EXCLUDED.workflow_count;"
+        " IF TG_OP = 'UPDATE'"
+        " AND NEW.workflow_status::text IN ('COMPLETED', 'FAILED', 'TERMINATED', 'CANCELLED')"
+        " AND OLD.workflow_status::text NOT IN ('COMPLETED', 'FAILED', 'TERMINATED', 'CANCELLED') THEN"
+        # The status projection ends the instance in the same statement, so ended may not be visible yet
+        " SELECT i.started, coalesce(i.ended, now()) INTO started_at, ended_at FROM instance i WHERE i.id = NEW.workflow_id::uuid;"
+        " IF started_at IS NOT NULL THEN"
+        " INSERT INTO workflow_completion_daily AS c (day, workflow_type, workflow_status, completed_count, total_seconds)"
+        " VALUES ((ended_at AT TIME ZONE 'UTC')::date, NEW.workflow_type::text, NEW.workflow_status::text,"
+        " 1, extract(epoch FROM ended_at - started_at))"
+        " ON CONFLICT (day, workflow_type, workflow_status) DO UPDATE SET"
+        " completed_count = c.completed_count + 1, total_seconds = c.total_seconds + EXCLUDED.total_seconds;"
+        " END IF;"
+        " END IF;"
+        " RETURN NULL;"
+        " END $$ LANGUAGE plpgsql",
+        # Created only when missing: dropping it would lock userworkflows against live traffic
+        "DO $$ BEGIN"
+        " IF NOT EXISTS (SELECT 1 FROM pg_trigger"
+        " WHERE tgname = 'userworkflows_rollup' AND tgrelid = 'userworkflows'::regclass) THEN"
+        " CREATE TRIGGER userworkflows_rollup AFTER INSERT OR DELETE OR UPDATE OF workflow_status, workflow_type, created_at"
+        " ON userworkflows FOR EACH ROW EXECUTE FUNCTION userworkflows_rollup();"
+        " END IF; END $$",
+    ]),
+    # Email outbox: completion message deliveries are counted and capped like sends
+    ('email_outbox_notify_attempts', [
+        "ALTER TABLE email_outbox ADD COLUMN IF NOT EXISTS notify_attempts INTEGER NOT NULL DEFAULT 0",
+    ]),
+]
+
+
+def apply_schema_patches(db):
+    """
+    Creates missing tables and applies the SCHEMA_PATCHES not yet recorded in schema_patch,
+    all in one transaction. Every process calls this at startup; the advisory lock makes
+    concurrent starts take turns, so only the first applies anything and the others find
+    the patches recorded.
+    """
+    try:
+        with db.engine.begin() as connection:
+            connection.execute(text("SELECT pg_advisory_xact_lock(:a, :b)"), dict(zip('ab', SCHEMA_LOCK_KEYS)))
+            db.metadata.create_all(bind=connection)
+            connection.execute(text(
+                "CREATE TABLE IF NOT EXISTS schema_patch"
+                " (name TEXT PRIMARY KEY, applied_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now())"
+            ))
+            applied = set(connection.execute(text("SELECT name FROM schema_patch")).scalars())
+            pending = [(name, statements) for name, statements in SCHEMA_PATCHES if name not in applied]
+            for name, statements in pending:
+                for statement in statements:
+                    connection.execute(text(statement))
+                connection.execute(text("INSERT INTO schema_patch (name) VALUES (:name)"), {'name': name})
+                logger.info(f"Applied schema patch {name}.")
+        if pending:
+            logger.info(f"Applied {len(pending)} schema patch(es).")
+    except Exception as e:
+        logger.error(f"Error applying schema patches: {e}", exc_info=True)
+        raise
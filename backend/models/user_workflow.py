@@ -26,6 +26,12 @@ class UserWorkflowStatusEnum(enum.Enum): # Renamed from WorkflowStatusEnum
 
 class UserWorkflow(db.Model): # Renamed from Workflow
     __tablename__ = 'userworkflows' # Updated table name
+    __table_args__ = (
+        # Keyset pagination of GET /workflows walks (created_at, id) backwards; id breaks ties
+        db.Index('ix_userworkflows_user_id_created_at', 'user_id', 'created_at', 'id'),
+        db.Index('ix_userworkflows_created_at', 'created_at', 'id'),
+        db.Index('ix_userworkflows_active_tasks', 'active_tasks', postgresql_using='gin', postgresql_ops={'active_tasks': 'jsonb_path_ops'}),
+    )
 
     # Primary key (auto-incrementing integer)
     id = db.Column(db.Integer, primary_key=True)
@@ -48,8 +54,8 @@ class UserWorkflow(db.Model): # Renamed from Workflow
 
     # --- New Field ---
     # Stores a list of names for tasks currently in 'STARTED' status for this workflow
-    # Use db.JSON for database portability, or JSONB specifically for PostgreSQL advantages
-    active_tasks = db.Column(db.JSON, nullable=True, default=lambda: []) # Default to an empty list
+    # JSONB so the "has active task X" filter (active_tasks @> '["X"]') can use a GIN index
+    active_tasks = db.Column(JSONB, nullable=True, default=lambda: []) # Default to an empty list
 
     # Timestamp when the workflow record was created
     created_at = db.Column(db.DateTime, nullable=False, server_default=func.now())
@@ -10,7 +10,12 @@ class Workflow(db.Model):
     id = db.Column(UUID(as_uuid=True), primary_key=True, server_default=db.text("gen_random_uuid()"))
     # Ensure workflow_spec_id is not nullable if it's required
     workflow_spec_id = db.Column(UUID(as_uuid=True), db.ForeignKey('_workflow_spec.id'), nullable=False)
-    serialization = db.Column(JSONB)
+    # none_as_null so that rows moved to serialization_bin hold SQL NULL rather than JSON null
+    serialization = db.Column(JSONB(none_as_null=True))
+    # Compressed binary alternative to serialization (see workflows/serializer/binary.py); only one is set
+    serialization_bin = db.Column(db.LargeBinary, nullable=True)
+    # Incremented on every save of a top-level workflow; saves check it to detect lost updates
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
 
     # Relationships
     workflow_spec = db.relationship('WorkflowSpec', back_populates='workflows')
@@ -102,3 +107,23 @@ class WorkflowData(db.Model):
     def __repr__(self):
         return f'<WorkflowData Name={self.name} for Workflow {self.workflow_id}>'
 
+
+
+class MessageSubscription(db.Model):
+    __tablename__ = '_message_subscription'
+
+    # One row per message a workflow is currently waiting on, maintained by SqlSerializer on save
+    workflow_id = db.Column(UUID(as_uuid=True), db.ForeignKey('_workflow.id', ondelete='CASCADE'), primary_key=True)
+    message_name = db.Column(db.Text, primary_key=True)
+    # The workflow's correlations ({key: {property: value}}) when the catch event checks them, else {}
+    correlations = db.Column(JSONB, nullable=False, server_default=db.text("'{}'::jsonb"))
+
+    __table_args__ = (
+        PrimaryKeyConstraint('workflow_id', 'message_name'),
+        Index('ix_message_subscription_message_name', 'message_name'),
+        # Supports correlations @> '{"key": {...}}' lookups
+        Index('ix_message_subscription_correlations', 'correlations', postgresql_using='gin'),
+    )
+
+    def __repr__(self):
+        return f'<MessageSubscription {self.message_name} for Workflow {self.workflow_id}>'
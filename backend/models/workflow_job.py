@@ -0,0 +1,37 @@
+# /config/workspace/todo-app/backend/models/workflow_job.py
+from app import db
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Index
+
+# Job states
+JOB_PENDING = 'pending'
+JOB_RUNNING = 'running'
+JOB_FAILED = 'failed'
+
+
+class WorkflowJob(db.Model):
+    """
+    A durable request to advance a workflow instance outside the HTTP request.
+    Rows are claimed by worker processes with SELECT ... FOR UPDATE SKIP LOCKED
+    and deleted once the instance has been run to its next stable point.
+    """
+    __tablename__ = 'workflow_job'
+
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    workflow_id = db.Column(UUID(as_uuid=True), db.ForeignKey('_workflow.id', ondelete='CASCADE'), nullable=False, index=True)
+    status = db.Column(db.String(16), nullable=False, default=JOB_PENDING, server_default=JOB_PENDING)
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    last_error = db.Column(db.Text, nullable=True)
+    # Earliest time the job may be claimed (pushed back on retry)
+    run_after = db.Column(db.DateTime(timezone=True), nullable=False, server_default=db.func.now())
+    locked_by = db.Column(db.String(128), nullable=True)
+    locked_at = db.Column(db.DateTime(timezone=True), nullable=True)
+    created_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now())
+
+    __table_args__ = (
+        # Matches the claim query: status filter ordered by run_after
+        Index('ix_workflow_job_status_run_after', 'status', 'run_after'),
+    )
+
+    def __repr__(self):
+        return f'<WorkflowJob {self.id} Workflow={self.workflow_id} Status={self.status}>'
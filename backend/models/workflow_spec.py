@@ -10,6 +10,13 @@ class WorkflowSpec(db.Model):
     # Use server_default with gen_random_uuid for PostgreSQL
     id = db.Column(UUID(as_uuid=True), primary_key=True, server_default=db.text("gen_random_uuid()"))
     serialization = db.Column(JSONB)
+    # Process id of the spec; the same as serialization['name'] but indexed
+    name = db.Column(db.Text, nullable=True)
+    # 1, 2, ... per name. Spec rows are never changed, so workflows stay pinned to their version
+    version = db.Column(db.Integer, nullable=True)
+    # sha256 of the BPMN/DMN files the spec was parsed from (see engine.spec_fingerprint);
+    # subprocess specs share the hash of the files they were parsed with
+    content_hash = db.Column(db.String(64), nullable=True)
 
     # Relationships
     task_specs = db.relationship('TaskSpec', back_populates='workflow_spec', cascade='all, delete-orphan')
@@ -30,8 +37,14 @@ class WorkflowSpec(db.Model):
     )
     workflows = db.relationship('Workflow', back_populates='workflow_spec') # Relationship to Workflow
 
+    __table_args__ = (
+        # Latest version lookup (ORDER BY version DESC LIMIT 1) and guard against two processes registering the same version
+        Index('uq_workflow_spec_name_version', 'name', 'version', unique=True),
+        Index('ix_workflow_spec_name_content_hash', 'name', 'content_hash'),
+    )
+
     def __repr__(self):
-        return f'<WorkflowSpec {self.id}>'
+        return f'<WorkflowSpec {self.name} v{self.version} {self.id}>'
 
 class TaskSpec(db.Model):
     __tablename__ = '_task_spec'
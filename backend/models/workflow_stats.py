@@ -0,0 +1,38 @@
+# /config/workspace/todo-app/backend/models/workflow_stats.py
+from app import db
+
+
+class WorkflowStatusDaily(db.Model):
+    """
+    Number of userworkflows per creation day, type and current status.
+    Maintained by a trigger on userworkflows (see models/schema.py), so reading
+    the dashboard statistics does not scale with the number of workflows.
+    Type and status hold the enum names (e.g. 'DSAR', 'RUNNING').
+    """
+    __tablename__ = 'workflow_status_daily'
+
+    day = db.Column(db.Date, primary_key=True)
+    workflow_type = db.Column(db.String(32), primary_key=True)
+    workflow_status = db.Column(db.String(32), primary_key=True)
+    workflow_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    def __repr__(self):
+        return f'<WorkflowStatusDaily {self.day} {self.workflow_type}/{self.workflow_status}: {self.workflow_count}>'
+
+
+class WorkflowCompletionDaily(db.Model):
+    """
+    Workflows that reached a terminal status, per day of completion, type and that status,
+    with the summed run time (instance.ended - instance.started) for averages.
+    Maintained by the same trigger as WorkflowStatusDaily.
+    """
+    __tablename__ = 'workflow_completion_daily'
+
+    day = db.Column(db.Date, primary_key=True)
+    workflow_type = db.Column(db.String(32), primary_key=True)
+    workflow_status = db.Column(db.String(32), primary_key=True)
+    completed_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    total_seconds = db.Column(db.Float, nullable=False, default=0, server_default='0')
+
+    def __repr__(self):
+        return f'<WorkflowCompletionDaily {self.day} {self.workflow_type}/{self.workflow_status}: {self.completed_count}>'
@@ -0,0 +1,187 @@
+# /config/workspace/todo-app/backend/outbox_sender.py
+"""
+Email outbox sender.
+
+Workflows do not send email themselves: a completed send task leaves a row in
+email_outbox, written in the same commit as the workflow (see EmailOutbox).
+This daemon claims due rows in batches of OUTBOX_BATCH_SIZE, sends them through
+Gmail on OUTBOX_CONCURRENCY threads and then delivers each email's completion
+message to its workflow, which resumes it. Run one or more next to worker.py:
+
+    python outbox_sender.py
+
+Sends are limited to OUTBOX_SEND_RATE per second (bursts of OUTBOX_SEND_BURST) per
+process. messages.send costs 100 of the 250 quota units Gmail allows a user per
+second, so keep the total over all senders below 2.5/s, and the daily total under
+the account's sending limit. When Gmail still answers with a rate limit, every
+thread pauses for the Retry-After period and the email is put back without
+counting an attempt. Other failures are retried with exponential backoff up to
+OUTBOX_MAX_ATTEMPTS; a rejected message (4xx) fails at once and marks the
+workflow FAILED. Delivering the completion message is retried the same way
+(every OUTBOX_NOTIFY_RETRY_SECONDS, uncounted, while the workflow is busy).
+"""
+import os
+import signal
+import socket
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from googleapiclient.errors import HttpError
+
+from app import app, db, engine
+from models.email_outbox import OUTBOX_SENT
+from utils.email import GmailUtils
+from utils.rate_limit import TokenBucket
+from workflows.serializer.errors import WorkflowConflictError
+from workflows.serializer.sql.lock import WorkflowLockTimeout
+from workflows.serializer.sql.outbox import EmailOutbox
+
+logger = logging.getLogger('outbox_sender')
+
+SENDER_ID = os.environ.get('OUTBOX_SENDER_ID', f'{socket.gethostname()}-{os.getpid()}-outbox')
+CONCURRENCY = int(os.environ.get('OUTBOX_CONCURRENCY', 4))
+BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', 20))
+POLL_INTERVAL = float(os.environ.get('OUTBOX_POLL_INTERVAL', 2.0))
+SEND_RATE = float(os.environ.get('OUTBOX_SEND_RATE', 2.0))
+SEND_BURST = float(os.environ.get('OUTBOX_SEND_BURST', 5))
+# Used when a rate limit answer carries no Retry-After header
+RATE_LIMIT_PAUSE_SECONDS = float(os.environ.get('OUTBOX_RATE_LIMIT_PAUSE_SECONDS', 30))
+NOTIFY_RETRY_SECONDS = int(os.environ.get('OUTBOX_NOTIFY_RETRY_SECONDS', 10))
+
+# Reasons Gmail gives (with 403 or 429) for usage limits, as opposed to a refused message
+RATE_LIMIT_REASONS = ('rateLimitExceeded', 'userRateLimitExceeded', 'dailyLimitExceeded')
+
+outbox = EmailOutbox(
+    db,
+    max_attempts=int(os.environ.get('OUTBOX_MAX_ATTEMPTS', 8)),
+    lease_seconds=int(os.environ.get('OUTBOX_LEASE_SECONDS', 120)),
+    base_backoff_seconds=float(os.environ.get('OUTBOX_BASE_BACKOFF_SECONDS', 5)),
+    max_backoff_seconds=float(os.environ.get('OUTBOX_MAX_BACKOFF_SECONDS', 3600)),
+)
+rate_limiter = TokenBucket(SEND_RATE, SEND_BURST)
+
+_stopping = False
+
+
+def _request_stop(signum, frame):
+    global _stopping
+    logger.info(f"Outbox sender {SENDER_ID} received signal {signum}, stopping after the current batch.")
+    _stopping = True
+
+
+def _rate_limit_pause(error):
+    """Returns the seconds to pause if error is a Gmail usage limit, else None."""
+    status = error.resp.status
+    content = error.content.decode('utf-8', 'replace') if isinstance(error.content, bytes) else str(error.content)
+    if status != 429 and not (status == 403 and any(reason in content for reason in RATE_LIMIT_REASONS)):
+        return None
+    try:
+        return float(error.resp.get('retry-after'))
+    except (TypeError, ValueError):
+        return RATE_LIMIT_PAUSE_SECONDS
+
+
+def send(gmail, email):
+    """Sends one claimed email and records the result. Returns the Gmail message id, or None."""
+    rate_limiter.acquire()
+    try:
+        message = gmail.send_email(email.to_email, email.subject, email.body, raise_errors=True)
+    except HttpError as e:
+        pause = _rate_limit_pause(e)
+        if pause is not None:
+            logger.warning(f"Gmail rate limit hit, pausing sends for {pause:.0f}s: {e}")
+            rate_limiter.pause(pause)
+            outbox.release(email.id, pause)
+        else:
+            # 5xx and auth failures may pass; anything else means Gmail refused this message
+            outbox.fail(email.id, e, retryable=e.resp.status >= 500 or e.resp.status == 401)
+        return None
+    except Exception as e:
+        # Network errors and timeouts
+        outbox.fail(email.id, e)
+        return None
+    outbox.mark_sent(email.id, message['id'])
+    logger.info(f"Outbox email {email.id} for workflow {email.workflow_id} sent as {message['id']}.")
+    return message['id']
+
+
+def notify(email, gmail_message_id):
+    """Delivers the email's completion message to its workflow and marks the email done."""
+    if email.completion_message:
+        payload = {'gmail_message_id': gmail_message_id, 'to': email.to_email}
+        try:
+            delivered = engine.send_message(email.completion_message, payload, wf_ids=[email.workflow_id])
+        except (WorkflowLockTimeout, WorkflowConflictError) as e:
+            db.session.rollback()
+            logger.info(f"Outbox email {email.id}: workflow {email.workflow_id} is busy ({e}), retrying in {NOTIFY_RETRY_SECONDS}s.")
+            outbox.retry_notification(email.id, e, NOTIFY_RETRY_SECONDS, count=False)
+            return
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Outbox email {email.id}: error resuming workflow {email.workflow_id}: {e}", exc_info=True)
+            outbox.retry_notification(email.id, e)
+            return
+        if not delivered:
+            logger.warning(
+                f"Outbox email {email.id}: workflow {email.workflow_id} no longer waits on {email.completion_message}."
+            )
+    outbox.complete(email.id)
+
+
+def process(gmail, email):
+    gmail_message_id = email.gmail_message_id
+    if email.status != OUTBOX_SENT:
+        gmail_message_id = send(gmail, email)
+        if gmail_message_id is None:
+            return
+    notify(email, gmail_message_id)
+
+
+def _process_in_thread(gmail, email):
+    # Each thread has its own app context and therefore its own session
+    with app.app_context():
+        try:
+            process(gmail, email)
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Outbox email {email.id}: could not record the result: {e}", exc_info=True)
+        finally:
+            db.session.remove()
+
+
+def poll_loop(gmail):
+    logger.info(
+        f"Outbox sender {SENDER_ID} started (batch size {BATCH_SIZE}, {CONCURRENCY} thread(s), "
+        f"{SEND_RATE}/s burst {SEND_BURST})."
+    )
+    executor = ThreadPoolExecutor(max_workers=CONCURRENCY, thread_name_prefix=SENDER_ID)
+    try:
+        with app.app_context():
+            while not _stopping:
+                try:
+                    claimed = outbox.claim(SENDER_ID, limit=BATCH_SIZE)
+                    wait([executor.submit(_process_in_thread, gmail, email) for email in claimed])
+                except Exception as e:
+                    logger.error(f"Outbox sender {SENDER_ID}: error in poll loop: {e}", exc_info=True)
+                    claimed = []
+                finally:
+                    db.session.remove()
+                if not claimed:
+                    time.sleep(POLL_INTERVAL)
+    finally:
+        executor.shutdown(wait=True)
+    logger.info(f"Outbox sender {SENDER_ID} stopped.")
+
+
+def main():
+    signal.signal(signal.SIGTERM, _request_stop)
+    signal.signal(signal.SIGINT, _request_stop)
+    gmail = GmailUtils.shared()
+    if not gmail.service:
+        raise SystemExit("Gmail service not available; check the Gmail credentials.")
+    poll_loop(gmail)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,5 @@
 # /config/workspace/todo-app/backend/routes/health.py
-from flask import Blueprint, jsonify, request # Added request
+from flask import Blueprint, Response, jsonify, request # Added request
 import datetime
 import logging
 import sys
@@ -19,6 +19,7 @@ from workflows.serializer.sql.serializer import (
 )
 from workflows.engine import BpmnEngine
 from utils.email import GmailUtils # <-- Corrected Import Path
+from utils import metrics
 
 # --- Configuration ---
 # Assuming BASE_DIR is where your 'workflows' directory resides
@@ -159,6 +160,26 @@ def time_check():
     }), 200
 
 
+@health_bp.route('/metrics', methods=['GET'])
+def metrics_check():
+    """
+    Metrics Endpoint - Prometheus
+    Returns the workflow engine metrics of this process in the Prometheus text format.
+    Each web worker process keeps its own counters.
+    ---
+    tags:
+      - Health
+    responses:
+      200:
+        description: Metrics in the Prometheus text exposition format.
+        content:
+          text/plain:
+            schema:
+              type: string
+    """
+    return Response(metrics.REGISTRY.render(), status=200, content_type=metrics.PROMETHEUS_CONTENT_TYPE)
+
+
 @health_bp.route('/workflow', methods=['GET'])
 def workflow_check():
     """
@@ -398,7 +419,7 @@ def send_test_email():
 
     logger.info(f"Received GET request to send test email to hardcoded recipient: {recipient}")
     try:
-        gmail = GmailUtils() # Instantiates and authenticates
+        gmail = GmailUtils.shared() # Process-wide client, authenticated once
         if not gmail.service:
              logger.error("Failed to initialize Gmail service for sending email.")
              return jsonify({"error": "Failed to initialize Gmail service. Check logs/config."}), 500
@@ -423,7 +444,8 @@ def list_unread_emails():
     """
     Test Endpoint - List Unread Emails via Gmail API
     Lists the IDs of unread emails (up to a limit).
-    Optional query parameter: ?limit=N (default 5)
+    Optional query parameters: ?limit=N (default 5), ?details=true to also return
+    their metadata, retrieved with one batch request.
     ---
     tags:
       - Email Tests
@@ -434,6 +456,12 @@ def list_unread_emails():
           type: integer
           default: 5
         description: Maximum number of unread email IDs to return.
+      - in: query
+        name: details
+        schema:
+          type: boolean
+          default: false
+        description: Also return each message's metadata (batched).
     responses:
       200:
         description: Successfully retrieved unread email IDs.
@@ -447,14 +475,20 @@ def list_unread_emails():
                   items:
                     type: string
                   example: ["18b9cdef01234567", "18b9cdef89abcdef"]
+                messages:
+                  type: array
+                  items:
+                    type: object
+                  description: Only with details=true.
       500:
         description: Internal Server Error - Failed to initialize Gmail or list emails.
     """
     try:
         limit = request.args.get('limit', 5, type=int) # Get limit from query param, default 5
+        details = request.args.get('details', 'false').lower() == 'true'
         logger.info(f"Received request to list unread emails (limit: {limit}).")
 
-        gmail = GmailUtils()
+        gmail = GmailUtils.shared()
         if not gmail.service:
              logger.error("Failed to initialize Gmail service for listing emails.")
              return jsonify({"error": "Failed to initialize Gmail service. Check logs/config."}), 500
@@ -463,8 +497,15 @@ def list_unread_emails():
 
         if message_ids is not None:
             logger.info(f"Found {len(message_ids)} unread email IDs.")
-            # You might want to fetch details for each ID here in a real app
-            return jsonify({"unread_message_ids": message_ids}), 200
+            if not details:
+                return jsonify({"unread_message_ids": message_ids}), 200
+            messages = gmail.get_emails(message_ids)
+            if messages is None:
+                return jsonify({"error": "Failed to get email details via Gmail API"}), 500
+            return jsonify({
+                "unread_message_ids": message_ids,
+                "messages": [messages[message_id] for message_id in message_ids if message_id in messages],
+            }), 200
         else:
             logger.error("Failed to list unread emails via Gmail API.")
             return jsonify({"error": "Failed to list emails via Gmail API"}), 500
@@ -1,15 +1,14 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required, get_current_user
 from models.user import User
-from app import db
+from app import db, user_cache
 
 user_bp = Blueprint('user', __name__)
 
 @user_bp.route('/users', methods=['GET', 'PUT'])
 @jwt_required()
 def users():
-    current_user_username = get_jwt_identity()
-    current_user = User.query.filter_by(username=current_user_username).first()
+    current_user = get_current_user()
 
     if current_user.role != 'admin':
         return jsonify({'message': 'Unauthorized'}), 403
@@ -48,5 +47,7 @@ def users():
         user.role = new_role
         user.status = new_status
         db.session.commit()
+        # The role or status of a logged-in user changed; do not serve the cached one
+        user_cache.invalidate(user.username)
 
         return jsonify({'message': 'User updated successfully'}), 200
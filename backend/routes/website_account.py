@@ -1,7 +1,6 @@
 # /config/workspace/todo-app/backend/routes/website_account.py
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
-from models.user import User
+from flask_jwt_extended import jwt_required, get_current_user, get_jwt
 from models.website_account import WebsiteAccount
 from app import db
 
@@ -10,10 +9,9 @@ website_account_bp = Blueprint('website_account', __name__, url_prefix='/website
 # Helper function to get the current user and their role
 def get_current_user_and_role():
     """Retrieves the current user object and their role based on JWT identity and claims."""
-    username = get_jwt_identity()
     claims = get_jwt()
     user_role = claims.get('role', 'normal') # Default to 'normal' if role claim is missing
-    user = User.query.filter_by(username=username).first()
+    user = get_current_user() # Resolved once per request by the JWT user loader
     return user, user_role
 
 # --- Create ---
@@ -1,12 +1,18 @@
 # /config/workspace/todo-app/backend/routes/workflow.py
 import uuid
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required, get_current_user
 # Import joinedload for efficient relationship loading
 from sqlalchemy.orm import joinedload, contains_eager # Import contains_eager
+from sqlalchemy import tuple_, select, func
+import datetime
 # Updated model imports
 from models import User, WebsiteAccount, UserWorkflow, UserWorkflowTypeEnum, UserWorkflowStatusEnum # Updated class reference
-from app import db, engine, dsar_spec_id
+from models import WorkflowStatusDaily, WorkflowCompletionDaily
+from app import db, engine, dsar_spec_id, job_queue, WORKFLOW_EXECUTION_MODE
+from workflows.serializer.errors import WorkflowConflictError
+from workflows.serializer.sql.lock import WorkflowLockTimeout
+from utils.pagination import encode_cursor, decode_cursor, InvalidCursor
 # Removed: from SpiffWorkflow.bpmn.specs.Workflow import WorkflowState
 import logging # Import logging
 
@@ -25,9 +31,10 @@ def create_workflows():
         "website_account_ids": [1, 2, 3],
         "workflow_type": "DSAR"
     }
+    With WORKFLOW_EXECUTION_MODE=queue (default) the instances are queued for worker.py
+    and the response is 202; in 'inline' mode they run before responding (201).
     """
-    current_user_username = get_jwt_identity()
-    current_user = User.query.filter_by(username=current_user_username).first()
+    current_user = get_current_user()
 
     if not current_user:
         return jsonify({"message": "Current user not found"}), 404
@@ -55,14 +62,24 @@ def create_workflows():
     created_workflows_info = []
     errors = []
 
-    # --- Process each account ID ---
+    # --- Validate account IDs and load all accounts with one query ---
+    valid_ids = []
     for account_id in website_account_ids:
         if not isinstance(account_id, int):
             errors.append({"account_id": account_id, "error": "ID must be an integer"})
             continue
+        valid_ids.append(account_id)
 
-        account = WebsiteAccount.query.get(account_id)
+    accounts_by_id = {}
+    if valid_ids:
+        accounts_by_id = {
+            account.id: account
+            for account in WebsiteAccount.query.filter(WebsiteAccount.id.in_(set(valid_ids))).all()
+        }
 
+    accounts = []
+    for account_id in valid_ids:
+        account = accounts_by_id.get(account_id)
         if not account:
             errors.append({"account_id": account_id, "error": "Website account not found"})
             continue
@@ -71,48 +88,51 @@ def create_workflows():
             errors.append({"account_id": account_id, "error": "Forbidden: You do not own this website account"})
             continue
         # --- End Authorization Check ---
+        accounts.append(account)
 
-
+    # --- Step 1: Start all workflow instances and their UserWorkflow records in one transaction ---
+    started = []
+    batches = [accounts] if accounts else []
+    if len(accounts) > 1:
         try:
-            # --- Step 1: Start the core workflow instance ---
-            workflow_instance = engine.start_workflow(dsar_spec_id)
-            unique_workflow_id = str(workflow_instance.wf_id) # Get the UUID as string
-
-            # --- Step 2: Create the UserWorkflow record ---
-            new_user_workflow = UserWorkflow(
-                user_id=account.user_id,
-                website_account_id=account.id,
-                workflow_id=unique_workflow_id,
-                workflow_type=workflow_type_enum,
-                workflow_status=UserWorkflowStatusEnum.RUNNING
-            )
-            db.session.add(new_user_workflow)
-
-            # --- Step 3: Commit the UserWorkflow record ---
-            db.session.commit()
+            started = _start_workflows(accounts, workflow_type_enum)
+            batches = []
+        except Exception as e:
+            db.session.rollback()
+            # One bad account must not fail the others: start them one by one
+            logger.warning(f"Batch start of {len(accounts)} workflow(s) failed, starting them one at a time: {e}")
+            batches = [[account] for account in accounts]
+    for batch in batches:
+        try:
+            started.extend(_start_workflows(batch, workflow_type_enum))
+        except Exception as e:
+            db.session.rollback()
+            errors.append({"account_id": batch[0].id, "error": f"Failed to process: {str(e)}"})
+            logger.error(f"Error starting workflow for account {batch[0].id}: {e}", exc_info=True)
 
-            # --- Step 4: Prepare and Run the workflow instance ---
-            start_task = workflow_instance.ready_tasks[0]
-            # Use the to_dict() method to pass all WebsiteAccount fields
-            # Note: This includes id, user_id, website_url, account_name, account_email, compliance_contact
-            start_task.data['website_account_info'] = account.to_dict() # Renamed key for clarity
-            workflow_instance.run_until_user_input_required()
+    # --- Step 2: Run each workflow instance (inline mode only; otherwise worker.py picks up the jobs) ---
+    for account, workflow_instance, user_workflow_id in started:
+        unique_workflow_id = str(workflow_instance.wf_id)
+        try:
+            if WORKFLOW_EXECUTION_MODE != 'queue':
+                workflow_instance.run_until_user_input_required()
 
             # Collect info for the response
             created_workflows_info.append({
                 "website_account_id": account.id,
-                "user_workflow_id": new_user_workflow.id,
+                "user_workflow_id": user_workflow_id,
                 "workflow_instance_id": unique_workflow_id
             })
 
         except Exception as e:
             db.session.rollback()
             error_msg = f"Failed to process: {str(e)}"
-            errors.append({"account_id": account_id, "error": error_msg})
-            logger.error(f"Error processing account {account_id}: {e}", exc_info=True)
+            errors.append({"account_id": account.id, "error": error_msg})
+            logger.error(f"Error processing account {account.id}: {e}", exc_info=True)
 
     # --- Final Response ---
-    status_code = 201
+    # 202 when the instances were only queued for execution
+    status_code = 202 if WORKFLOW_EXECUTION_MODE == 'queue' else 201
     response_data = {}
 
     if errors and not created_workflows_info:
@@ -137,6 +157,177 @@ def create_workflows():
     return jsonify(response_data), status_code
 
 
+def _start_workflows(accounts, workflow_type_enum):
+    """
+    Starts one workflow per account with its UserWorkflow record (and job, in queue mode)
+    and commits them together. Returns [(account, workflow_instance, user_workflow_id)].
+    """
+    # Use the to_dict() method to pass all WebsiteAccount fields to the start task
+    # Note: This includes id, user_id, website_url, account_name, account_email, compliance_contact
+    start_data = [{'website_account_info': account.to_dict()} for account in accounts]
+    workflow_instances = engine.start_workflows(dsar_spec_id, start_data, commit=False)
+
+    user_workflows = [
+        UserWorkflow(
+            user_id=account.user_id,
+            website_account_id=account.id,
+            workflow_id=str(workflow_instance.wf_id), # Get the UUID as string
+            workflow_type=workflow_type_enum,
+            workflow_status=UserWorkflowStatusEnum.RUNNING
+        )
+        for account, workflow_instance in zip(accounts, workflow_instances)
+    ]
+    db.session.add_all(user_workflows)
+    if WORKFLOW_EXECUTION_MODE == 'queue':
+        # Jobs are committed with the workflows so none can be lost between the two
+        job_queue.enqueue([workflow_instance.wf_id for workflow_instance in workflow_instances], commit=False)
+    db.session.flush()
+    # Read the ids before commit expires the objects (avoids one SELECT per row later)
+    user_workflow_ids = [user_workflow.id for user_workflow in user_workflows]
+    db.session.commit()
+    return list(zip(accounts, workflow_instances, user_workflow_ids))
+
+
+def _parse_enum_list(enum_cls, raw, param):
+    # Comma-separated enum values ('Running') or names ('RUNNING'), case-insensitive
+    by_key = {}
+    for member in enum_cls:
+        by_key[member.value.lower()] = member
+        by_key[member.name.lower()] = member
+    members = []
+    for item in raw.split(','):
+        item = item.strip().lower()
+        if not item:
+            continue
+        if item not in by_key:
+            valid = ', '.join(member.value for member in enum_cls)
+            raise ValueError(f"Invalid {param} '{item}'. Must be one of: {valid}")
+        members.append(by_key[item])
+    return members
+
+
+def _parse_datetime(raw, param):
+    # fromisoformat only accepts a 'Z' suffix (as in JS toISOString()) from Python 3.11 on
+    if raw[-1:] in ('Z', 'z'):
+        raw = raw[:-1] + '+00:00'
+    try:
+        value = datetime.datetime.fromisoformat(raw)
+    except ValueError:
+        raise ValueError(f"Invalid {param} '{raw}'. Expected an ISO 8601 date or datetime.")
+    # created_at/updated_at are naive UTC timestamps
+    if value.tzinfo is not None:
+        value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _workflow_filters(args):
+    """
+    Builds the SQL conditions for the filter query parameters of get_workflows:
+    workflow_status and workflow_type (comma-separated), website_account_id (comma-separated),
+    website_url (substring), created_after/created_before, updated_after/updated_before
+    and active_task (workflows that have that task active). Raises ValueError on bad input.
+    """
+    filters = []
+    if args.get('workflow_status'):
+        filters.append(UserWorkflow.workflow_status.in_(
+            _parse_enum_list(UserWorkflowStatusEnum, args['workflow_status'], 'workflow_status')
+        ))
+    if args.get('workflow_type'):
+        filters.append(UserWorkflow.workflow_type.in_(
+            _parse_enum_list(UserWorkflowTypeEnum, args['workflow_type'], 'workflow_type')
+        ))
+    if args.get('website_account_id'):
+        try:
+            account_ids = [int(item) for item in args['website_account_id'].split(',') if item.strip()]
+        except ValueError:
+            raise ValueError("website_account_id must be a comma-separated list of integers.")
+        filters.append(UserWorkflow.website_account_id.in_(account_ids))
+    if args.get('website_url'):
+        pattern = args['website_url'].replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        filters.append(UserWorkflow.website_account_id.in_(
+            select(WebsiteAccount.id).where(WebsiteAccount.website_url.ilike(f'%{pattern}%', escape='\\'))
+        ))
+    if args.get('created_after'):
+        filters.append(UserWorkflow.created_at >= _parse_datetime(args['created_after'], 'created_after'))
+    if args.get('created_before'):
+        filters.append(UserWorkflow.created_at < _parse_datetime(args['created_before'], 'created_before'))
+    if args.get('updated_after'):
+        filters.append(UserWorkflow.updated_at >= _parse_datetime(args['updated_after'], 'updated_after'))
+    if args.get('updated_before'):
+        filters.append(UserWorkflow.updated_at < _parse_datetime(args['updated_before'], 'updated_before'))
+    if args.get('active_task'):
+        # active_tasks @> '["name"]', served by the GIN index on active_tasks
+        filters.append(UserWorkflow.active_tasks.contains([args['active_task']]))
+    return filters
+
+
+# Largest page served in cursor mode
+MAX_CURSOR_PAGE_SIZE = 100
+
+
+def _get_workflows_page_by_cursor(current_user, scope, fetch_all_users, filters, cursor, per_page):
+    """
+    Keyset pagination for get_workflows: selects only the rendered columns, orders by
+    (created_at, id) descending and starts after the cursor, so no COUNT or OFFSET is run.
+    """
+    per_page = max(1, min(per_page, MAX_CURSOR_PAGE_SIZE))
+    columns = [
+        UserWorkflow.id, UserWorkflow.user_id, UserWorkflow.website_account_id, UserWorkflow.workflow_id,
+        UserWorkflow.workflow_type, UserWorkflow.workflow_status, UserWorkflow.active_tasks,
+        UserWorkflow.created_at, UserWorkflow.updated_at,
+        WebsiteAccount.id.label('account_id'), WebsiteAccount.website_url,
+        WebsiteAccount.account_name, WebsiteAccount.account_email,
+    ]
+    if fetch_all_users:
+        columns.append(User.username)
+    query = db.session.query(*columns).outerjoin(
+        WebsiteAccount, WebsiteAccount.id == UserWorkflow.website_account_id
+    )
+    if fetch_all_users:
+        query = query.outerjoin(User, User.id == UserWorkflow.user_id)
+    else:
+        query = query.filter(UserWorkflow.user_id == current_user.id)
+    query = query.filter(*filters)
+    if cursor:
+        query = query.filter(tuple_(UserWorkflow.created_at, UserWorkflow.id) < tuple_(*decode_cursor(cursor)))
+
+    # One extra row tells whether there is a next page
+    rows = query.order_by(UserWorkflow.created_at.desc(), UserWorkflow.id.desc()).limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    workflows_list = []
+    for row in rows:
+        workflow_data = {
+            'id': row.id,
+            'user_id': row.user_id,
+            'website_account_id': row.website_account_id,
+            'workflow_id': row.workflow_id,
+            'workflow_type': row.workflow_type.value if row.workflow_type else None,
+            'workflow_status': row.workflow_status.value if row.workflow_status else None,
+            'active_tasks': row.active_tasks,
+            'created_at': row.created_at.isoformat() if row.created_at else None,
+            'updated_at': row.updated_at.isoformat() if row.updated_at else None,
+            'website_account': {
+                'id': row.account_id,
+                'website_url': row.website_url,
+                'account_name': row.account_name,
+                'account_email': row.account_email,
+            } if row.account_id is not None else None,
+        }
+        if fetch_all_users:
+            workflow_data['user'] = {'id': row.user_id, 'username': row.username} if row.username is not None else None
+        workflows_list.append(workflow_data)
+
+    pagination_metadata = {
+        'next_cursor': encode_cursor(rows[-1].created_at, rows[-1].id) if has_more else None,
+        'has_more': has_more,
+        'per_page': per_page,
+        'scope': scope
+    }
+    return jsonify({'workflows': workflows_list, 'pagination': pagination_metadata}), 200
+
+
 # --- get_workflows function (keep as is from previous version with scope) ---
 @workflow_bp.route('', methods=['GET'])
 @jwt_required()
@@ -146,9 +337,12 @@ def get_workflows():
     - Admins can use '?scope=all' (default) or '?scope=mine'.
     - Non-admins always get only their own workflows.
     Supports pagination via query parameters 'page' and 'per_page'.
+    Passing 'cursor' (empty for the first page, then pagination.next_cursor) switches to
+    keyset pagination: pages cost the same at any depth and no total count is returned.
+    Filters: workflow_status, workflow_type, website_account_id, website_url, created_after,
+    created_before, updated_after, updated_before and active_task (see _workflow_filters).
     """
-    current_user_username = get_jwt_identity()
-    current_user = User.query.filter_by(username=current_user_username).first()
+    current_user = get_current_user()
 
     if not current_user:
         return jsonify({"message": "Current user not found"}), 404
@@ -159,6 +353,25 @@ def get_workflows():
     # Scope parameter
     scope = request.args.get('scope', 'all' if current_user.role == 'admin' else 'mine').lower()
 
+    try:
+        filters = _workflow_filters(request.args)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    if 'cursor' in request.args:
+        is_admin = current_user.role == 'admin'
+        try:
+            return _get_workflows_page_by_cursor(
+                current_user,
+                scope if is_admin else 'mine',
+                is_admin and scope != 'mine',
+                filters,
+                request.args.get('cursor'),
+                per_page,
+            )
+        except InvalidCursor as e:
+            return jsonify({"message": str(e)}), 400
+
     # Base query
     query = UserWorkflow.query
 
@@ -188,6 +401,8 @@ def get_workflows():
             UserWorkflow.user_id == current_user.id
         )
 
+    query = query.filter(*filters)
+
     # Apply ordering and pagination
     paginated_workflows = query.order_by(
         UserWorkflow.created_at.desc()
@@ -234,6 +449,103 @@ def get_workflows():
     return jsonify({'workflows': workflows_list, 'pagination': pagination_metadata}), 200
 
 
+# Longest range of days served by get_workflow_stats
+MAX_STATS_DAYS = 366
+
+
+def _enum_value(enum_cls, name):
+    # Rollup tables store enum names; the API returns enum values like everywhere else
+    member = enum_cls.__members__.get(name)
+    return member.value if member else name
+
+
+@workflow_bp.route('/stats', methods=['GET'])
+@jwt_required()
+def get_workflow_stats():
+    """
+    Dashboard statistics for admins, read from the rollup tables maintained by the
+    userworkflows trigger (see models/workflow_stats.py), never from userworkflows itself.
+    Query parameters: 'days' (default 30) limits the daily series and completion times,
+    'workflow_type' restricts everything to one type.
+    - totals: all-time counts by current status and by type
+    - daily: workflows created per day, type and current status
+    - completion: count and average run time (instance started to ended) per type and final status
+    """
+    current_user = get_current_user()
+
+    if not current_user:
+        return jsonify({"message": "Current user not found"}), 404
+    if current_user.role != 'admin':
+        return jsonify({"message": "Forbidden: Only admins can view workflow statistics"}), 403
+
+    days = request.args.get('days', 30, type=int)
+    days = max(1, min(days, MAX_STATS_DAYS))
+    since = datetime.datetime.utcnow().date() - datetime.timedelta(days=days - 1)
+    workflow_type = request.args.get('workflow_type')
+    if workflow_type:
+        try:
+            workflow_type = _parse_enum_list(UserWorkflowTypeEnum, workflow_type, 'workflow_type')[0].name
+        except (ValueError, IndexError) as e:
+            return jsonify({"message": str(e) or "Invalid workflow_type"}), 400
+
+    totals_query = db.session.query(
+        WorkflowStatusDaily.workflow_type,
+        WorkflowStatusDaily.workflow_status,
+        func.sum(WorkflowStatusDaily.workflow_count).label('workflow_count'),
+    )
+    daily_query = db.session.query(WorkflowStatusDaily).filter(WorkflowStatusDaily.day >= since)
+    completion_query = db.session.query(
+        WorkflowCompletionDaily.workflow_type,
+        WorkflowCompletionDaily.workflow_status,
+        func.sum(WorkflowCompletionDaily.completed_count).label('completed_count'),
+        func.sum(WorkflowCompletionDaily.total_seconds).label('total_seconds'),
+    ).filter(WorkflowCompletionDaily.day >= since)
+    if workflow_type:
+        totals_query = totals_query.filter(WorkflowStatusDaily.workflow_type == workflow_type)
+        daily_query = daily_query.filter(WorkflowStatusDaily.workflow_type == workflow_type)
+        completion_query = completion_query.filter(WorkflowCompletionDaily.workflow_type == workflow_type)
+
+    # The rollups hold one row per day, type and status, so none of this scales with the workflow count
+    by_status, by_type = {}, {}
+    total = 0
+    for row in totals_query.group_by(WorkflowStatusDaily.workflow_type, WorkflowStatusDaily.workflow_status):
+        count = int(row.workflow_count or 0)
+        if count <= 0:
+            continue
+        status_value = _enum_value(UserWorkflowStatusEnum, row.workflow_status)
+        type_value = _enum_value(UserWorkflowTypeEnum, row.workflow_type)
+        by_status[status_value] = by_status.get(status_value, 0) + count
+        by_type[type_value] = by_type.get(type_value, 0) + count
+        total += count
+
+    daily = [
+        {
+            'date': row.day.isoformat(),
+            'workflow_type': _enum_value(UserWorkflowTypeEnum, row.workflow_type),
+            'workflow_status': _enum_value(UserWorkflowStatusEnum, row.workflow_status),
+            'count': row.workflow_count,
+        }
+        for row in daily_query.order_by(WorkflowStatusDaily.day, WorkflowStatusDaily.workflow_type, WorkflowStatusDaily.workflow_status)
+        if row.workflow_count > 0
+    ]
+
+    completion = []
+    for row in completion_query.group_by(WorkflowCompletionDaily.workflow_type, WorkflowCompletionDaily.workflow_status):
+        completion.append({
+            'workflow_type': _enum_value(UserWorkflowTypeEnum, row.workflow_type),
+            'workflow_status': _enum_value(UserWorkflowStatusEnum, row.workflow_status),
+            'count': int(row.completed_count),
+            'average_seconds': float(row.total_seconds) / row.completed_count if row.completed_count else None,
+        })
+
+    return jsonify({
+        'totals': {'total': total, 'by_status': by_status, 'by_type': by_type},
+        'daily': daily,
+        'completion': completion,
+        'range': {'from': since.isoformat(), 'days': days},
+    }), 200
+
+
 # --- REVERTED update_workflow_status function ---
 @workflow_bp.route('/<string:workflow_instance_id>/status', methods=['PATCH'])
 @jwt_required()
@@ -249,8 +561,7 @@ def update_workflow_status(workflow_instance_id):
     }
     Requires the workflow_instance_id (UUID string) in the URL path.
     """
-    current_user_username = get_jwt_identity()
-    current_user = User.query.filter_by(username=current_user_username).first()
+    current_user = get_current_user()
 
     if not current_user:
         return jsonify({"message": "Current user not found"}), 404
@@ -291,28 +602,37 @@ def update_workflow_status(workflow_instance_id):
         if new_status_enum == UserWorkflowStatusEnum.TERMINATED:
             logger.info(f"User {current_user.username} attempting to terminate SpiffWorkflow instance: {workflow_instance_id}")
             try:
-                instance = engine.get_workflow(workflow_instance_id)
-
-                if instance and instance.workflow:
-                    # --- REVERTED CHECK ---
-                    # Check if the workflow is already completed.
-                    # Note: There's no standard 'is_cancelled()' method. Calling cancel()
-                    # on an already cancelled workflow might be safe or might raise an error,
-                    # depending on SpiffWorkflow's implementation details.
-                    if not instance.workflow.is_completed():
-                        instance.workflow.cancel()
-                        instance.save() # Persist the change via the engine
-                        logger.info(f"Successfully cancelled SpiffWorkflow instance: {workflow_instance_id}")
-                    # Removed the explicit check for already cancelled state
+                # Load, cancel and save under the workflow lock so a worker cannot advance it in between
+                with engine.lock_workflow(workflow_instance_id):
+                    instance = engine.get_workflow(workflow_instance_id)
+
+                    if instance and instance.workflow:
+                        # --- REVERTED CHECK ---
+                        # Check if the workflow is already completed.
+                        # Note: There's no standard 'is_cancelled()' method. Calling cancel()
+                        # on an already cancelled workflow might be safe or might raise an error,
+                        # depending on SpiffWorkflow's implementation details.
+                        if not instance.workflow.is_completed():
+                            instance.workflow.cancel()
+                            # Set TERMINATED in the same commit as the save: the status projection keeps
+                            # it, so the row never passes through FAILED and the rollups count it as TERMINATED
+                            user_workflow.workflow_status = new_status_enum
+                            instance.save() # Persist the change via the engine
+                            logger.info(f"Successfully cancelled SpiffWorkflow instance: {workflow_instance_id}")
+                        # Removed the explicit check for already cancelled state
+                        else:
+                             logger.warning(f"SpiffWorkflow instance {workflow_instance_id} is already completed, cannot cancel.")
+                             # Optionally prevent setting UserWorkflow status to TERMINATED if already COMPLETED.
+                             # return jsonify({"message": "Cannot terminate an already completed workflow"}), 409 # Conflict
+                        # --- END REVERTED CHECK ---
                     else:
-                         logger.warning(f"SpiffWorkflow instance {workflow_instance_id} is already completed, cannot cancel.")
-                         # Optionally prevent setting UserWorkflow status to TERMINATED if already COMPLETED.
-                         # return jsonify({"message": "Cannot terminate an already completed workflow"}), 409 # Conflict
-                    # --- END REVERTED CHECK ---
-                else:
-                    logger.error(f"Could not find SpiffWorkflow instance {workflow_instance_id} in engine despite UserWorkflow record existing.")
-                    return jsonify({"message": "Internal error: Workflow instance not found in engine."}), 500
+                        logger.error(f"Could not find SpiffWorkflow instance {workflow_instance_id} in engine despite UserWorkflow record existing.")
+                        return jsonify({"message": "Internal error: Workflow instance not found in engine."}), 500
 
+            except (WorkflowLockTimeout, WorkflowConflictError):
+                db.session.rollback()
+                logger.warning(f"SpiffWorkflow instance {workflow_instance_id} is busy, cannot cancel right now.")
+                return jsonify({"message": "The workflow instance is being processed, please try again."}), 409
             except Exception as cancel_err:
                 logger.error(f"Error cancelling SpiffWorkflow instance {workflow_instance_id}: {cancel_err}", exc_info=True)
                 db.session.rollback() # Rollback potential engine changes
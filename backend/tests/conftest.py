@@ -0,0 +1,11 @@
+# /config/workspace/todo-app/backend/tests/conftest.py
+"""
+The tests import the app, which connects to DATABASE_URL and creates its tables on import,
+so they need the same Postgres database the app does:
+
+    DATABASE_URL=postgresql+psycopg2://... python -m pytest -q tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -0,0 +1,78 @@
+# /config/workspace/todo-app/backend/tests/test_delta_persistence.py
+"""Round trips of workflows saved in delta persistence mode (only changed task rows are written)."""
+import os
+import time
+
+import pytest
+from SpiffWorkflow import TaskState
+from SpiffWorkflow.bpmn.script_engine import TaskDataEnvironment
+from SpiffWorkflow.spiff.parser import SpiffBpmnParser
+from SpiffWorkflow.spiff.serializer import DEFAULT_CONFIG
+
+from app import app, db
+from workflows.engine import BpmnEngine
+from workflows.serializer.sql.serializer import SqlSerializer, PERSISTENCE_DELTA
+
+BPMN_FILE = os.path.join(os.path.dirname(__file__), 'data', 'cycle_timer.bpmn')
+
+
+@pytest.fixture
+def engine():
+    with app.app_context():
+        serializer = SqlSerializer(db, registry=SqlSerializer.configure(DEFAULT_CONFIG), persistence=PERSISTENCE_DELTA)
+        engine = BpmnEngine(SpiffBpmnParser(), serializer, TaskDataEnvironment({}))
+        engine.started = []
+        yield engine
+        for wf_id in engine.started:
+            engine.delete_workflow(wf_id)
+
+
+def start(engine):
+    spec_id = engine.add_spec('Process_CycleTimer', {BPMN_FILE}, None)
+    instance = engine.start_workflow(spec_id)
+    engine.started.append(instance.wf_id)
+    instance.run_until_user_input_required()
+    return instance
+
+
+def reminder(instance):
+    return next(task for task in instance.workflow.get_tasks(state=TaskState.WAITING) if task.task_spec.name == 'Event_Reminder')
+
+
+def assert_round_trips(engine, instance):
+    saved = engine.serializer.to_dict(instance.workflow)
+    loaded = engine.serializer.to_dict(engine.get_workflow(instance.wf_id).workflow)
+    assert loaded['tasks'] == saved['tasks']
+    assert loaded['data'] == saved['data']
+
+
+def test_unchanged_workflow_round_trips(engine):
+    instance = start(engine)
+    instance.save()
+    assert_round_trips(engine, instance)
+
+
+def test_internal_data_change_without_state_change_is_saved(engine):
+    instance = start(engine)
+    task = reminder(instance)
+    last_state_change = task.last_state_change
+    task.internal_data['marker'] = 'changed'
+    instance.save()
+
+    assert task.last_state_change == last_state_change
+    assert_round_trips(engine, instance)
+
+
+def test_cycle_timer_progress_is_saved(engine):
+    instance = start(engine)
+    cycles = reminder(instance).internal_data['event_value']['cycles']
+
+    # Let two 0.2s cycles pass: the timer fires its branch twice and stays WAITING
+    time.sleep(0.45)
+    instance.run_ready_events()
+    instance.run_until_user_input_required()
+    instance.save()
+
+    loaded = engine.get_workflow(instance.wf_id)
+    assert reminder(loaded).internal_data['event_value']['cycles'] < cycles
+    assert_round_trips(engine, instance)
@@ -0,0 +1,29 @@
+# /config/workspace/todo-app/backend/tests/test_workflow_filters.py
+"""Parsing of the GET /workflows filter query parameters."""
+import datetime
+
+import pytest
+
+from routes.workflow import _parse_datetime
+
+
+@pytest.mark.parametrize('raw, expected', [
+    # Naive values are taken as UTC, like created_at/updated_at
+    ('2026-01-01', datetime.datetime(2026, 1, 1)),
+    ('2026-01-01T12:30:00', datetime.datetime(2026, 1, 1, 12, 30)),
+    # Offsets are converted to naive UTC
+    ('2026-01-01T12:30:00+02:00', datetime.datetime(2026, 1, 1, 10, 30)),
+    ('2026-01-01T12:30:00-05:00', datetime.datetime(2026, 1, 1, 17, 30)),
+    # 'Z', as produced by JS Date.toISOString()
+    ('2026-01-01T00:00:00Z', datetime.datetime(2026, 1, 1)),
+    ('2026-01-01T00:00:00.000Z', datetime.datetime(2026, 1, 1)),
+    ('2026-01-01T00:00:00.250z', datetime.datetime(2026, 1, 1, 0, 0, 0, 250000)),
+])
+def test_parse_datetime(raw, expected):
+    assert _parse_datetime(raw, 'created_after') == expected
+
+
+@pytest.mark.parametrize('raw', ['yesterday', '2026-13-01', 'Z', ''])
+def test_parse_datetime_rejects_invalid_values(raw):
+    with pytest.raises(ValueError, match='created_after'):
+        _parse_datetime(raw, 'created_after')
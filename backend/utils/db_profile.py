@@ -0,0 +1,112 @@
+# /config/workspace/todo-app/backend/utils/db_profile.py
+from sqlalchemy.engine import make_url
+
+
+def database_driver(database_url):
+    """Returns the DBAPI driver SQLAlchemy uses for database_url, e.g. 'psycopg2' or 'psycopg'."""
+    # A bare postgresql:// URL picks the dialect's default driver, which depends on the SQLAlchemy version
+    return make_url(database_url).get_dialect().driver
+
+
+class DatabaseProfile:
+    """
+    SQLAlchemy engine settings read from DB_* environment variables.
+
+    Every gunicorn worker and worker.py process has its own pool, so the number of
+    connections a deployment can open is processes * (pool_size + max_overflow);
+    keep that below the server's max_connections. benchmarks/load_test.py measures
+    the /workflows endpoints under a given profile.
+
+    :param pool_size: connections kept open per process
+    :param max_overflow: extra connections opened under load and closed when returned
+    :param pool_timeout: seconds to wait for a free connection before failing the request
+    :param pool_recycle: replace connections older than this many seconds (-1 never)
+    :param pool_pre_ping: test each connection when it is checked out (survives database restarts)
+    :param pool_use_lifo: reuse the most recently returned connection, so idle ones can time out
+    :param query_cache_size: compiled statements cached per engine by SQLAlchemy
+    :param prepare_threshold: psycopg 3 only: prepare a statement on the server after it ran
+        this many times on a connection (None keeps the driver default, 0 prepares at once)
+    :param statement_timeout_ms: server-side statement timeout (None for the server default)
+    :param application_name: shown in pg_stat_activity
+    """
+
+    def __init__(self, pool_size=5, max_overflow=10, pool_timeout=30, pool_recycle=1800, pool_pre_ping=True,
+                 pool_use_lifo=False, query_cache_size=500, prepare_threshold=None, statement_timeout_ms=None,
+                 application_name=None):
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.pool_timeout = pool_timeout
+        self.pool_recycle = pool_recycle
+        self.pool_pre_ping = pool_pre_ping
+        self.pool_use_lifo = pool_use_lifo
+        self.query_cache_size = query_cache_size
+        self.prepare_threshold = prepare_threshold
+        self.statement_timeout_ms = statement_timeout_ms
+        self.application_name = application_name
+
+    @classmethod
+    def from_env(cls, environ):
+        """Builds a profile from DB_* variables; unset variables keep the defaults above."""
+        def flag(name, default):
+            value = environ.get(name)
+            return default if value is None else value.lower() in ('1', 'true', 'yes', 'on')
+
+        def number(name, default, convert=int):
+            value = environ.get(name)
+            return default if value in (None, '') else convert(value)
+
+        return cls(
+            pool_size=number('DB_POOL_SIZE', 5),
+            max_overflow=number('DB_MAX_OVERFLOW', 10),
+            pool_timeout=number('DB_POOL_TIMEOUT', 30, float),
+            pool_recycle=number('DB_POOL_RECYCLE', 1800),
+            pool_pre_ping=flag('DB_POOL_PRE_PING', True),
+            pool_use_lifo=flag('DB_POOL_USE_LIFO', False),
+            query_cache_size=number('DB_QUERY_CACHE_SIZE', 500),
+            prepare_threshold=number('DB_PREPARE_THRESHOLD', None),
+            statement_timeout_ms=number('DB_STATEMENT_TIMEOUT_MS', None),
+            application_name=environ.get('DB_APPLICATION_NAME') or None,
+        )
+
+    def engine_options(self, database_url, json_codec=None):
+        """
+        Returns SQLALCHEMY_ENGINE_OPTIONS for database_url. json_codec (see
+        workflows.serializer.codec) encodes and decodes JSON/JSONB columns; the
+        psycopg dialects install the decoder in the driver, so JSONB values are
+        parsed once, by the codec.
+        """
+        options = {
+            'pool_size': self.pool_size,
+            'max_overflow': self.max_overflow,
+            'pool_timeout': self.pool_timeout,
+            'pool_recycle': self.pool_recycle,
+            'pool_pre_ping': self.pool_pre_ping,
+            'pool_use_lifo': self.pool_use_lifo,
+            'query_cache_size': self.query_cache_size,
+        }
+        if json_codec is not None:
+            options['json_serializer'] = json_codec.dumps
+            options['json_deserializer'] = json_codec.loads
+
+        connect_args = {}
+        server_options = []
+        if self.statement_timeout_ms is not None:
+            server_options.append(f'-c statement_timeout={self.statement_timeout_ms}')
+        if server_options:
+            connect_args['options'] = ' '.join(server_options)
+        if self.application_name:
+            connect_args['application_name'] = self.application_name
+        if self.prepare_threshold is not None and database_driver(database_url) == 'psycopg':
+            # psycopg2 has no server-side prepared statements; psycopg 3 prepares per connection
+            connect_args['prepare_threshold'] = self.prepare_threshold
+        if connect_args:
+            options['connect_args'] = connect_args
+        return options
+
+    def describe(self):
+        return (
+            f"pool_size={self.pool_size} max_overflow={self.max_overflow} pool_timeout={self.pool_timeout} "
+            f"pool_recycle={self.pool_recycle} pre_ping={self.pool_pre_ping} lifo={self.pool_use_lifo} "
+            f"query_cache_size={self.query_cache_size} prepare_threshold={self.prepare_threshold} "
+            f"statement_timeout_ms={self.statement_timeout_ms}"
+        )
@@ -1,17 +1,24 @@
 # /config/workspace/todo-app/backend/utils/email.py
 import os.path
 import base64
+import datetime
 import logging
+import queue
+import threading
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
 from email import encoders
 
+from google.auth.credentials import AnonymousCredentials
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
+from googleapiclient.http import BatchHttpRequest
 from googleapiclient.errors import HttpError
+import httplib2
 
 # --- Configuration ---
 
@@ -30,6 +37,19 @@ BACKEND_DIR = os.path.dirname(UTILS_DIR)
 CONFIG_DIR = os.path.join(BACKEND_DIR, 'config')
 CREDENTIALS_PATH = os.path.join(CONFIG_DIR, 'credentials.json')
 TOKEN_PATH = os.path.join(CONFIG_DIR, 'token.json')
+# Send Gmail API calls to another server, e.g. benchmarks/fake_gmail.py (http://localhost:8081/).
+# No OAuth is done then: for local testing only.
+GMAIL_API_ENDPOINT = os.environ.get('GMAIL_API_ENDPOINT')
+# Seconds between checks of the shared client's token, and how long before expiry it is refreshed
+GMAIL_TOKEN_REFRESH_INTERVAL = float(os.environ.get('GMAIL_TOKEN_REFRESH_INTERVAL', 60))
+GMAIL_TOKEN_REFRESH_MARGIN = float(os.environ.get('GMAIL_TOKEN_REFRESH_MARGIN', 300))
+GMAIL_HTTP_TIMEOUT = float(os.environ.get('GMAIL_HTTP_TIMEOUT', 30))
+# Idle keep-alive connections kept by the shared client
+GMAIL_HTTP_POOL_SIZE = int(os.environ.get('GMAIL_HTTP_POOL_SIZE', 10))
+# Messages per Gmail batch request (at most 100)
+GMAIL_BATCH_SIZE = int(os.environ.get('GMAIL_BATCH_SIZE', 50))
+# The batch endpoint is not derived from the discovery document when GMAIL_API_ENDPOINT is set
+GMAIL_BATCH_URI = (GMAIL_API_ENDPOINT or 'https://gmail.googleapis.com/').rstrip('/') + '/batch/gmail/v1'
 
 logger = logging.getLogger(__name__)
 
@@ -39,11 +59,37 @@ class GmailUtils:
 
     Handles OAuth 2.0 authentication and provides simplified methods for
     common email operations.
+
+    Use GmailUtils.shared() in request handlers: it returns one client per process,
+    built once from the bundled discovery document. API calls are thread-safe: each
+    borrows a keep-alive HTTP connection from a pool and returns it afterwards, and a
+    background thread refreshes the token before it expires, so a call costs one round trip.
     """
+    _shared = None
+    _shared_pid = None
+    _shared_lock = threading.Lock()
+
     def __init__(self):
         """Initializes the GmailUtils class and authenticates the user."""
+        self.credentials = None
+        self._credentials_lock = threading.Lock()
+        self._http_pool = queue.LifoQueue(maxsize=GMAIL_HTTP_POOL_SIZE)
+        self._refresher = None
         self.service = self._authenticate()
 
+    @classmethod
+    def shared(cls):
+        """Returns the process-wide client, creating it (and its token refresher) on first use."""
+        # A forked process must not share the parent's connections or refresher thread
+        if cls._shared is None or cls._shared_pid != os.getpid():
+            with cls._shared_lock:
+                if cls._shared is None or cls._shared_pid != os.getpid():
+                    gmail = cls()
+                    if gmail.service:
+                        gmail.start_token_refresh()
+                    cls._shared, cls._shared_pid = gmail, os.getpid()
+        return cls._shared
+
     def _authenticate(self):
         """
         Handles the OAuth 2.0 authentication flow for the Gmail API.
@@ -52,6 +98,16 @@ class GmailUtils:
         Returns:
             googleapiclient.discovery.Resource: An authorized Gmail API service instance.
         """
+        if GMAIL_API_ENDPOINT:
+            logger.info(f"Using Gmail API endpoint {GMAIL_API_ENDPOINT} without authentication.")
+            self.credentials = AnonymousCredentials()
+            return build(
+                'gmail', 'v1',
+                credentials=self.credentials,
+                client_options={'api_endpoint': GMAIL_API_ENDPOINT},
+                static_discovery=True,
+            )
+
         creds = None
         # The file token.json stores the user's access and refresh tokens, and is
         # created automatically when the authorization flow completes for the first time.
@@ -78,24 +134,84 @@ class GmailUtils:
 
             # Save the credentials for the next run
             if creds:
-                try:
-                    with open(TOKEN_PATH, 'w') as token:
-                        token.write(creds.to_json())
-                    logger.info(f"Credentials saved to {TOKEN_PATH}")
-                except Exception as e:
-                    logger.error(f"Error saving token file {TOKEN_PATH}: {e}")
+                self._save_credentials(creds)
             else:
                  logger.error("Failed to obtain valid credentials.")
                  return None # Cannot proceed without credentials
 
+        self.credentials = creds
         try:
-            service = build('gmail', 'v1', credentials=creds)
+            # The discovery document bundled with googleapiclient; no request to fetch it
+            service = build('gmail', 'v1', credentials=creds, static_discovery=True)
             logger.info("Gmail API service built successfully.")
             return service
         except Exception as e:
             logger.error(f"Error building Gmail service: {e}")
             return None
 
+    def _save_credentials(self, creds):
+        try:
+            with open(TOKEN_PATH, 'w') as token:
+                token.write(creds.to_json())
+            logger.info(f"Credentials saved to {TOKEN_PATH}")
+        except Exception as e:
+            logger.error(f"Error saving token file {TOKEN_PATH}: {e}")
+
+    # --- Connections and token refresh ---
+
+    def _execute(self, request):
+        """Executes a googleapiclient request on a pooled connection."""
+        # httplib2.Http is not thread-safe, so a connection is used by one call at a time
+        try:
+            http = self._http_pool.get_nowait()
+        except queue.Empty:
+            http = AuthorizedHttp(self.credentials, http=httplib2.Http(timeout=GMAIL_HTTP_TIMEOUT))
+        # If the call raises, the connection may be half-read and is dropped instead of returned
+        result = request.execute(http=http)
+        try:
+            self._http_pool.put_nowait(http)
+        except queue.Full:
+            pass
+        return result
+
+    def refresh_token_if_needed(self, margin_seconds=GMAIL_TOKEN_REFRESH_MARGIN):
+        """Refreshes the access token if it expires within margin_seconds. Returns True if it was refreshed."""
+        creds = self.credentials
+        if not isinstance(creds, Credentials) or not creds.refresh_token:
+            return False
+        with self._credentials_lock:
+            # google-auth keeps expiry as naive UTC
+            deadline = datetime.datetime.utcnow() + datetime.timedelta(seconds=margin_seconds)
+            if creds.valid and creds.expiry is not None and creds.expiry > deadline:
+                return False
+            creds.refresh(Request())
+            self._save_credentials(creds)
+            logger.info(f"Gmail access token refreshed, valid until {creds.expiry}.")
+            return True
+
+    def start_token_refresh(self, interval_seconds=GMAIL_TOKEN_REFRESH_INTERVAL):
+        """Starts a daemon thread that calls refresh_token_if_needed every interval_seconds."""
+        if self._refresher is not None or interval_seconds <= 0:
+            return
+        stop = threading.Event()
+
+        def refresh_loop():
+            while not stop.wait(interval_seconds):
+                try:
+                    self.refresh_token_if_needed()
+                except Exception as e:
+                    # AuthorizedHttp still refreshes on a 401 if this keeps failing
+                    logger.error(f"Error refreshing Gmail token in the background: {e}", exc_info=True)
+
+        self._refresher = threading.Thread(target=refresh_loop, name='gmail-token-refresh', daemon=True)
+        self._refresher_stop = stop
+        self._refresher.start()
+
+    def stop_token_refresh(self):
+        if self._refresher is not None:
+            self._refresher_stop.set()
+            self._refresher = None
+
     def _run_auth_flow(self):
         """Runs the installed application flow to get user consent."""
         if not os.path.exists(CREDENTIALS_PATH):
@@ -130,7 +246,8 @@ class GmailUtils:
             logger.error(f"Error during authentication flow: {e}")
             return None
 
-    def send_email(self, to_email: str, subject: str, body_text: str, sender_email: str = 'me'):
+    def send_email(self, to_email: str, subject: str, body_text: str, sender_email: str = 'me',
+                   raise_errors: bool = False):
         """
         Sends an email using the authenticated Gmail account.
 
@@ -139,12 +256,16 @@ class GmailUtils:
             subject (str): The subject of the email.
             body_text (str): The plain text body of the email.
             sender_email (str): The sender's email address ('me' for the authenticated user).
+            raise_errors (bool): Raise errors instead of logging them and returning None, so the
+                                 caller can tell a rate limit from a rejected message.
 
         Returns:
             dict: The sent message resource, or None if an error occurred.
         """
         if not self.service:
             logger.error("Gmail service not available. Cannot send email.")
+            if raise_errors:
+                raise RuntimeError("Gmail service not available")
             return None
 
         try:
@@ -158,16 +279,20 @@ class GmailUtils:
             create_message = {'raw': encoded_message}
 
             # Send the message using the Gmail API
-            send_message = (self.service.users().messages()
-                            .send(userId=sender_email, body=create_message).execute())
+            send_message = self._execute(self.service.users().messages()
+                                         .send(userId=sender_email, body=create_message))
             logger.info(f"Email sent successfully to {to_email}. Message ID: {send_message['id']}")
             return send_message
 
         except HttpError as error:
             logger.error(f'An HTTP error occurred while sending email: {error}')
+            if raise_errors:
+                raise
             return None
         except Exception as e:
             logger.error(f'An unexpected error occurred while sending email: {e}')
+            if raise_errors:
+                raise
             return None
 
     def list_emails(self, query: str = 'is:unread', max_results: int = 10, user_id: str = 'me'):
@@ -186,11 +311,11 @@ class GmailUtils:
             logger.error("Gmail service not available. Cannot list emails.")
             return None
         try:
-            response = self.service.users().messages().list(
+            response = self._execute(self.service.users().messages().list(
                 userId=user_id,
                 q=query,
                 maxResults=max_results
-            ).execute()
+            ))
 
             messages = response.get('messages', [])
             message_ids = [msg['id'] for msg in messages]
@@ -222,11 +347,11 @@ class GmailUtils:
             logger.error("Gmail service not available. Cannot get email details.")
             return None
         try:
-            message = self.service.users().messages().get(
+            message = self._execute(self.service.users().messages().get(
                 userId=user_id,
                 id=message_id,
                 format=format # 'metadata', 'full', 'raw'
-            ).execute()
+            ))
             # logger.debug(f"Retrieved details for message ID: {message_id}") # Use debug for potentially large output
             return message
 
@@ -237,6 +362,117 @@ class GmailUtils:
             logger.error(f'An unexpected error occurred while getting email details for {message_id}: {e}')
             return None
 
+    def list_message_ids(self, query: str = 'in:inbox', user_id: str = 'me', limit: int = None):
+        """
+        Lists the ids of all messages matching a query, following nextPageToken
+        (500 ids per call), up to limit ids if given.
+
+        Returns:
+            list: Message ids, newest first, or None if an error occurred.
+        """
+        if not self.service:
+            logger.error("Gmail service not available. Cannot list emails.")
+            return None
+        message_ids, page_token = [], None
+        try:
+            while limit is None or len(message_ids) < limit:
+                page_size = 500 if limit is None else min(500, limit - len(message_ids))
+                response = self._execute(self.service.users().messages().list(
+                    userId=user_id, q=query, maxResults=page_size, pageToken=page_token
+                ))
+                message_ids.extend(msg['id'] for msg in response.get('messages', []))
+                page_token = response.get('nextPageToken')
+                if not page_token:
+                    break
+            logger.info(f"Found {len(message_ids)} emails matching query: '{query}'")
+            return message_ids
+        except HttpError as error:
+            logger.error(f'An HTTP error occurred while listing emails: {error}')
+            return None
+
+    def get_emails(self, message_ids, user_id: str = 'me', format: str = 'metadata',
+                   batch_size: int = GMAIL_BATCH_SIZE, errors: dict = None):
+        """
+        Retrieves many messages through the Gmail batch endpoint, batch_size per HTTP call
+        (Gmail accepts up to 100; larger batches are more likely to be rate limited).
+
+        Args:
+            message_ids (iterable): Ids of the messages to retrieve.
+            format (str): As for get_email_details.
+            errors (dict): If given, receives message id -> exception for messages that failed.
+
+        Returns:
+            dict: Message id -> message resource for the messages retrieved, or None if
+                  the service is not available or a whole batch failed.
+        """
+        if not self.service:
+            logger.error("Gmail service not available. Cannot get email details.")
+            return None
+        messages = {}
+
+        def on_response(request_id, response, exception):
+            if exception is not None:
+                logger.warning(f"Could not get email details for {request_id}: {exception}")
+                if errors is not None:
+                    errors[request_id] = exception
+            else:
+                messages[request_id] = response
+
+        # Batch request ids must be unique
+        message_ids = list(dict.fromkeys(message_ids))
+        try:
+            for start in range(0, len(message_ids), batch_size):
+                batch = BatchHttpRequest(callback=on_response, batch_uri=GMAIL_BATCH_URI)
+                for message_id in message_ids[start:start + batch_size]:
+                    batch.add(
+                        self.service.users().messages().get(userId=user_id, id=message_id, format=format),
+                        request_id=message_id,
+                    )
+                self._execute(batch)
+            logger.info(f"Retrieved {len(messages)} of {len(message_ids)} email(s) in batches of {batch_size}.")
+            return messages
+        except HttpError as error:
+            logger.error(f'An HTTP error occurred while getting email details in batch: {error}')
+            return None
+
+    def get_history_id(self, user_id: str = 'me'):
+        """Returns the mailbox's current historyId (the starting point for list_new_message_ids)."""
+        profile = self._execute(self.service.users().getProfile(userId=user_id))
+        return profile['historyId']
+
+    def list_new_message_ids(self, start_history_id, user_id: str = 'me', label_id: str = 'INBOX'):
+        """
+        Lists the ids of messages added to label_id since start_history_id (users.history.list).
+
+        Returns:
+            tuple: (message ids, historyId to resume from next time), or (None, None) if
+                   start_history_id is too old for Gmail to answer (a full sync is needed).
+        Raises:
+            HttpError: For any other API error.
+        """
+        message_ids, page_token = [], None
+        while True:
+            try:
+                response = self._execute(self.service.users().history().list(
+                    userId=user_id,
+                    startHistoryId=start_history_id,
+                    historyTypes=['messageAdded'],
+                    labelId=label_id,
+                    maxResults=500,
+                    pageToken=page_token,
+                ))
+            except HttpError as error:
+                if error.resp.status == 404:
+                    logger.warning(f"Gmail history {start_history_id} has expired, a full sync is needed.")
+                    return None, None
+                raise
+            for record in response.get('history', []):
+                for added in record.get('messagesAdded', []):
+                    message_ids.append(added['message']['id'])
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                return list(dict.fromkeys(message_ids)), response['historyId']
+
     def parse_email_body(self, message_payload: dict) -> str:
         """
         Parses the body from a message payload.
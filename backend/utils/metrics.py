@@ -0,0 +1,179 @@
+# /config/workspace/todo-app/backend/utils/metrics.py
+"""
+In-process metrics and tracing.
+
+Counters and histograms are kept in memory and rendered in the Prometheus text
+format by /health/metrics, so no external service is needed. Each gunicorn
+worker has its own registry; scrape every worker (or aggregate) accordingly.
+
+Spans go through the OpenTelemetry API when it is installed and are no-ops
+otherwise; without a configured OpenTelemetry SDK the API itself does nothing.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:
+    otel_trace = None
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Metric:
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Metric {self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _format_labels(self, key, extra=None):
+        pairs = list(zip(self.labelnames, key)) + (extra or [])
+        if not pairs:
+            return ''
+        escaped = [(name, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for name, value in pairs]
+        return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self._render_samples(items))
+        return lines
+
+
+class Counter(_Metric):
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _render_samples(self, items):
+        return [f'{self.name}{self._format_labels(key)} {value}' for key, value in items]
+
+
+class Histogram(_Metric):
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket counts (last slot is +Inf), sum
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+
+    def _render_samples(self, items):
+        lines = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{self.name}_bucket{self._format_labels(key, [("le", le)])} {cumulative}')
+            lines.append(f'{self.name}_sum{self._format_labels(key)} {total}')
+            lines.append(f'{self.name}_count{self._format_labels(key)} {cumulative}')
+        return lines
+
+
+class Registry:
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """Returns every metric in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def span(name, **attributes):
+    """Opens an OpenTelemetry span when the API is installed, otherwise does nothing."""
+    if otel_trace is None:
+        return nullcontext()
+    return otel_trace.get_tracer('todo-app.workflows').start_as_current_span(
+        name, attributes={key: str(value) for key, value in attributes.items()}
+    )
+
+
+@contextmanager
+def timed(histogram, span_name=None, **labels):
+    """Observes the duration of the block in histogram and wraps it in a span."""
+    started = time.perf_counter()
+    with span(span_name or histogram.name, **labels):
+        try:
+            yield
+        finally:
+            histogram.observe(time.perf_counter() - started, **labels)
+
+
+# --- Workflow metrics ---
+
+WORKFLOW_PHASE_SECONDS = REGISTRY.histogram(
+    'workflow_phase_seconds',
+    'Time spent per workflow engine/serializer phase (parse, restore_spec, restore, run, serialize, commit, status_projection).',
+    ['phase'],
+)
+WORKFLOW_SCRIPT_SECONDS = REGISTRY.histogram(
+    'workflow_script_seconds',
+    'Time spent executing BPMN script tasks.',
+    ['spec', 'task_spec'],
+)
+WORKFLOW_SAVES_TOTAL = REGISTRY.counter(
+    'workflow_saves_total',
+    'Workflow saves written to the serializer.',
+    ['spec'],
+)
+WORKFLOW_SAVES_PER_RUN = REGISTRY.histogram(
+    'workflow_saves_per_run',
+    'Saves written while running one instance to its next stable point.',
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+)
+WORKFLOW_TASK_RUNS_TOTAL = REGISTRY.counter(
+    'workflow_task_runs_total',
+    'Completed task runs.',
+    ['spec'],
+)
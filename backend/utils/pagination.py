@@ -0,0 +1,31 @@
+# /config/workspace/todo-app/backend/utils/pagination.py
+"""
+Opaque cursors for keyset pagination.
+
+A cursor encodes the sort key of the last row of a page. The next page is every
+row strictly after it in the sort order, which an index on the sort key serves
+without counting or skipping rows, so every page costs the same.
+"""
+import base64
+import datetime
+import json
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(created_at, row_id):
+    """Returns the cursor for a (created_at, id) sort key."""
+    raw = json.dumps([created_at.isoformat(), row_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Returns the (created_at, id) sort key of a cursor made by encode_cursor. Raises InvalidCursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+        return datetime.datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}") from e
@@ -0,0 +1,59 @@
+# /config/workspace/todo-app/backend/utils/user_cache.py
+"""
+Process-local cache of the users behind JWT identities.
+
+The JWT user loader (app.py) resolves the current user once per request; this
+cache lets it skip the database for users seen in the last few seconds. Entries
+are plain snapshots, not ORM objects, so they are safe to share between threads
+and sessions. Each process has its own cache: a change made through /users is
+visible at once in the process that made it and within ttl_seconds elsewhere.
+"""
+import threading
+import time
+from collections import namedtuple
+
+# What routes need of the current user; routes that modify the user load the row themselves
+CachedUser = namedtuple('CachedUser', ['id', 'username', 'role', 'status'])
+
+
+class UserCache:
+
+    def __init__(self, ttl_seconds=30.0, max_size=10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, username, load):
+        """
+        Returns the CachedUser for username, calling load(username) -> User or None on a miss.
+        Missing users are not cached.
+        """
+        if self.ttl_seconds <= 0:
+            return self._snapshot(load(username))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(username)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+        user = self._snapshot(load(username))
+        if user is not None:
+            with self._lock:
+                if len(self._entries) >= self.max_size:
+                    self._entries.clear()
+                self._entries[username] = (now + self.ttl_seconds, user)
+        return user
+
+    def invalidate(self, username=None):
+        """Drops username from the cache, or every entry when username is None."""
+        with self._lock:
+            if username is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(username, None)
+
+    @staticmethod
+    def _snapshot(user):
+        if user is None:
+            return None
+        return CachedUser(id=user.id, username=user.username, role=user.role, status=user.status)
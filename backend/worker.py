@@ -0,0 +1,188 @@
+# /config/workspace/todo-app/backend/worker.py
+"""
+Workflow execution worker.
+
+Claims jobs from the workflow_job table and advances each instance through the
+BpmnEngine until it needs user input, waits on an event or ends. Each worker
+also runs the timer scheduler every WORKER_TIMER_INTERVAL seconds, which
+queues instances whose timer events are due. Run as many of these as needed,
+independently of the web workers:
+
+    python worker.py
+
+WORKER_MODE=thread (default) advances up to WORKER_CONCURRENCY instances at once
+on a thread pool; WORKER_MODE=process forks WORKER_CONCURRENCY worker processes
+(restarted if they die) for script-heavy workloads. Either way an instance is
+only advanced while holding its workflow lock; a job whose instance is locked
+elsewhere is put back for WORKER_LOCK_RETRY_SECONDS.
+"""
+import os
+import signal
+import socket
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from app import app, db, engine, job_queue
+from workflows.serializer.errors import WorkflowConflictError
+from workflows.serializer.sql.lock import WorkflowLockTimeout
+from workflows.serializer.sql.scheduler import TimerScheduler
+
+logger = logging.getLogger('worker')
+
+WORKER_ID = os.environ.get('WORKER_ID', f'{socket.gethostname()}-{os.getpid()}')
+WORKER_MODE = os.environ.get('WORKER_MODE', 'thread').lower()
+CONCURRENCY = int(os.environ.get('WORKER_CONCURRENCY', 4))
+BATCH_SIZE = int(os.environ.get('WORKER_BATCH_SIZE', 10))
+POLL_INTERVAL = float(os.environ.get('WORKER_POLL_INTERVAL', 1.0))
+LOCK_RETRY_SECONDS = int(os.environ.get('WORKER_LOCK_RETRY_SECONDS', 5))
+# Seconds between timer scheduler ticks (0 disables the scheduler in this worker)
+TIMER_INTERVAL = float(os.environ.get('WORKER_TIMER_INTERVAL', 30))
+
+timer_scheduler = TimerScheduler(
+    db,
+    job_queue,
+    batch_size=int(os.environ.get('WORKER_TIMER_BATCH_SIZE', 500)),
+    retry_seconds=int(os.environ.get('WORKER_TIMER_RETRY_SECONDS', 300)),
+)
+
+_stopping = False
+# pid -> index of the forked worker processes (process mode, parent only)
+_children = {}
+
+
+def _request_stop(signum, frame):
+    global _stopping
+    logger.info(f"Worker {WORKER_ID} received signal {signum}, stopping after the current batch.")
+    _stopping = True
+    for pid in list(_children):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+
+def _advance(instance):
+    # Fire any timers that are due (the job may come from the timer scheduler)
+    instance.run_ready_events()
+    instance.run_until_user_input_required()
+
+
+def run_job(job_id, workflow_id):
+    """Advances one workflow instance and removes its job, or records the failure."""
+    try:
+        with engine.lock_workflow(workflow_id, timeout=0):
+            engine.retry_on_conflict(workflow_id, _advance)
+            job_queue.complete(job_id)
+        logger.info(f"Job {job_id}: advanced workflow {workflow_id}.")
+    except (WorkflowLockTimeout, WorkflowConflictError) as e:
+        db.session.rollback()
+        logger.info(f"Job {job_id}: workflow {workflow_id} is busy ({e}), retrying in {LOCK_RETRY_SECONDS}s.")
+        try:
+            job_queue.release(job_id, LOCK_RETRY_SECONDS)
+        except Exception as release_error:
+            db.session.rollback()
+            logger.error(f"Job {job_id}: could not release job: {release_error}", exc_info=True)
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Job {job_id}: error advancing workflow {workflow_id}: {e}", exc_info=True)
+        try:
+            job_queue.fail(job_id, e)
+        except Exception as fail_error:
+            db.session.rollback()
+            logger.error(f"Job {job_id}: could not record failure: {fail_error}", exc_info=True)
+
+
+def _run_job_in_thread(job_id, workflow_id):
+    # Each thread has its own app context and therefore its own session
+    with app.app_context():
+        try:
+            run_job(job_id, workflow_id)
+        finally:
+            db.session.remove()
+
+
+def run_once(worker_id, executor=None):
+    """Claims and runs one batch of jobs. Returns the number of jobs claimed."""
+    claimed = job_queue.claim(worker_id, limit=BATCH_SIZE)
+    if executor is None:
+        for job_id, workflow_id in claimed:
+            run_job(job_id, workflow_id)
+    else:
+        wait([executor.submit(_run_job_in_thread, job_id, workflow_id) for job_id, workflow_id in claimed])
+    return len(claimed)
+
+
+def poll_loop(worker_id, threads=1):
+    logger.info(
+        f"Worker {worker_id} started (batch size {BATCH_SIZE}, {threads} thread(s), poll interval {POLL_INTERVAL}s)."
+    )
+    executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix=worker_id) if threads > 1 else None
+    next_timer_tick = time.monotonic()
+    try:
+        with app.app_context():
+            while not _stopping:
+                try:
+                    if TIMER_INTERVAL and time.monotonic() >= next_timer_tick:
+                        next_timer_tick = time.monotonic() + TIMER_INTERVAL
+                        timer_scheduler.tick()
+                    claimed = run_once(worker_id, executor)
+                except Exception as e:
+                    logger.error(f"Worker {worker_id}: error in poll loop: {e}", exc_info=True)
+                    claimed = 0
+                finally:
+                    # Do not hold a connection (or stale identity map) between batches
+                    db.session.remove()
+                if not claimed:
+                    time.sleep(POLL_INTERVAL)
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True)
+    logger.info(f"Worker {worker_id} stopped.")
+
+
+def _spawn(index):
+    pid = os.fork()
+    if pid == 0:
+        _children.clear()
+        status = 0
+        try:
+            # Connections inherited from the parent must not be used by the child
+            with app.app_context():
+                db.engine.dispose(close=False)
+            poll_loop(f'{WORKER_ID}-{index}')
+        except BaseException as e:
+            logger.error(f"Worker process {index} exited with an error: {e}", exc_info=True)
+            status = 1
+        finally:
+            os._exit(status)
+    _children[pid] = index
+
+
+def run_processes(count):
+    logger.info(f"Worker {WORKER_ID} starting {count} worker process(es).")
+    for index in range(count):
+        _spawn(index)
+    while _children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        index = _children.pop(pid, None)
+        if index is not None and not _stopping:
+            logger.warning(f"Worker process {index} (pid {pid}) exited with status {status}, restarting.")
+            _spawn(index)
+    logger.info(f"Worker {WORKER_ID} stopped.")
+
+
+def main():
+    signal.signal(signal.SIGTERM, _request_stop)
+    signal.signal(signal.SIGINT, _request_stop)
+    if WORKER_MODE == 'process':
+        run_processes(CONCURRENCY)
+    else:
+        poll_loop(WORKER_ID, threads=CONCURRENCY)
+
+
+if __name__ == '__main__':
+    main()
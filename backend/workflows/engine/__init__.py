@@ -1,2 +1,4 @@
 from .engine import BpmnEngine
 from .instance import Instance
+from .checkpoint import CheckpointPolicy
+from .migration import WorkflowMigrator
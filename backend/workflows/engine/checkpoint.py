@@ -0,0 +1,41 @@
+import time
+
+
+class CheckpointPolicy:
+    """
+    Decides when an instance with unsaved task events should be persisted.
+
+    When a policy is given to the engine, task events only mark the instance
+    dirty; the instance is written once it reaches a stable point (waiting for
+    user input, waiting on a timer, or an error) or when one of the optional
+    limits below is hit first.
+
+    :param every_n_tasks: flush after this many completed tasks (None to disable)
+    :param every_ms: flush once this many milliseconds passed since the last save (None to disable)
+    """
+
+    def __init__(self, every_n_tasks=None, every_ms=None):
+        self.every_n_tasks = every_n_tasks
+        self.every_ms = every_ms
+
+    @classmethod
+    def from_env(cls, environ):
+        """Builds a policy from WORKFLOW_CHECKPOINT_* variables, or returns None if coalescing is off."""
+        if environ.get('WORKFLOW_CHECKPOINT_MODE', 'coalesce').lower() != 'coalesce':
+            return None
+        every_n_tasks = environ.get('WORKFLOW_CHECKPOINT_EVERY_N_TASKS')
+        every_ms = environ.get('WORKFLOW_CHECKPOINT_EVERY_MS')
+        return cls(
+            every_n_tasks=int(every_n_tasks) if every_n_tasks else None,
+            every_ms=int(every_ms) if every_ms else None,
+        )
+
+    def start(self):
+        return time.monotonic()
+
+    def should_flush(self, completed_tasks, started):
+        if self.every_n_tasks is not None and completed_tasks >= self.every_n_tasks:
+            return True
+        if self.every_ms is not None and (time.monotonic() - started) * 1000 >= self.every_ms:
+            return True
+        return False
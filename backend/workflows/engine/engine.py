@@ -1,12 +1,18 @@
 # /config/workspace/todo-app/backend/workflows/engine/engine.py
 import curses # Keep existing imports
+import hashlib
 import logging
+import os
+import weakref
+from contextlib import nullcontext
 
 from SpiffWorkflow.specs import SubWorkflow
 from SpiffWorkflow.bpmn.parser.ValidationException import ValidationException
 from SpiffWorkflow.bpmn.specs.mixins.events.event_types import CatchingEvent
 from SpiffWorkflow.bpmn import BpmnWorkflow
 from SpiffWorkflow.bpmn.script_engine import PythonScriptEngine
+from SpiffWorkflow.bpmn.specs.event_definitions.message import MessageEventDefinition
+from SpiffWorkflow.bpmn.util import BpmnEvent
 from SpiffWorkflow.bpmn.util.diff import (
     SpecDiff,
     diff_dependencies,
@@ -16,7 +22,10 @@ from SpiffWorkflow.bpmn.util.diff import (
 )
 from SpiffWorkflow import TaskState
 
+from utils import metrics
+from ..serializer.errors import WorkflowConflictError
 from .instance import Instance
+from .migration import WorkflowMigrator
 
 
 # Ensure logger is set up for this module if not already configured elsewhere
@@ -26,33 +35,84 @@ logger = logging.getLogger(__name__)
 #     logging.basicConfig(level=logging.INFO)
 
 
+def spec_fingerprint(process_id, bpmn_files, dmn_files=None, serializer_version=None):
+    """
+    Returns a sha256 hex digest of everything a parsed spec depends on: the process id,
+    the serializer version and the name and contents of each BPMN/DMN file.
+    File order and directories do not matter, so the same files hash the same on every host.
+    """
+    digest = hashlib.sha256()
+    digest.update(f'{process_id}\0{serializer_version}\0'.encode('utf-8'))
+    for kind, files in (('bpmn', bpmn_files), ('dmn', dmn_files or [])):
+        for path in sorted(files):
+            with open(path, 'rb') as fh:
+                content = fh.read()
+            digest.update(f'{kind}\0{os.path.basename(path)}\0{len(content)}\0'.encode('utf-8'))
+            digest.update(content)
+    return digest.hexdigest()
+
+
+class TimedScriptEngine(PythonScriptEngine):
+    """PythonScriptEngine that records script task execution time."""
+
+    def execute(self, task, script, external_context=None):
+        with metrics.timed(
+            metrics.WORKFLOW_SCRIPT_SECONDS,
+            span_name='workflow.script',
+            spec=task.workflow.top_workflow.spec.name,
+            task_spec=task.task_spec.name,
+        ):
+            return super().execute(task, script, external_context)
+
+
 class BpmnEngine:
 
-    def __init__(self, parser, serializer, script_env=None, instance_cls=None):
+    def __init__(self, parser, serializer, script_env=None, instance_cls=None, checkpoint=None):
 
         self.parser = parser
         self.serializer = serializer
         # Ideally this would be recreated for each instance
-        self._script_engine = PythonScriptEngine(script_env)
+        self._script_engine = TimedScriptEngine(script_env)
         self.instance_cls = instance_cls or Instance
+        # CheckpointPolicy for coalescing saves; None saves on every task event
+        self.checkpoint = checkpoint
 
     # --- Add Spec Methods (add_spec, add_collaboration, add_files) ---
     # ... (keep existing methods: add_spec, add_collaboration, add_files) ...
     def add_spec(self, process_id, bpmn_files, dmn_files):
-        self.add_files(bpmn_files, dmn_files)
-        try:
-            spec = self.parser.get_spec(process_id)
-            dependencies = self.parser.get_subprocess_specs(process_id)
-        except ValidationException as exc:
-            # Clear the process parsers so the files can be re-added
-            # There's probably plenty of other stuff that should be here
-            # However, our parser makes me mad so not investigating further at this time
-            self.parser.process_parsers = {}
-            raise exc
-        spec_id = self.serializer.create_workflow_spec(spec, dependencies)
+        content_hash = spec_fingerprint(process_id, bpmn_files, dmn_files, getattr(self.serializer, 'VERSION', None))
+        spec_id = self._find_registered_spec(process_id, content_hash)
+        if spec_id is not None:
+            logger.info(f'{process_id} is unchanged, using stored spec {spec_id}')
+            return spec_id
+        with metrics.timed(metrics.WORKFLOW_PHASE_SECONDS, span_name='workflow.parse', phase='parse'):
+            self.add_files(bpmn_files, dmn_files)
+            try:
+                spec = self.parser.get_spec(process_id)
+                dependencies = self.parser.get_subprocess_specs(process_id)
+            except ValidationException as exc:
+                # Clear the process parsers so the files can be re-added
+                # There's probably plenty of other stuff that should be here
+                # However, our parser makes me mad so not investigating further at this time
+                self.parser.process_parsers = {}
+                raise exc
+        spec_id = self.serializer.create_workflow_spec(spec, dependencies, content_hash=content_hash)
         logger.info(f'Added {process_id} with id {spec_id}')
         return spec_id
 
+    def _find_registered_spec(self, process_id, content_hash):
+        """
+        Returns the id of the stored version of process_id parsed from the same files, or None.
+        The stored spec is restored right away so the first workflow started does not pay for it.
+        """
+        find_workflow_spec = getattr(self.serializer, 'find_workflow_spec', None)
+        if find_workflow_spec is None:
+            return None
+        spec_id = find_workflow_spec(process_id, content_hash)
+        if spec_id is not None:
+            self.serializer.get_workflow_spec(spec_id)
+        return spec_id
+
     def add_collaboration(self, collaboration_id, bpmn_files, dmn_files=None):
         self.add_files(bpmn_files, dmn_files)
         try:
@@ -74,12 +134,29 @@ class BpmnEngine:
     def list_specs(self):
         return self.serializer.list_specs()
 
+    def get_latest_spec_id(self, process_id):
+        """Returns the id of the latest stored version of process_id, or None."""
+        return self.serializer.find_latest_workflow_spec(process_id)
+
     def delete_workflow_spec(self, spec_id):
         self.serializer.delete_workflow_spec(spec_id)
         logger.info(f'Deleted workflow spec with id {spec_id}')
 
     # --- Workflow Instance Methods ---
 
+    def lock_workflow(self, wf_id, timeout=None):
+        """
+        Context manager that keeps other processes from advancing or saving wf_id inside the block.
+        Serializers without locking make this a no-op.
+        """
+        lock_workflow = getattr(self.serializer, 'lock_workflow', None)
+        return lock_workflow(wf_id, timeout) if lock_workflow is not None else nullcontext()
+
+    def lock_workflows(self, wf_ids):
+        """Context manager that locks whichever of wf_ids are free and yields the set of locked ids."""
+        lock_workflows = getattr(self.serializer, 'lock_workflows', None)
+        return lock_workflows(wf_ids) if lock_workflows is not None else nullcontext(set(wf_ids))
+
     def start_workflow(self, spec_id):
         spec, sp_specs = self.serializer.get_workflow_spec(spec_id)
         wf = BpmnWorkflow(spec, sp_specs, script_engine=self._script_engine)
@@ -89,6 +166,26 @@ class BpmnEngine:
         instance = self.get_workflow(wf_id)
         return instance
 
+    def start_workflows(self, spec_id, start_data, commit=True):
+        """
+        Starts one workflow per item of start_data in a single serializer transaction.
+        The spec is restored once and each item is merged into the data of the new
+        workflow's first ready task before it is stored.
+        The in-memory workflows are wrapped directly instead of being reloaded.
+        Returns the instances in the same order as start_data.
+        """
+        spec, sp_specs = self.serializer.get_workflow_spec(spec_id)
+        workflows = []
+        for data in start_data:
+            wf = BpmnWorkflow(spec, dict(sp_specs), script_engine=self._script_engine)
+            if data:
+                wf.get_tasks(state=TaskState.READY)[0].data.update(data)
+            workflows.append(wf)
+
+        wf_ids = self.serializer.create_workflows(workflows, spec_id, commit=commit)
+        logger.info(f'Created {len(wf_ids)} workflow(s) for spec {spec_id}')
+        return [self._create_instance(wf_id, wf) for wf_id, wf in zip(wf_ids, workflows)]
+
     def get_workflow(self, wf_id):
         """Retrieves a workflow instance and attaches persistence callbacks."""
         wf = self.serializer.get_workflow(wf_id)
@@ -96,10 +193,12 @@ class BpmnEngine:
              logger.error(f"Workflow with id {wf_id} not found by serializer.")
              # Consider raising an exception or returning None based on desired behavior
              raise ValueError(f"Workflow not found: {wf_id}") # Example: Raise error
+        return self._create_instance(wf_id, wf)
 
+    def _create_instance(self, wf_id, wf):
         wf.script_engine = self._script_engine
         # Create the instance wrapper, passing the update_workflow method as the save callback
-        instance = self.instance_cls(wf_id, wf, save=self.update_workflow)
+        instance = self.instance_cls(wf_id, wf, save=self.update_workflow, checkpoint=self.checkpoint)
 
         # --- Attach persistence callbacks ---
         self._attach_persistence_callbacks(instance)
@@ -107,11 +206,71 @@ class BpmnEngine:
 
         return instance
 
+    def send_message(self, name, payload=None, correlation=None, wf_ids=None):
+        """
+        Delivers a message to the workflows waiting on it and runs them to their next stable point.
+        Only workflows listed by the serializer's message index are loaded.
+        correlation is a {key: {property: value}} dict, as SpiffWorkflow stores correlations.
+        wf_ids addresses the message to those workflows instead (e.g. a reply to the workflow that
+        sent an email); each is checked after taking its lock, so a workflow another process is
+        still advancing towards the catch event gets the message once it has been saved there.
+        Returns the ids of the workflows that caught the message.
+        """
+        if wf_ids is None:
+            wf_ids = self.serializer.find_message_subscribers(name, correlation)
+        delivered = []
+        for wf_id in wf_ids:
+            with self.lock_workflow(wf_id):
+                caught = self.retry_on_conflict(
+                    wf_id, lambda instance: self._deliver_message(instance, name, payload, correlation)
+                )
+            if caught:
+                delivered.append(wf_id)
+        logger.info(f"Message {name} delivered to {len(delivered)} workflow(s).")
+        return delivered
+
+    def _deliver_message(self, instance, name, payload, correlation):
+        # Use the catch event's own definition so the event compares equal to it
+        event_definition = next((
+            task.task_spec.event_definition
+            for task in instance.workflow.event_manager.tasks.values()
+            if isinstance(task.task_spec.event_definition, MessageEventDefinition)
+            and task.task_spec.event_definition.name == name
+        ), None)
+        if event_definition is None:
+            logger.warning(f"Workflow {instance.wf_id} is indexed for message {name} but no longer waits on it.")
+            return False
+        try:
+            instance.workflow.send_event(BpmnEvent(event_definition, payload or {}, correlation))
+        except Exception as e:
+            # Correlations did not match after all
+            logger.info(f"Workflow {instance.wf_id} did not catch message {name}: {e}")
+            return False
+        instance.run_ready_events()
+        instance.run_until_user_input_required()
+        return True
+
+    def retry_on_conflict(self, wf_id, action, attempts=3):
+        """
+        Loads wf_id and returns action(instance). If a save inside action finds that another
+        process saved the workflow first (WorkflowConflictError), the workflow is reloaded and
+        action runs again, up to attempts times; the last conflict is re-raised.
+        """
+        for attempt in range(1, attempts + 1):
+            instance = self.get_workflow(wf_id)
+            try:
+                return action(instance)
+            except WorkflowConflictError as e:
+                if attempt == attempts:
+                    raise
+                logger.info(f"Workflow {wf_id} changed while it was being advanced, reloading ({attempt}/{attempts}): {e}")
+
     def update_workflow(self, instance):
         """Callback function used by the Instance object to save the workflow."""
         logger.info(f'Saving workflow {instance.wf_id} via update_workflow callback.')
         # The instance object holds the workflow, pass it to the serializer
         self.serializer.update_workflow(instance.workflow, instance.wf_id)
+        metrics.WORKFLOW_SAVES_TOTAL.inc(spec=instance.workflow.spec.name)
 
     # --- NEW HELPER METHOD for attaching callbacks ---
     def _attach_persistence_callbacks(self, instance):
@@ -124,53 +283,55 @@ class BpmnEngine:
             logger.warning(f"Cannot attach callbacks: workflow object is missing for instance {instance.wf_id}")
             return
 
-        # Define the callback function that will be triggered by task events
-        def on_task_event(workflow, task, *args):
-            # Check if the instance and its workflow still exist
-            if instance and instance.workflow:
-                logger.info(f"Task event ({args[0] if args else 'unknown'}) for task '{task.task_spec.name}' in workflow {instance.wf_id}. Triggering save.")
-                try:
+        # Restored specs can be shared between workflows (the serializer caches them), so the
+        # callback is a single engine method that finds the instance through the task's workflow.
+        # A weak reference keeps the workflow from holding its instance alive.
+        workflow._persistence_instance = weakref.ref(instance)
+
+        for name in workflow.spec.task_specs:
+            logger.debug(f"Attaching callbacks to tasks in workflow/subprocess {name}")
+            self._attach_task_callbacks(workflow.spec.task_specs[name])
+        logger.info(f"Persistence callbacks attached to tasks for workflow {instance.wf_id} and its subprocesses.")
+
+    def _attach_task_callbacks(self, task_spec):
+        """Connects _on_task_event to a task spec's events, once per spec."""
+        if not task_spec.ready_event.is_connected(self._on_task_event):
+            task_spec.ready_event.connect(self._on_task_event, 'ready_event')
+        if not task_spec.completed_event.is_connected(self._on_task_event):
+            task_spec.completed_event.connect(self._on_task_event, 'completed_event')
+        if isinstance(task_spec, SubWorkflow):
+            if not task_spec.update_event.is_connected(self._on_task_event):
+                task_spec.update_event.connect(self._on_task_event, 'update_event')
+
+    def _on_task_event(self, workflow, task, *args):
+        """Callback triggered by task events; saves (or marks dirty) the instance owning the task."""
+        instance_ref = getattr(task.workflow.top_workflow, '_persistence_instance', None)
+        instance = instance_ref() if instance_ref is not None else None
+        # Check if the instance and its workflow still exist
+        if instance and instance.workflow:
+            event_name = args[0] if args else 'unknown'
+            if event_name == 'completed_event':
+                metrics.WORKFLOW_TASK_RUNS_TOTAL.inc(spec=instance.workflow.spec.name)
+            try:
+                if self.checkpoint is not None:
+                    # Coalesce: the instance flushes at the next stable point
+                    logger.debug(f"Task event ({event_name}) for task '{task.task_spec.name}' in workflow {instance.wf_id}. Marking dirty.")
+                    instance.mark_dirty(task_completed=event_name == 'completed_event')
+                else:
+                    logger.info(f"Task event ({event_name}) for task '{task.task_spec.name}' in workflow {instance.wf_id}. Triggering save.")
                     # Call the save method configured on the instance object
                     instance.save()
-                except Exception as e:
-                    # Log errors during the save operation triggered by the callback
-                    logger.error(f"Error saving workflow {instance.wf_id} during task event callback: {e}", exc_info=True)
-                for child in task.children:
-                    attach_task(child.task_spec)
-                return True
-            else:
-                 logger.warning(f"Task event triggered but instance or workflow object not found for wf_id {instance.wf_id if instance else 'unknown'}.")
-
-        # helper to attach callbacks to tasks in a workflow
-        def attach_workflow(wf_spec):
-            for name in wf_spec.task_specs:
-                logger.debug(f"Attaching callbacks to tasks in workflow/subprocess {name}")
-                # Connect the callback to the ready and completed events.
-                # Note: SpiffWorkflow's event system doesn't have a built-in way
-                # to check if a *specific* function is already connected.
-                # We rely on get_workflow typically deserializing a new object graph,
-                # thus avoiding duplicate connections in standard web request lifecycles.
-                attach_task(wf_spec.task_specs[name])
-
-        # helper to attach callbacks to a task
-        def attach_task(task_spec):
-            if task_spec.ready_event.is_connected(on_task_event):
-                task_spec.ready_event.disconnect(on_task_event)
-            task_spec.ready_event.connect(on_task_event, 'ready_event')
-            if task_spec.completed_event.is_connected(on_task_event):
-                task_spec.completed_event.disconnect(on_task_event)
-            task_spec.completed_event.connect(on_task_event, 'completed_event')
-            #if task_spec.started_event.is_connected(on_task_event):
-            #    task_spec.started_event.disconnect(on_task_event)
-            #task_spec.started_event.connect(on_task_event, 'started_event')
-            if isinstance(task_spec, SubWorkflow):
-                if task_spec.update_event.is_connected(on_task_event):
-                    task_spec.update_event.disconnect(on_task_event)
-                task_spec.update_event.connect(on_task_event, 'update_event')
-
-        # Start the recursive attachment process
-        attach_workflow(workflow.spec)
-        logger.info(f"Persistence callbacks attached to tasks for workflow {instance.wf_id} and its subprocesses.")
+            except WorkflowConflictError:
+                # This copy is stale; stop advancing it so the caller can reload
+                raise
+            except Exception as e:
+                # Log errors during the save operation triggered by the callback
+                logger.error(f"Error saving workflow {instance.wf_id} during task event callback: {e}", exc_info=True)
+            for child in task.children:
+                self._attach_task_callbacks(child.task_spec)
+            return True
+        else:
+            logger.debug(f"Task event for task '{task.task_spec.name}' has no persisted instance attached; skipping save.")
     # --- END NEW HELPER METHOD ---
 
 
@@ -219,11 +380,20 @@ class BpmnEngine:
         if validate and not self.can_migrate(wf_diff, sp_diffs):
             raise Exception('Workflow is not safe to migrate!')
 
+        previous_subprocess_ids = list(wf.subprocesses)
         migrate_workflow(wf_diff, wf, spec)
-        for sp_id, sp in wf.subprocesses.items():
+        for sp_id, sp in list(wf.subprocesses.items()):
             migrate_workflow(sp_diffs[sp_id], sp, deps.get(sp.spec.name))
         wf.subprocess_specs = deps
 
+        if hasattr(self.serializer, 'migrate_workflow'):
+            # Stored in place, so the workflow keeps its id (and its UserWorkflow link)
+            self.serializer.migrate_workflow(wf, wf_id, spec_id, previous_subprocess_ids)
+            return wf_id
         self.serializer.delete_workflow(wf_id)
         return self.serializer.create_workflow(wf, spec_id)
 
+    def migrate_workflows(self, spec_id):
+        """Returns a WorkflowMigrator for migrating many workflows to spec_id (see migrate_workflows.py)."""
+        return WorkflowMigrator(self, spec_id)
+
@@ -1,16 +1,29 @@
+import logging
+
 from SpiffWorkflow import TaskState
 from SpiffWorkflow.bpmn.specs.mixins.events.event_types import CatchingEvent
 
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
 
 class Instance:
 
-    def __init__(self, wf_id, workflow, save=None):
+    def __init__(self, wf_id, workflow, save=None, checkpoint=None):
         self.wf_id = wf_id
         self.workflow = workflow
         self.step = False
         self.task_filter = {}
         self.filtered_tasks = []
         self._save = save
+        # Optional CheckpointPolicy; when set, task events only mark the instance dirty
+        self._checkpoint = checkpoint
+        self.dirty = False
+        # Number of saves written by this instance (for the saves-per-run metric)
+        self.save_count = 0
+        self._completed_since_save = 0
+        self._checkpoint_started = checkpoint.start() if checkpoint is not None else None
 
     @property
     def name(self):
@@ -73,23 +86,58 @@ class Instance:
             self.run_until_user_input_required()
         else:
             self.update_task_filter()
+            self.flush()
 
     def run_until_user_input_required(self):
-        task = self.workflow.get_next_task(state=TaskState.READY, manual=False)
-        while task is not None:
-            task.run()
-            self.run_ready_events()
-            task = self.workflow.get_next_task(state=TaskState.READY, manual=False)
-        self.update_task_filter()
+        saves_before = self.save_count
+        with metrics.timed(metrics.WORKFLOW_PHASE_SECONDS, span_name='workflow.run', phase='run'):
+            try:
+                task = self.workflow.get_next_task(state=TaskState.READY, manual=False)
+                while task is not None:
+                    task.run()
+                    self.run_ready_events()
+                    task = self.workflow.get_next_task(state=TaskState.READY, manual=False)
+            except Exception:
+                # Keep whatever progress was made before the failing task
+                self._flush_after_error()
+                raise
+            self.update_task_filter()
+            # Either waiting for user input, a timer/message, or finished
+            self.flush()
+        metrics.WORKFLOW_SAVES_PER_RUN.observe(self.save_count - saves_before)
 
     def run_ready_events(self):
-        self.workflow.refresh_waiting_tasks()
+        self.workflow.refresh_timers()
         task = self.workflow.get_next_task(state=TaskState.READY, spec_class=CatchingEvent)
         while task is not None:
             task.run()
             task = self.workflow.get_next_task(state=TaskState.READY, spec_class=CatchingEvent)
         self.update_task_filter()
 
+    def mark_dirty(self, task_completed=False):
+        """Records an unsaved task event, saving early if the checkpoint policy asks for it."""
+        self.dirty = True
+        if task_completed:
+            self._completed_since_save += 1
+        if self._checkpoint is not None and self._checkpoint.should_flush(self._completed_since_save, self._checkpoint_started):
+            self.save()
+
+    def flush(self):
+        """Saves the instance if any task events happened since the last save."""
+        if self.dirty:
+            self.save()
+
+    def _flush_after_error(self):
+        try:
+            self.flush()
+        except Exception as exc:
+            logger.error(f"Error saving workflow {self.wf_id} after a task failure: {exc}", exc_info=True)
+
     def save(self):
         self._save(self)
+        self.save_count += 1
+        self.dirty = False
+        self._completed_since_save = 0
+        if self._checkpoint is not None:
+            self._checkpoint_started = self._checkpoint.start()
 
@@ -0,0 +1,109 @@
+# /config/workspace/todo-app/backend/workflows/engine/migration.py
+import logging
+from types import SimpleNamespace
+
+from SpiffWorkflow import TaskState
+from SpiffWorkflow.bpmn.util.diff import SpecDiff, migrate_workflow
+
+logger = logging.getLogger(__name__)
+
+# Tasks in these states must not have changed or removed specs (same rule as BpmnEngine.can_migrate)
+UNSAFE_MASK = TaskState.COMPLETED | TaskState.STARTED
+
+
+class SpecChanges:
+    """
+    The result of one SpecDiff, keyed by task spec name instead of TaskSpec object so that it
+    can be applied to any workflow restored from the same original spec.
+    """
+
+    def __init__(self, spec_diff):
+        self.alignment = {original.name: new for original, new in spec_diff.alignment.items() if original is not None}
+        self.unsafe = {ts.name for ts in spec_diff.removed} | {ts.name for ts in spec_diff.changed}
+
+    def workflow_diff(self, workflow):
+        """Returns an object with the alignment migrate_workflow expects for this workflow's tasks."""
+        tasks = workflow.get_tasks(skip_subprocesses=True)
+        return SimpleNamespace(alignment={task: self.alignment.get(task.task_spec.name) for task in tasks})
+
+
+class WorkflowMigrator:
+    """
+    Migrates many workflows to one target spec.
+
+    Spec diffs are computed once per original spec (and subprocess spec) and the safety
+    verdict once per state signature: the original spec plus the task specs that have
+    completed or started in each process. Everything else is per workflow and linear in
+    its number of tasks. Workflows are stored in place through the serializer, so their
+    ids do not change.
+    """
+
+    def __init__(self, engine, spec_id):
+        self.engine = engine
+        self.serializer = engine.serializer
+        self.spec_id = spec_id
+        self.spec, self.dependencies = self.serializer.get_workflow_spec(spec_id)
+        if self.spec is None:
+            raise ValueError(f"WorkflowSpec with id {spec_id} not found.")
+        self._changes = {}
+        self._verdicts = {}
+
+    def _spec_changes(self, key, original, new):
+        changes = self._changes.get(key)
+        if changes is None:
+            changes = self._changes[key] = SpecChanges(SpecDiff(self.serializer.registry, original, new))
+            logger.info(f"Computed spec diff for {key}: {len(changes.unsafe)} changed or removed task spec(s)")
+        return changes
+
+    def _processes(self, original_spec_id, workflow):
+        """Yields (process name, workflow, SpecChanges or None) for the workflow and each subprocess."""
+        yield workflow.spec.name, workflow, self._spec_changes((original_spec_id, None), workflow.spec, self.spec)
+        for sp in workflow.subprocesses.values():
+            new_spec = self.dependencies.get(sp.spec.name)
+            changes = None if new_spec is None else self._spec_changes((original_spec_id, sp.spec.name), sp.spec, new_spec)
+            yield sp.spec.name, sp, changes
+
+    def check(self, original_spec_id, workflow):
+        """Returns None if the workflow can be migrated, otherwise the reason it cannot."""
+        processes = list(self._processes(original_spec_id, workflow))
+        finished = [
+            frozenset(task.task_spec.name for task in process.get_tasks(state=UNSAFE_MASK, skip_subprocesses=True))
+            for _, process, _ in processes
+        ]
+        signature = (original_spec_id, tuple(sorted((name, tuple(sorted(names))) for (name, _, _), names in zip(processes, finished))))
+        if signature not in self._verdicts:
+            reason = None
+            for (name, _, changes), names in zip(processes, finished):
+                if changes is None:
+                    reason = f"subprocess spec '{name}' does not exist in the new version"
+                    break
+                touched = names & changes.unsafe
+                if touched:
+                    reason = f"completed or started tasks changed in '{name}': {', '.join(sorted(touched))}"
+                    break
+            self._verdicts[signature] = reason
+        return self._verdicts[signature]
+
+    def migrate(self, wf_id, original_spec_id=None, validate=True, commit=True):
+        """
+        Migrates one workflow in place.
+        Returns None on success or the reason the workflow is unsafe (in which case nothing is written).
+        """
+        workflow = self.serializer.get_workflow(wf_id)
+        if workflow is None:
+            raise ValueError(f"Workflow with id {wf_id} not found.")
+        if original_spec_id is None:
+            original_spec_id = self.serializer.get_workflow_spec_id(wf_id)
+        if validate:
+            reason = self.check(original_spec_id, workflow)
+            if reason is not None:
+                return reason
+
+        previous_subprocess_ids = list(workflow.subprocesses)
+        for _, process, changes in list(self._processes(original_spec_id, workflow)):
+            new_spec = self.spec if process is workflow else self.dependencies.get(process.spec.name)
+            if changes is not None:
+                migrate_workflow(changes.workflow_diff(process), process, new_spec)
+        workflow.subprocess_specs = dict(self.dependencies)
+        self.serializer.migrate_workflow(workflow, wf_id, self.spec_id, previous_subprocess_ids, commit=commit)
+        return None
@@ -57,6 +57,44 @@ def validate_website_account(website_account_info: Dict[str, Any]) -> bool:
     logger.info("Website account info validation successful.")
     return True
 
+# Message the outbox sender delivers once the request email has gone out (see dsar.bpmn)
+DSAR_REQUEST_SENT_MESSAGE = 'DSARRequestSentMessage'
+
+
+def formulate_dsar_email(website_account_info: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Builds the DSAR request email for a validated website account.
+
+    Args:
+        website_account_info: The website account details (see validate_website_account).
+
+    Returns:
+        The 'outbox_email' dictionary read by the send task: 'to', 'subject', 'body'
+        and the 'completion_message' that resumes the workflow once it is sent.
+    """
+    website_url = website_account_info.get('website_url') or 'your website'
+    account_name = website_account_info.get('account_name')
+    account_email = website_account_info.get('account_email')
+    body = (
+        "Dear Data Protection Officer,\n\n"
+        "Under Article 15 of the General Data Protection Regulation (GDPR), I request access to "
+        f"all personal data you hold about me in connection with my account on {website_url}:\n\n"
+        f"    Account name: {account_name}\n"
+        f"    Account email: {account_email}\n\n"
+        "Please provide a copy of this data in a commonly used electronic format, together with "
+        "the purposes of the processing, the recipients of the data and how long it will be kept. "
+        "You are required to respond within one month of receiving this request.\n\n"
+        "Kind regards,\n"
+        f"{account_name}\n"
+    )
+    logger.info(f"Formulated DSAR email for {website_url} to {website_account_info.get('compliance_contact')}.")
+    return {
+        'to': website_account_info.get('compliance_contact'),
+        'subject': f"Data Subject Access Request - {account_name}",
+        'body': body,
+        'completion_message': DSAR_REQUEST_SENT_MESSAGE,
+    }
+
 # Example Usage (optional, for testing - kept commented out):
 # if __name__ == '__main__':
 #     # Basic logging config for standalone testing
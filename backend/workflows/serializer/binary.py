@@ -0,0 +1,120 @@
+import zlib
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+from .codec import JsonCodec
+
+# Every blob starts with MAGIC, the format version, the payload encoding and the compression,
+# so old blobs stay readable when the defaults change.
+MAGIC = b'WFS'
+FORMAT_VERSION = 1
+HEADER_SIZE = len(MAGIC) + 3
+
+ENCODING_MSGPACK = 1
+ENCODING_JSON = 2
+
+COMPRESSION_NONE = 0
+COMPRESSION_ZSTD = 1
+COMPRESSION_LZ4 = 2
+COMPRESSION_ZLIB = 3
+
+COMPRESSIONS = {
+    'none': COMPRESSION_NONE,
+    'zstd': COMPRESSION_ZSTD,
+    'lz4': COMPRESSION_LZ4,
+    'zlib': COMPRESSION_ZLIB,
+}
+
+
+class BinaryFormat:
+    """
+    A versioned, compressed binary encoding for serialized workflow dicts.
+
+    The payload is msgpack when installed (JSON otherwise), compressed with zstd,
+    lz4 or zlib. 'auto' compression picks zstd, then lz4, then zlib, depending on
+    what is installed. Decoding only depends on the header, not on the settings
+    of the instance doing the reading.
+
+    :param compression: 'auto', 'zstd', 'lz4', 'zlib' or 'none'
+    :param level: compression level passed to the compressor (None for its default)
+    """
+
+    def __init__(self, compression='auto', level=None):
+        if compression == 'auto':
+            compression = 'zstd' if zstandard is not None else 'lz4' if lz4 is not None else 'zlib'
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression '{compression}'. Must be one of: {list(COMPRESSIONS)} or 'auto'")
+        if compression == 'zstd' and zstandard is None:
+            raise ImportError('zstandard is not installed')
+        if compression == 'lz4' and lz4 is None:
+            raise ImportError('lz4 is not installed')
+        self.compression = compression
+        self.level = level
+        self.encoding = ENCODING_MSGPACK if msgpack is not None else ENCODING_JSON
+        self._json = JsonCodec()
+
+    @staticmethod
+    def is_binary(data):
+        return isinstance(data, (bytes, bytearray, memoryview)) and bytes(data[:len(MAGIC)]) == MAGIC
+
+    def dumps(self, obj):
+        if self.encoding == ENCODING_MSGPACK:
+            payload = msgpack.packb(obj, use_bin_type=True)
+        else:
+            payload = self._json.dumps(obj).encode('utf-8')
+        compression = COMPRESSIONS[self.compression]
+        return MAGIC + bytes([FORMAT_VERSION, self.encoding, compression]) + self._compress(compression, payload)
+
+    def loads(self, data):
+        data = bytes(data)
+        if not self.is_binary(data) or len(data) < HEADER_SIZE:
+            raise ValueError('Not a binary workflow serialization')
+        version, encoding, compression = data[len(MAGIC):HEADER_SIZE]
+        if version > FORMAT_VERSION:
+            raise ValueError(f'Unsupported binary serialization version {version}')
+        payload = self._decompress(compression, data[HEADER_SIZE:])
+        if encoding == ENCODING_MSGPACK:
+            if msgpack is None:
+                raise ImportError('msgpack is required to read this serialization')
+            return msgpack.unpackb(payload, raw=False, strict_map_key=False)
+        if encoding == ENCODING_JSON:
+            return self._json.loads(payload)
+        raise ValueError(f'Unknown payload encoding {encoding}')
+
+    def _compress(self, compression, payload):
+        if compression == COMPRESSION_ZSTD:
+            level = self.level if self.level is not None else 3
+            return zstandard.ZstdCompressor(level=level).compress(payload)
+        if compression == COMPRESSION_LZ4:
+            return lz4.frame.compress(payload) if self.level is None else lz4.frame.compress(payload, compression_level=self.level)
+        if compression == COMPRESSION_ZLIB:
+            return zlib.compress(payload, self.level if self.level is not None else 6)
+        return payload
+
+    def _decompress(self, compression, payload):
+        if compression == COMPRESSION_ZSTD:
+            if zstandard is None:
+                raise ImportError('zstandard is required to read this serialization')
+            return zstandard.ZstdDecompressor().decompress(payload)
+        if compression == COMPRESSION_LZ4:
+            if lz4 is None:
+                raise ImportError('lz4 is required to read this serialization')
+            return lz4.frame.decompress(payload)
+        if compression == COMPRESSION_ZLIB:
+            return zlib.decompress(payload)
+        if compression == COMPRESSION_NONE:
+            return payload
+        raise ValueError(f'Unknown compression {compression}')
@@ -0,0 +1,101 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+class JsonCodec:
+    """
+    Encodes and decodes serialized workflow dicts as JSON text.
+
+    This is the stdlib implementation; the faster backends below are used when
+    their package is installed. dumps always returns str because the SQLite
+    JSON functions and the file serializer work on text.
+    """
+
+    name = 'json'
+
+    def dumps(self, obj, pretty=False):
+        if pretty:
+            return json.dumps(obj, indent=2, separators=(', ', ': '))
+        return json.dumps(obj, separators=(',', ':'))
+
+    def loads(self, data):
+        return json.loads(data)
+
+
+class OrjsonCodec(JsonCodec):
+
+    name = 'orjson'
+
+    def __init__(self):
+        if orjson is None:
+            raise ImportError('orjson is not installed')
+
+    def dumps(self, obj, pretty=False):
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if pretty else 0)
+        return orjson.dumps(obj, option=option).decode('utf-8')
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+
+class MsgspecCodec(JsonCodec):
+
+    name = 'msgspec'
+
+    def __init__(self):
+        if msgspec is None:
+            raise ImportError('msgspec is not installed')
+        self._encoder = msgspec.json.Encoder()
+        self._decoder = msgspec.json.Decoder()
+
+    def dumps(self, obj, pretty=False):
+        data = self._encoder.encode(obj)
+        if pretty:
+            data = msgspec.json.format(data, indent=2)
+        return data.decode('utf-8')
+
+    def loads(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        return self._decoder.decode(data)
+
+
+CODECS = {
+    JsonCodec.name: JsonCodec,
+    OrjsonCodec.name: OrjsonCodec,
+    MsgspecCodec.name: MsgspecCodec,
+}
+
+
+def available_codecs():
+    """Returns the names of the codecs whose backend is installed."""
+    names = [JsonCodec.name]
+    if orjson is not None:
+        names.append(OrjsonCodec.name)
+    if msgspec is not None:
+        names.append(MsgspecCodec.name)
+    return names
+
+
+def get_codec(name='auto'):
+    """
+    Returns a codec instance by name ('json', 'orjson', 'msgspec').
+    'auto' (or None) picks the fastest installed backend, falling back to the stdlib.
+    """
+    if name in (None, 'auto'):
+        for candidate in (OrjsonCodec.name, MsgspecCodec.name):
+            if candidate in available_codecs():
+                return CODECS[candidate]()
+        return JsonCodec()
+    if name not in CODECS:
+        raise ValueError(f"Unknown JSON codec '{name}'. Must be one of: {list(CODECS)} or 'auto'")
+    return CODECS[name]()
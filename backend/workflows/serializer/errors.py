@@ -0,0 +1,10 @@
+class WorkflowConflictError(Exception):
+    """
+    Raised when a workflow is saved from a copy that is older than the stored one,
+    i.e. another process saved it after this copy was loaded. Reload the workflow and retry.
+    """
+
+    def __init__(self, wf_id, expected_version):
+        super().__init__(f"Workflow {wf_id} was changed by another process (expected version {expected_version})")
+        self.wf_id = wf_id
+        self.expected_version = expected_version
@@ -1,4 +1,4 @@
-import json, re
+import re
 import os
 import logging
 from uuid import uuid4, UUID
@@ -8,6 +8,9 @@ from SpiffWorkflow.bpmn.serializer.workflow import BpmnWorkflowSerializer
 from SpiffWorkflow.bpmn.serializer.default.workflow import BpmnWorkflowConverter, BpmnSubWorkflowConverter
 from SpiffWorkflow.bpmn.serializer.default.process_spec import BpmnProcessSpecConverter
 
+from ..binary import BinaryFormat
+from ..codec import get_codec
+
 logger = logging.getLogger(__name__)
 
 class FileSerializer(BpmnWorkflowSerializer):
@@ -21,13 +24,17 @@ class FileSerializer(BpmnWorkflowSerializer):
         except FileExistsError:
             pass
 
-    def __init__(self, dirname, **kwargs):
+    def __init__(self, dirname, codec=None, pretty=False, binary_format=None, **kwargs):
         super().__init__(**kwargs)
         self.dirname = dirname
-        self.fmt = {'indent': 2, 'separators': [', ', ': ']}
-
-    def create_workflow_spec(self, spec, dependencies):
-
+        # Compact output by default; pretty=True writes indented files for reading by hand
+        self.codec = codec or get_codec()
+        self.pretty = pretty
+        # With a BinaryFormat, workflow instances are written as compressed .wfs files
+        self.binary_format = binary_format
+
+    def create_workflow_spec(self, spec, dependencies, content_hash=None):
+        # content_hash is not stored; only the SQL serializer keeps a spec registry
         spec_dir = os.path.join(self.dirname, 'spec')
         if spec.file is not None:
             dirname = os.path.join(spec_dir, os.path.dirname(spec.file), spec.name)
@@ -37,12 +44,12 @@ class FileSerializer(BpmnWorkflowSerializer):
         try:
             os.makedirs(dirname, exist_ok=True)
             with open(filename, 'x') as fh:
-                fh.write(json.dumps(self.to_dict(spec), **self.fmt))
+                fh.write(self.codec.dumps(self.to_dict(spec), pretty=self.pretty))
             if len(dependencies) > 0:
                 os.mkdir(os.path.join(dirname, 'dependencies'))
                 for name, sp in dependencies.items():
                     with open(os.path.join(dirname, 'dependencies', f'{name}.json'), 'w') as fh:
-                        fh.write(json.dumps(self.to_dict(sp), **self.fmt))
+                        fh.write(self.codec.dumps(self.to_dict(sp), pretty=self.pretty))
         except FileExistsError:
             pass
         return filename
@@ -56,14 +63,14 @@ class FileSerializer(BpmnWorkflowSerializer):
     def get_workflow_spec(self, filename, **kwargs):
         dirname = os.path.dirname(filename)
         with open(filename) as fh:
-            spec = self.from_dict(json.loads(fh.read()))
+            spec = self.from_dict(self.codec.loads(fh.read()))
         subprocess_specs = {}
         depdir = os.path.join(os.path.dirname(filename), 'dependencies')
         if os.path.exists(depdir):
             for f in os.listdir(depdir):
                 name = re.sub('\.json$', '', os.path.basename(f))
                 with open(os.path.join(depdir, f)) as fh:
-                    subprocess_specs[name] = self.from_dict(json.loads(fh.read()))
+                    subprocess_specs[name] = self.from_dict(self.codec.loads(fh.read()))
         return spec, subprocess_specs
 
     def list_specs(self):
@@ -82,17 +89,25 @@ class FileSerializer(BpmnWorkflowSerializer):
         dirname = os.path.join(self.dirname, 'instance', name)
         os.makedirs(dirname, exist_ok=True)
         wf_id = uuid4()
-        with open(os.path.join(dirname, f'{wf_id}.json'), 'w') as fh:
-            fh.write(json.dumps(self.to_dict(workflow), **self.fmt))
-        return os.path.join(dirname, f'{wf_id}.json')
+        filename = os.path.join(dirname, f'{wf_id}.wfs' if self.binary_format else f'{wf_id}.json')
+        self.update_workflow(workflow, filename)
+        return filename
 
     def get_workflow(self, filename, **kwargs):
-        with open(filename) as fh:
-            return self.from_dict(json.loads(fh.read()))
+        with open(filename, 'rb') as fh:
+            data = fh.read()
+        # The format is detected from the content, so JSON and binary files can be mixed
+        if BinaryFormat.is_binary(data):
+            return self.from_dict((self.binary_format or BinaryFormat()).loads(data))
+        return self.from_dict(self.codec.loads(data))
 
     def update_workflow(self, workflow, filename):
-        with open(filename, 'w') as fh:
-            fh.write(json.dumps(self.to_dict(workflow), **self.fmt))
+        if self.binary_format:
+            with open(filename, 'wb') as fh:
+                fh.write(self.binary_format.dumps(self.to_dict(workflow)))
+        else:
+            with open(filename, 'w') as fh:
+                fh.write(self.codec.dumps(self.to_dict(workflow), pretty=self.pretty))
 
     def delete_workflow(self, filename):
         try:
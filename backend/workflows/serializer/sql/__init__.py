@@ -1,3 +1,14 @@
 from .serializer import (
     SqlSerializer,
+    PERSISTENCE_DOCUMENT,
+    PERSISTENCE_DELTA,
+    STORAGE_JSONB,
+    STORAGE_BINARY,
 )
+
+from ..errors import WorkflowConflictError
+from .lock import WorkflowLocks, WorkflowLockTimeout
+from .queue import JobQueue
+from .scheduler import TimerScheduler
+from .inbox import InboxPoller, InboxSyncError
+from .outbox import EmailOutbox, OUTBOX_EMAIL_VARIABLE
@@ -0,0 +1,103 @@
+# /config/workspace/todo-app/backend/workflows/serializer/sql/inbox.py
+import logging
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+
+from models.mailbox_state import MailboxState
+
+logger = logging.getLogger(__name__)
+
+
+class InboxSyncError(Exception):
+    """Raised when new messages could not all be retrieved; the sync position is not moved."""
+
+
+class InboxPoller:
+    """
+    Reads the messages that arrived in a Gmail mailbox since the previous poll.
+
+    The position is the mailbox's Gmail historyId, stored in mailbox_state. A poll
+    asks users.history.list for the messages added since then and retrieves them
+    with batch requests, so it costs a few HTTP calls however many workflows are
+    waiting on replies. Without a stored position (or when Gmail no longer has
+    that history) the poll lists the messages matching full_sync_query instead.
+
+    The handler runs before the new position is committed, in the same transaction:
+    if it raises, the position stays put and the messages are returned again by the
+    next poll, so handlers must tolerate seeing a message twice. The mailbox_state
+    row is locked for the duration of a poll, so pollers in several workers take turns.
+    """
+
+    def __init__(self, db_session, gmail, mailbox='me', label_id='INBOX', full_sync_query='in:inbox is:unread',
+                 full_sync_limit=1000, message_format='metadata'):
+        self.db = db_session
+        self.gmail = gmail
+        self.mailbox = mailbox
+        self.label_id = label_id
+        self.full_sync_query = full_sync_query
+        self.full_sync_limit = full_sync_limit
+        self.message_format = message_format
+
+    def _lock_state(self):
+        self.db.session.execute(
+            insert(MailboxState).values(mailbox=self.mailbox).on_conflict_do_nothing(index_elements=['mailbox'])
+        )
+        return (
+            self.db.session.query(MailboxState)
+            .filter(MailboxState.mailbox == self.mailbox)
+            .with_for_update()
+            .one()
+        )
+
+    def _new_message_ids(self, state):
+        """Returns (message ids, history id to store)."""
+        if state.history_id:
+            message_ids, history_id = self.gmail.list_new_message_ids(
+                state.history_id, user_id=self.mailbox, label_id=self.label_id
+            )
+            if message_ids is not None:
+                return message_ids, history_id
+        # Take the position first, so messages arriving during the listing are seen next time
+        history_id = self.gmail.get_history_id(user_id=self.mailbox)
+        message_ids = self.gmail.list_message_ids(self.full_sync_query, user_id=self.mailbox, limit=self.full_sync_limit)
+        if message_ids is None:
+            raise InboxSyncError(f"Could not list messages of mailbox {self.mailbox}")
+        logger.info(f"Full sync of mailbox {self.mailbox}: {len(message_ids)} message(s).")
+        return message_ids, history_id
+
+    def poll(self, handler):
+        """
+        Calls handler(messages) with the new messages (oldest first) and stores the new position.
+        Returns the number of messages handled.
+        """
+        if not self.gmail.service:
+            raise InboxSyncError("Gmail service not available")
+        try:
+            state = self._lock_state()
+            message_ids, history_id = self._new_message_ids(state)
+            errors = {}
+            messages = self.gmail.get_emails(message_ids, user_id=self.mailbox, format=self.message_format, errors=errors) if message_ids else {}
+            if messages is None:
+                raise InboxSyncError(f"Could not retrieve new messages of mailbox {self.mailbox}")
+            # A message deleted since it arrived is gone for good; anything else is retried next poll
+            failed = [
+                message_id for message_id, error in errors.items()
+                if getattr(getattr(error, 'resp', None), 'status', None) != 404
+            ]
+            if failed:
+                raise InboxSyncError(f"Could not retrieve {len(failed)} message(s) of mailbox {self.mailbox}: {failed[:5]}")
+
+            # history.list reports oldest first; messages.list newest first
+            ordered = sorted(messages.values(), key=lambda message: int(message.get('internalDate') or 0))
+            if ordered:
+                handler(ordered)
+            state.history_id = str(history_id)
+            state.synced_at = func.now()
+            self.db.session.commit()
+            if ordered:
+                logger.info(f"Mailbox {self.mailbox}: handled {len(ordered)} new message(s), now at history {history_id}.")
+            return len(ordered)
+        except Exception:
+            self.db.session.rollback()
+            raise
@@ -0,0 +1,181 @@
+# /config/workspace/todo-app/backend/workflows/serializer/sql/outbox.py
+import datetime
+import logging
+import random
+from collections import namedtuple
+
+from sqlalchemy import and_, or_, func
+
+from models.email_outbox import (
+    OutboxEmail, OUTBOX_PENDING, OUTBOX_SENDING, OUTBOX_SENT, OUTBOX_DONE, OUTBOX_FAILED,
+)
+from models.user_workflow import UserWorkflow, UserWorkflowStatusEnum
+
+logger = logging.getLogger(__name__)
+
+# Task data variable a send task reads its email from: {'to', 'subject', 'body', 'completion_message'}
+OUTBOX_EMAIL_VARIABLE = 'outbox_email'
+
+# What the sender needs of a claimed row; status is the row's status before the claim
+ClaimedEmail = namedtuple('ClaimedEmail', [
+    'id', 'workflow_id', 'to_email', 'subject', 'body', 'completion_message', 'status', 'gmail_message_id',
+])
+
+
+class EmailOutbox:
+    """
+    The email_outbox table: emails queued by workflow send tasks, sent by outbox_sender.py.
+
+    SqlSerializer.update_workflow writes a row for each completed send task in the same
+    transaction as the workflow, so an email is queued if and only if the workflow state
+    that asked for it is stored. Senders claim rows with SELECT ... FOR UPDATE SKIP LOCKED
+    and lease them like JobQueue jobs. A row goes pending -> sending -> sent -> done:
+    'sent' rows still have to deliver their completion message to the workflow, which is
+    retried separately so a busy workflow never causes the email to be sent twice. Both
+    sends and deliveries give up after max_attempts, leaving the row (and workflow) failed.
+
+    Delivery is at least once: a sender that dies between sending and recording the send
+    leaves the row to be sent again once its lease expires.
+    """
+
+    def __init__(self, db_session, max_attempts=8, lease_seconds=120, base_backoff_seconds=5, max_backoff_seconds=3600):
+        self.db = db_session
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.base_backoff_seconds = base_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+
+    def _backoff(self, attempts):
+        # Exponential, jittered so emails that failed together do not retry together
+        ceiling = min(self.base_backoff_seconds * 2 ** max(attempts - 1, 0), self.max_backoff_seconds)
+        return random.uniform(ceiling / 2, ceiling)
+
+    def claim(self, worker_id, limit=20):
+        """
+        Claims up to limit due rows for worker_id and commits the lease: pending rows (to send),
+        sending rows whose lease expired, and sent rows whose workflow is still to be told.
+        Returns a list of ClaimedEmail.
+        """
+        lease_expired = func.now() - datetime.timedelta(seconds=self.lease_seconds)
+        due = OutboxEmail.run_after <= func.now()
+        unlocked = or_(OutboxEmail.locked_at.is_(None), OutboxEmail.locked_at < lease_expired)
+        try:
+            rows = (
+                OutboxEmail.query
+                .filter(or_(
+                    and_(OutboxEmail.status == OUTBOX_PENDING, due),
+                    and_(OutboxEmail.status == OUTBOX_SENDING, OutboxEmail.locked_at < lease_expired),
+                    and_(OutboxEmail.status == OUTBOX_SENT, due, unlocked),
+                ))
+                .order_by(OutboxEmail.run_after)
+                .limit(limit)
+                .with_for_update(skip_locked=True)
+                .all()
+            )
+            claimed = []
+            for row in rows:
+                claimed.append(ClaimedEmail(
+                    row.id, row.workflow_id, row.to_email, row.subject, row.body,
+                    row.completion_message, row.status, row.gmail_message_id,
+                ))
+                if row.status != OUTBOX_SENT:
+                    row.status = OUTBOX_SENDING
+                    row.attempts = row.attempts + 1
+                row.locked_by = worker_id
+                row.locked_at = func.now()
+            self.db.session.commit()
+            if claimed:
+                logger.info(f"Outbox sender {worker_id} claimed {len(claimed)} email(s).")
+            return claimed
+        except Exception as e:
+            self.db.session.rollback()
+            logger.error(f"Error claiming outbox emails for {worker_id}: {e}", exc_info=True)
+            raise
+
+    def mark_sent(self, email_id, gmail_message_id):
+        """Records a successful send; the row then waits for its completion message to be delivered."""
+        OutboxEmail.query.filter_by(id=email_id).update({
+            'status': OUTBOX_SENT,
+            'gmail_message_id': gmail_message_id,
+            'sent_at': func.now(),
+            'last_error': None,
+            'run_after': func.now(),
+        }, synchronize_session=False)
+        self.db.session.commit()
+
+    def complete(self, email_id):
+        """Marks a sent email as done once its workflow has been told (or had nothing to be told)."""
+        OutboxEmail.query.filter_by(id=email_id).update({
+            'status': OUTBOX_DONE,
+            'locked_by': None,
+            'locked_at': None,
+        }, synchronize_session=False)
+        self.db.session.commit()
+
+    def retry_notification(self, email_id, error, delay_seconds=None, count=True):
+        """
+        Puts a sent email back to deliver its completion message later. Counted failures are
+        retried with exponential backoff until max_attempts is reached; after that the row is
+        kept as failed and the UserWorkflow is marked FAILED. count=False (e.g. the workflow
+        is locked) retries after delay_seconds without counting.
+        """
+        row = OutboxEmail.query.get(email_id)
+        if row is None:
+            return
+        row.last_error = str(error)
+        row.locked_by = None
+        row.locked_at = None
+        if count:
+            row.notify_attempts = row.notify_attempts + 1
+        if count and row.notify_attempts >= self.max_attempts:
+            row.status = OUTBOX_FAILED
+            UserWorkflow.query.filter_by(workflow_id=str(row.workflow_id)).update(
+                {'workflow_status': UserWorkflowStatusEnum.FAILED}, synchronize_session=False
+            )
+            logger.error(
+                f"Outbox email {email_id}: could not resume workflow {row.workflow_id} "
+                f"after {row.notify_attempts} attempt(s): {error}"
+            )
+        else:
+            if delay_seconds is None:
+                delay_seconds = self._backoff(row.notify_attempts)
+            row.run_after = func.now() + datetime.timedelta(seconds=delay_seconds)
+        self.db.session.commit()
+
+    def release(self, email_id, delay_seconds):
+        """Puts a claimed email back unsent without counting the attempt, e.g. while Gmail asks to slow down."""
+        OutboxEmail.query.filter_by(id=email_id).update({
+            'status': OUTBOX_PENDING,
+            'locked_by': None,
+            'locked_at': None,
+            'attempts': OutboxEmail.attempts - 1,
+            'run_after': func.now() + datetime.timedelta(seconds=delay_seconds),
+        }, synchronize_session=False)
+        self.db.session.commit()
+
+    def fail(self, email_id, error, retryable=True):
+        """
+        Records a failed send. Retryable failures are retried with exponential backoff until
+        max_attempts is reached; after that, or for a permanent failure (e.g. an invalid
+        recipient), the row is kept as failed and the UserWorkflow is marked FAILED.
+        """
+        row = OutboxEmail.query.get(email_id)
+        if row is None:
+            return
+        row.last_error = str(error)
+        row.locked_by = None
+        row.locked_at = None
+        if not retryable or row.attempts >= self.max_attempts:
+            row.status = OUTBOX_FAILED
+            UserWorkflow.query.filter_by(workflow_id=str(row.workflow_id)).update(
+                {'workflow_status': UserWorkflowStatusEnum.FAILED}, synchronize_session=False
+            )
+            logger.error(
+                f"Outbox email {email_id} for workflow {row.workflow_id} failed after {row.attempts} attempt(s): {error}"
+            )
+        else:
+            backoff = self._backoff(row.attempts)
+            row.status = OUTBOX_PENDING
+            row.run_after = func.now() + datetime.timedelta(seconds=backoff)
+            logger.warning(f"Outbox email {email_id} to {row.to_email} failed, retrying in {backoff:.0f}s: {error}")
+        self.db.session.commit()
@@ -0,0 +1,67 @@
+# /config/workspace/todo-app/backend/workflows/serializer/sql/projection.py
+import logging
+import time
+from datetime import datetime
+
+from SpiffWorkflow import TaskState
+from SpiffWorkflow.bpmn.specs.event_definitions.timer import TimerEventDefinition
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class StatusProjection:
+    """
+    The denormalized status of a workflow that is stored on instance and userworkflows.
+
+    Everything is computed in one pass over the task tree:
+    ready_count and active_tasks from READY tasks, failed_end from a completed
+    End*Failed task, next_wakeup from WAITING timer events, and completed from
+    whether any task is left unfinished.
+    """
+
+    def __init__(self, ready_count=0, active_tasks=None, completed=False, success=True, failed_end=None, next_wakeup=None):
+        self.ready_count = ready_count
+        self.active_tasks = active_tasks or []
+        self.completed = completed
+        self.success = success
+        self.failed_end = failed_end
+        self.next_wakeup = next_wakeup
+
+    @classmethod
+    def from_workflow(cls, workflow):
+        started = time.perf_counter()
+        projection = cls(success=workflow.success)
+        unfinished = False
+        for task in workflow.get_tasks_iterator():
+            if task.state == TaskState.READY:
+                projection.ready_count += 1
+                projection.active_tasks.append(task.task_spec.name)
+            elif task.state == TaskState.WAITING:
+                projection._add_timer(task)
+            elif task.state == TaskState.COMPLETED:
+                name = task.task_spec.name
+                if name.startswith('End') and name.endswith('Failed'):
+                    projection.failed_end = name
+            if task.has_state(TaskState.NOT_FINISHED_MASK):
+                unfinished = True
+        projection.completed = workflow.completed or not unfinished
+        metrics.WORKFLOW_PHASE_SECONDS.observe(time.perf_counter() - started, phase='status_projection')
+        return projection
+
+    def _add_timer(self, task):
+        event_definition = getattr(task.task_spec, 'event_definition', None)
+        if not isinstance(event_definition, TimerEventDefinition):
+            return
+        value = event_definition.details(task).value
+        if not isinstance(value, str):
+            # Not evaluated yet, or a cycle timer with no cycles left
+            return
+        try:
+            fire_at = TimerEventDefinition.parse_time_or_duration(value)
+        except Exception as e:
+            logger.warning(f"Could not parse timer value {value!r} for task {task.task_spec.name}: {e}")
+            return
+        if isinstance(fire_at, datetime) and (self.next_wakeup is None or fire_at < self.next_wakeup):
+            self.next_wakeup = fire_at
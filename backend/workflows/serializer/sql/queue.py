@@ -0,0 +1,111 @@
+# /config/workspace/todo-app/backend/workflows/serializer/sql/queue.py
+import datetime
+import logging
+
+from sqlalchemy import and_, or_, func
+
+from models.workflow_job import WorkflowJob, JOB_PENDING, JOB_RUNNING, JOB_FAILED
+from models.user_workflow import UserWorkflow, UserWorkflowStatusEnum
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueue:
+    """
+    A durable queue of workflow instances waiting to be advanced, stored in the
+    workflow_job table. Web workers enqueue; worker processes claim jobs with
+    SELECT ... FOR UPDATE SKIP LOCKED so concurrent workers never get the same row.
+
+    A claimed job is leased: if a worker dies while running it, the job becomes
+    claimable again once lease_seconds have passed.
+    """
+
+    def __init__(self, db_session, max_attempts=5, lease_seconds=300, max_backoff_seconds=600):
+        self.db = db_session
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+
+    def enqueue(self, workflow_ids, commit=True):
+        """Adds one job per workflow id. With commit=False the jobs join the caller's transaction."""
+        jobs = [WorkflowJob(workflow_id=wf_id) for wf_id in workflow_ids]
+        self.db.session.add_all(jobs)
+        if commit:
+            self.db.session.commit()
+        logger.info(f"Enqueued {len(jobs)} workflow job(s).")
+        return jobs
+
+    def claim(self, worker_id, limit=10):
+        """
+        Claims up to limit due jobs for worker_id and commits the lease.
+        Returns a list of (job_id, workflow_id) tuples.
+        """
+        lease_expired = func.now() - datetime.timedelta(seconds=self.lease_seconds)
+        try:
+            jobs = (
+                WorkflowJob.query
+                .filter(or_(
+                    and_(WorkflowJob.status == JOB_PENDING, WorkflowJob.run_after <= func.now()),
+                    and_(WorkflowJob.status == JOB_RUNNING, WorkflowJob.locked_at < lease_expired),
+                ))
+                .order_by(WorkflowJob.run_after)
+                .limit(limit)
+                .with_for_update(skip_locked=True)
+                .all()
+            )
+            claimed = []
+            for job in jobs:
+                job.status = JOB_RUNNING
+                job.locked_by = worker_id
+                job.locked_at = func.now()
+                job.attempts = job.attempts + 1
+                claimed.append((job.id, job.workflow_id))
+            self.db.session.commit()
+            if claimed:
+                logger.info(f"Worker {worker_id} claimed {len(claimed)} job(s).")
+            return claimed
+        except Exception as e:
+            self.db.session.rollback()
+            logger.error(f"Error claiming jobs for worker {worker_id}: {e}", exc_info=True)
+            raise
+
+    def complete(self, job_id):
+        """Removes a job once its workflow has been advanced."""
+        WorkflowJob.query.filter_by(id=job_id).delete(synchronize_session=False)
+        self.db.session.commit()
+
+    def release(self, job_id, delay_seconds=5):
+        """Puts a claimed job back without counting the attempt, e.g. when its workflow is locked."""
+        WorkflowJob.query.filter_by(id=job_id).update({
+            'status': JOB_PENDING,
+            'locked_by': None,
+            'locked_at': None,
+            'attempts': WorkflowJob.attempts - 1,
+            'run_after': func.now() + datetime.timedelta(seconds=delay_seconds),
+        }, synchronize_session=False)
+        self.db.session.commit()
+
+    def fail(self, job_id, error):
+        """
+        Records a failed attempt. The job is retried with exponential backoff until
+        max_attempts is reached, after which it is kept as failed and the
+        UserWorkflow is marked FAILED.
+        """
+        job = WorkflowJob.query.get(job_id)
+        if job is None:
+            return
+        job.last_error = str(error)
+        job.locked_by = None
+        job.locked_at = None
+        if job.attempts >= self.max_attempts:
+            job.status = JOB_FAILED
+            UserWorkflow.query.filter_by(workflow_id=str(job.workflow_id)).update(
+                {'workflow_status': UserWorkflowStatusEnum.FAILED}, synchronize_session=False
+            )
+            logger.error(f"Job {job_id} for workflow {job.workflow_id} failed after {job.attempts} attempt(s): {error}")
+        else:
+            backoff = min(2 ** job.attempts, self.max_backoff_seconds)
+            job.status = JOB_PENDING
+            job.run_after = func.now() + datetime.timedelta(seconds=backoff)
+            logger.warning(f"Job {job_id} for workflow {job.workflow_id} failed, retrying in {backoff}s: {error}")
+        self.db.session.commit()
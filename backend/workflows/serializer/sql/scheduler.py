@@ -0,0 +1,58 @@
+# /config/workspace/todo-app/backend/workflows/serializer/sql/scheduler.py
+import datetime
+import logging
+
+from sqlalchemy import func
+
+from models.instance import Instance
+
+logger = logging.getLogger(__name__)
+
+
+class TimerScheduler:
+    """
+    Wakes instances whose timer events are due.
+
+    SqlSerializer.update_workflow keeps instance.next_wakeup at the earliest fire
+    time of the instance's waiting timers, so each tick is a range scan on the
+    partial next_wakeup index that touches only due rows. Due instances are
+    handed to the JobQueue; the worker refreshes their timers and runs them.
+
+    Rows are claimed with FOR UPDATE SKIP LOCKED and their next_wakeup is pushed
+    back by retry_seconds, so several schedulers can run at once and an instance
+    whose job fails is picked up again later. The worker's save overwrites the
+    pushed value with the real next fire time.
+    """
+
+    def __init__(self, db_session, job_queue, batch_size=500, retry_seconds=300):
+        self.db = db_session
+        self.job_queue = job_queue
+        self.batch_size = batch_size
+        self.retry_seconds = retry_seconds
+
+    def tick(self):
+        """Enqueues one batch of due instances and returns how many were enqueued."""
+        try:
+            due_ids = [
+                row.id for row in
+                Instance.query.with_entities(Instance.id)
+                .filter(Instance.next_wakeup <= func.now())
+                .order_by(Instance.next_wakeup)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+                .all()
+            ]
+            if due_ids:
+                Instance.query.filter(Instance.id.in_(due_ids)).update(
+                    {'next_wakeup': func.now() + datetime.timedelta(seconds=self.retry_seconds)},
+                    synchronize_session=False
+                )
+                self.job_queue.enqueue(due_ids, commit=False)
+            self.db.session.commit()
+            if due_ids:
+                logger.info(f"Timer scheduler woke {len(due_ids)} instance(s).")
+            return len(due_ids)
+        except Exception as e:
+            self.db.session.rollback()
+            logger.error(f"Error running timer scheduler tick: {e}", exc_info=True)
+            raise
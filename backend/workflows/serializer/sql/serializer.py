@@ -5,21 +5,44 @@ import json # Keep json for potential direct use, though SQLAlchemy handles much
 
 from SpiffWorkflow.bpmn.serializer.workflow import BpmnWorkflowSerializer
 from SpiffWorkflow.bpmn.specs.mixins.subworkflow_task import SubWorkflowTask
+from SpiffWorkflow.bpmn.specs.mixins.events.intermediate_event import SendTask
 from SpiffWorkflow import TaskState
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy import func # Import func for potential use, though models use it
+from sqlalchemy import case, false, func, insert, literal, or_, update # Import func for potential use, though models use it
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
-# Import your app's db object and models
-from app import db
+# Import your app's models
 from models.instance import Instance
-from models.workflow import Workflow, Task # Task needed for subprocess logic and instance update
-# Removed TaskData, WorkflowData as they aren't directly used in the serializer logic shown
+from models.workflow import Workflow, Task, TaskData, WorkflowData, MessageSubscription # Task tables are used by delta persistence
 from models.workflow_spec import WorkflowSpec, TaskSpec, SpecDependency
+from models.email_outbox import OutboxEmail
 # --- Import UserWorkflow model and Enum ---
 from models.user_workflow import UserWorkflow, UserWorkflowStatusEnum # Make sure DELETED is in this Enum
 
+from utils import metrics
+
+from ..binary import BinaryFormat
+from ..cache import SpecCache
+from ..errors import WorkflowConflictError
+from .lock import WorkflowLocks
+from .outbox import OUTBOX_EMAIL_VARIABLE
+from .projection import StatusProjection
+
 logger = logging.getLogger(__name__)
 
+# Persistence modes
+# 'document' stores the full to_dict() blob in _workflow.serialization on every save.
+# 'delta' stores a small workflow skeleton there and writes tasks and workflow data
+# to _task/_task_data/_workflow_data, touching only the rows that changed.
+PERSISTENCE_DOCUMENT = 'document'
+PERSISTENCE_DELTA = 'delta'
+
+# Storage formats for _workflow itself
+# 'jsonb' writes _workflow.serialization; 'binary' writes a compressed, versioned blob to
+# _workflow.serialization_bin. Rows in either format can always be read back.
+STORAGE_JSONB = 'jsonb'
+STORAGE_BINARY = 'binary'
+
 
 class SqlSerializer(BpmnWorkflowSerializer):
     """
@@ -31,30 +54,52 @@ class SqlSerializer(BpmnWorkflowSerializer):
     # @staticmethod
     # def initialize(db): ...
 
-    def __init__(self, db_session, **kwargs):
+    def __init__(self, db_session, persistence=PERSISTENCE_DOCUMENT, spec_cache_size=32,
+                 storage=STORAGE_JSONB, binary_format=None, lock_timeout=10.0, **kwargs):
         """
         Initializes the serializer.
 
         :param db_session: The SQLAlchemy session object (e.g., app.db.session).
                            Note: We actually store the db object itself for session access.
+        :param persistence: PERSISTENCE_DOCUMENT or PERSISTENCE_DELTA. Rows written in either
+                            mode can always be read back.
+        :param spec_cache_size: Number of restored specs kept in memory (0 disables the cache).
+        :param storage: STORAGE_JSONB or STORAGE_BINARY for the _workflow document.
+        :param binary_format: The BinaryFormat used in binary storage (default: BinaryFormat()).
+        :param lock_timeout: Default seconds lock_workflow waits for another holder.
         """
         super().__init__(**kwargs)
         # Store the db object from Flask-SQLAlchemy
         self.db = db_session # Parameter name kept as db_session for clarity, but it's the db object
         # No dbname needed anymore
+        if persistence not in (PERSISTENCE_DOCUMENT, PERSISTENCE_DELTA):
+            raise ValueError(f"Unknown persistence mode '{persistence}'")
+        self.persistence = persistence
+        # Restored specs (and their dependency maps) keyed by spec id; specs never change once stored
+        self.spec_cache = SpecCache(spec_cache_size) if spec_cache_size else None
+        if storage not in (STORAGE_JSONB, STORAGE_BINARY):
+            raise ValueError(f"Unknown storage format '{storage}'")
+        self.storage = storage
+        self.binary_format = binary_format or BinaryFormat()
+        self.locks = WorkflowLocks(db_session, timeout_seconds=lock_timeout)
 
     # --- Workflow Spec Methods ---
 
-    def create_workflow_spec(self, spec, dependencies):
+    def create_workflow_spec(self, spec, dependencies, content_hash=None):
         """
         Creates or retrieves a workflow specification and its dependencies.
         Handles the database transaction.
+
+        :param content_hash: Fingerprint of the files the spec was parsed from. Specs are
+                             versioned by it: the same files return the stored version,
+                             changed files register a new version of spec.name and of
+                             its subprocess specs.
         """
         try:
-            spec_id, new = self._create_workflow_spec_internal(spec)
+            spec_id, new = self._create_workflow_spec_internal(spec, content_hash)
             if new and dependencies:
                 # Recursively create dependencies and collect relationships
-                pairs = self._resolve_spec_dependencies(spec_id, spec, dependencies)
+                pairs = self._resolve_spec_dependencies(spec_id, spec, dependencies, content_hash)
                 if pairs:
                     self._set_spec_dependencies_internal(pairs)
 
@@ -66,35 +111,65 @@ class SqlSerializer(BpmnWorkflowSerializer):
             logger.error(f"Error creating workflow spec '{spec.name}': {e}", exc_info=True)
             raise # Re-raise after logging and rollback
 
-    def _create_workflow_spec_internal(self, spec):
+    def find_workflow_spec(self, name, content_hash):
+        """Returns the id of the version of spec name parsed from files with content_hash, or None."""
+        row = (
+            self.db.session.query(WorkflowSpec.id)
+            .filter(WorkflowSpec.name == name, WorkflowSpec.content_hash == content_hash)
+            .order_by(WorkflowSpec.version.desc())
+            .first()
+        )
+        return row.id if row else None
+
+    def find_latest_workflow_spec(self, name):
+        """Returns the id of the latest version of spec name, or None."""
+        row = (
+            self.db.session.query(WorkflowSpec.id)
+            .filter(WorkflowSpec.name == name)
+            .order_by(WorkflowSpec.version.desc())
+            .first()
+        )
+        return row.id if row else None
+
+    def _create_workflow_spec_internal(self, spec, content_hash=None):
         """
         Internal method to find or create a WorkflowSpec record.
         Does NOT commit the session.
-        Assumes spec.name uniquely identifies a spec for lookup within serialization.
-        """
-        # Query based on unique properties stored within serialization JSON
-        # Using json path expression requires specific DB support (PostgreSQL JSONB works well)
-        # Note: Consider adding a dedicated 'name' column to WorkflowSpec for efficient lookup
-        # if this becomes a performance bottleneck.
-        existing_spec = WorkflowSpec.query.filter(
-            WorkflowSpec.serialization['name'].as_string() == spec.name
-        ).first()
-
-        if existing_spec:
-            logger.debug(f"Found existing WorkflowSpec: Name='{spec.name}', ID={existing_spec.id}")
-            return existing_spec.id, False
+        With a content_hash, a version parsed from the same files is reused and changed files
+        register the next version. Without one, the latest version of spec.name is reused.
+        """
+        if content_hash is None:
+            existing_id = self.find_latest_workflow_spec(spec.name)
         else:
-            dct = self.to_dict(spec) # Use the appropriate converter
-            # Add 'name' to top level of dict if needed for query, or rely on JSON path
-            # dct['name'] = spec.name # Already done by converter if spec has 'name' attribute
-            new_spec = WorkflowSpec(serialization=dct)
+            existing_id = self.find_workflow_spec(spec.name, content_hash)
+        if existing_id is not None:
+            logger.debug(f"Found existing WorkflowSpec: Name='{spec.name}', ID={existing_id}")
+            return existing_id, False
+
+        dct = self.to_dict(spec) # Use the appropriate converter
+        latest_version = self.db.session.query(func.max(WorkflowSpec.version)).filter(WorkflowSpec.name == spec.name).scalar()
+        new_spec = WorkflowSpec(
+            name=spec.name,
+            version=(latest_version or 0) + 1,
+            content_hash=content_hash,
+            serialization=dct,
+        )
+        try:
             # ID is generated by DB (server_default)
-            self.db.session.add(new_spec)
-            self.db.session.flush() # Flush to get the generated ID
-            logger.info(f"Created new WorkflowSpec: Name='{spec.name}', ID={new_spec.id}")
-            return new_spec.id, True
-
-    def _resolve_spec_dependencies(self, parent_id, parent_spec, all_dependencies):
+            with self.db.session.begin_nested():
+                self.db.session.add(new_spec)
+                self.db.session.flush() # Flush to get the generated ID
+        except IntegrityError:
+            # Another worker registered this version at the same time; use theirs if it is the same files
+            existing_id = self.find_workflow_spec(spec.name, content_hash) if content_hash is not None else None
+            if existing_id is None:
+                raise
+            logger.info(f"WorkflowSpec '{spec.name}' was registered concurrently, using ID={existing_id}")
+            return existing_id, False
+        logger.info(f"Created new WorkflowSpec: Name='{spec.name}', Version={new_spec.version}, ID={new_spec.id}")
+        return new_spec.id, True
+
+    def _resolve_spec_dependencies(self, parent_id, parent_spec, all_dependencies, content_hash=None):
         """
         Recursively finds/creates child specs and returns dependency pairs (parent_id, child_id).
         Does NOT commit the session.
@@ -105,13 +180,13 @@ class SqlSerializer(BpmnWorkflowSerializer):
             if isinstance(task_spec, SubWorkflowTask) and task_spec.spec in all_dependencies:
                 child_spec_obj = all_dependencies[task_spec.spec]
                 # Ensure child spec exists in DB
-                child_id, new_child = self._create_workflow_spec_internal(child_spec_obj)
+                child_id, new_child = self._create_workflow_spec_internal(child_spec_obj, content_hash)
                 # Add dependency pair
                 pairs.add((parent_id, child_id))
                 # If the child was newly created, recurse to find its dependencies
                 if new_child:
                     # Pass only relevant dependencies for the child if possible, or all_dependencies
-                    child_pairs = self._resolve_spec_dependencies(child_id, child_spec_obj, all_dependencies)
+                    child_pairs = self._resolve_spec_dependencies(child_id, child_spec_obj, all_dependencies, content_hash)
                     pairs.update(child_pairs)
         return pairs
 
@@ -132,41 +207,58 @@ class SqlSerializer(BpmnWorkflowSerializer):
     def get_workflow_spec(self, spec_id, include_dependencies=True):
         """Retrieves a workflow specification, optionally including dependencies."""
         try:
+            if self.spec_cache is not None:
+                spec_id = UUID(str(spec_id)) if not isinstance(spec_id, UUID) else spec_id
+                entry = self.spec_cache.get(spec_id)
+                if entry is None:
+                    spec_obj = WorkflowSpec.query.get(spec_id)
+                    if not spec_obj:
+                        logger.warning(f"WorkflowSpec with id {spec_id} not found.")
+                        return None, {}
+                    entry = self._restore_spec(spec_obj)
+                    self.spec_cache.put(spec_id, entry)
+                spec, subprocess_specs = entry
+                # Copy the map so callers can't change the cached entry
+                return spec, dict(subprocess_specs) if include_dependencies else {}
+
             spec_obj = WorkflowSpec.query.get(spec_id)
             if not spec_obj:
                 logger.warning(f"WorkflowSpec with id {spec_id} not found.")
                 return None, {} # Or raise an error
 
-            spec = self.from_dict(spec_obj.serialization) # Use appropriate converter
-            subprocess_specs = {}
-
-            if include_dependencies:
-                # Use the relationship defined in the model
-                # Assumes child spec serialization contains 'name'
-                # Use .all() on the lazy dynamic relationship
-                for dep in spec_obj.child_dependencies.all():
-                     child_spec_record = dep.child_spec # Access related spec via relationship
-                     if child_spec_record and 'name' in child_spec_record.serialization:
-                         child_name = child_spec_record.serialization['name']
-                         subprocess_specs[child_name] = self.from_dict(child_spec_record.serialization)
-                     else:
-                         logger.warning(f"Could not find name or child spec for dependency from {spec_id} to {dep.child_id}")
-
-            return spec, subprocess_specs
+            return self._restore_spec(spec_obj, include_dependencies)
         except Exception as e:
             logger.error(f"Error getting workflow spec {spec_id}: {e}", exc_info=True)
             # No transaction to rollback, just raise
             raise
 
+    @metrics.timed(metrics.WORKFLOW_PHASE_SECONDS, span_name='workflow.restore_spec', phase='restore_spec')
+    def _restore_spec(self, spec_obj, include_dependencies=True):
+        """Restores a WorkflowSpec record and (optionally) its child specs. Returns (spec, subprocess_specs)."""
+        spec = self.from_dict(spec_obj.serialization) # Use appropriate converter
+        subprocess_specs = {}
+
+        if include_dependencies:
+            # Use the relationship defined in the model
+            # Assumes child spec serialization contains 'name'
+            # Use .all() on the lazy dynamic relationship
+            for dep in spec_obj.child_dependencies.all():
+                 child_spec_record = dep.child_spec # Access related spec via relationship
+                 if child_spec_record and 'name' in child_spec_record.serialization:
+                     child_name = child_spec_record.serialization['name']
+                     subprocess_specs[child_name] = self.from_dict(child_spec_record.serialization)
+                 else:
+                     logger.warning(f"Could not find name or child spec for dependency from {spec_obj.id} to {dep.child_id}")
+
+        return spec, subprocess_specs
+
     def list_specs(self):
         """Lists available workflow specifications."""
         try:
-            # Extract 'name' from the JSONB serialization field
             specs = WorkflowSpec.query.with_entities(
                 WorkflowSpec.id,
-                WorkflowSpec.serialization['name'].as_string().label('name')
-                # Add WorkflowSpec.serialization['file'].as_string().label('filename') if needed
-            ).order_by(WorkflowSpec.serialization['name'].as_string()).all()
+                WorkflowSpec.name,
+            ).order_by(WorkflowSpec.name, WorkflowSpec.version).all()
             # Return list of tuples (id, name)
             return [(s.id, s.name) for s in specs]
         except Exception as e:
@@ -186,6 +278,8 @@ class SqlSerializer(BpmnWorkflowSerializer):
             # leading to an IntegrityError on commit.
             self.db.session.delete(spec_obj)
             self.db.session.commit()
+            if self.spec_cache is not None:
+                self.spec_cache.discard(spec_obj.id)
             logger.info(f"Deleted WorkflowSpec {spec_id}")
             return True # Indicate success
         except IntegrityError:
@@ -199,95 +293,106 @@ class SqlSerializer(BpmnWorkflowSerializer):
 
     # --- Workflow Instance Methods ---
 
-    # --- NEW HELPER METHOD ---
-    def _count_ready_tasks(self, workflow):
-        """Counts tasks in the READY state within a workflow object."""
-        # Manually count tasks with state value 16 (TaskState.READY)
-        # This handles cases where the state might be an int or a TaskState enum
-        tasks_with_state_ready = 0
-        # Fallback to manual iteration if get_tasks fails or is unreliable here
-        # logger.warning(f"get_tasks(TaskState.READY) cannot work in SqlSerializer, falling back to manual count.")
-        all_tasks = workflow.get_tasks() # Get all tasks
-        for task in all_tasks:
-            # Check both TaskState enum and integer value for robustness
-            if (isinstance(task.state, TaskState) and task.state == TaskState.READY) or \
-                (isinstance(task.state, int) and task.state == TaskState.READY): # [TODO] 'int' object has no attribute 'value' for TaskState.READY.value here
-                tasks_with_state_ready += 1
-        # tasks_with_state_ready = len(workflow.get_tasks(TaskState.READY))
-        return tasks_with_state_ready
-    # --- END NEW HELPER METHOD ---
-
     def create_workflow(self, workflow, spec_id):
         """Creates a new workflow instance and its subprocesses."""
+        return self.create_workflows([workflow], spec_id)[0]
+
+    def create_workflows(self, workflows, spec_id, commit=True):
+        """
+        Creates workflow instances for several workflows of the same spec in one transaction.
+        The spec and its dependencies are looked up once and the Workflow, Instance and
+        delta rows are inserted in bulk. Returns the new workflow ids in the same order.
+        With commit=False the rows are only flushed, so the caller can add its own rows
+        (e.g. UserWorkflow) and commit everything together.
+        """
         try:
             # Ensure the spec exists
             spec_obj = WorkflowSpec.query.get(spec_id)
             if not spec_obj:
                  raise ValueError(f"WorkflowSpec with id {spec_id} not found.")
+            spec_name = spec_obj.name or spec_obj.serialization.get('name', 'Unknown')
+            child_spec_map = None
+
+            created, pending, subscription_rows = [], [], []
+            for workflow in workflows:
+                # Convert main workflow
+                with metrics.timed(metrics.WORKFLOW_PHASE_SECONDS, span_name='workflow.serialize', phase='serialize'):
+                    dct = self.to_dict(workflow)
+
+                # Create main workflow record
+                # Generate a new UUID for the main workflow
+                wf_id = uuid4()
+                new_wf = Workflow(id=wf_id, workflow_spec_id=spec_id)
+                pending.append((new_wf, dct, True))
+                logger.info(f"Creating Workflow ID: {wf_id} for Spec ID: {spec_id}")
+
+                # Handle subprocesses if any
+                if workflow.subprocesses:
+                    if child_spec_map is None:
+                        # Get spec dependencies to find child spec IDs
+                        # Use .all() on the lazy dynamic relationship
+                        spec_deps = spec_obj.child_dependencies.all()
+                        # Create a map of child spec name -> child spec id
+                        child_spec_map = {
+                            dep.child_spec.serialization['name']: dep.child_id
+                            for dep in spec_deps if dep.child_spec and 'name' in dep.child_spec.serialization
+                        }
+
+                    for sp_task_id, sp_workflow in workflow.subprocesses.items():
+                        sp_spec_name = sp_workflow.spec.name
+                        if sp_spec_name not in child_spec_map:
+                            raise ValueError(f"Cannot find spec dependency for subprocess spec name '{sp_spec_name}'")
 
-            # Convert main workflow
-            dct = self.to_dict(workflow)
-
-            # Create main workflow record
-            # Generate a new UUID for the main workflow
-            wf_id = uuid4()
-            new_wf = Workflow(id=wf_id, workflow_spec_id=spec_id, serialization=dct)
-            self.db.session.add(new_wf)
-            logger.info(f"Creating Workflow ID: {wf_id} for Spec ID: {spec_id}")
-
-            # Handle subprocesses if any
-            if workflow.subprocesses:
-                # Get spec dependencies to find child spec IDs
-                # Use .all() on the lazy dynamic relationship
-                spec_deps = spec_obj.child_dependencies.all()
-                # Create a map of child spec name -> child spec id
-                child_spec_map = {
-                    dep.child_spec.serialization['name']: dep.child_id
-                    for dep in spec_deps if dep.child_spec and 'name' in dep.child_spec.serialization
-                }
-
-                for sp_task_id, sp_workflow in workflow.subprocesses.items():
-                    sp_spec_name = sp_workflow.spec.name
-                    if sp_spec_name not in child_spec_map:
-                        raise ValueError(f"Cannot find spec dependency for subprocess spec name '{sp_spec_name}'")
-
-                    sp_spec_id = child_spec_map[sp_spec_name]
-                    sp_dct = self.to_dict(sp_workflow) # Use appropriate converter
-
-                    # Use the task_id from the parent as the ID for the subprocess workflow record
-                    # Ensure sp_task_id is a UUID
-                    sp_wf_id = UUID(str(sp_task_id)) if not isinstance(sp_task_id, UUID) else sp_task_id
-                    sp_wf = Workflow(id=sp_wf_id, workflow_spec_id=sp_spec_id, serialization=sp_dct)
-                    self.db.session.add(sp_wf)
-                    logger.info(f"Creating Subprocess Workflow ID: {sp_wf_id} (Task ID) for Spec ID: {sp_spec_id}")
-
-            # Create the associated Instance record
-            # The Instance ID must match the Workflow ID
-
-            # Use the helper method to count ready tasks
-            initial_ready_tasks = self._count_ready_tasks(workflow)
-            logger.info(f"Initial ready task count: {initial_ready_tasks}")
-
-            instance = Instance(
-                id=wf_id, # Use the same ID as the Workflow
-                spec_name=spec_obj.serialization.get('name', 'Unknown'), # Get name from spec serialization
-                # Calculate initial ready tasks for the instance record using the helper
-                active_tasks=initial_ready_tasks,
-                # started is server_default
-            )
-            self.db.session.add(instance)
-            logger.info(f"Creating Instance record for Workflow ID: {wf_id}")
-
-            # --- UserWorkflow creation removed from here ---
-
-            self.db.session.commit()
-            logger.info(f"Committed creation for Workflow ID: {wf_id}")
-            return wf_id # Return the main workflow ID
+                        sp_spec_id = child_spec_map[sp_spec_name]
+                        with metrics.timed(metrics.WORKFLOW_PHASE_SECONDS, span_name='workflow.serialize', phase='serialize'):
+                            sp_dct = self.to_dict(sp_workflow) # Use appropriate converter
+
+                        # Use the task_id from the parent as the ID for the subprocess workflow record
+                        # Ensure sp_task_id is a UUID
+                        sp_wf_id = UUID(str(sp_task_id)) if not isinstance(sp_task_id, UUID) else sp_task_id
+                        sp_wf = Workflow(id=sp_wf_id, workflow_spec_id=sp_spec_id)
+                        pending.append((sp_wf, sp_dct, False))
+                        logger.info(f"Creating Subprocess Workflow ID: {sp_wf_id} (Task ID) for Spec ID: {sp_spec_id}")
+
+                # Create the associated Instance record
+                # The Instance ID must match the Workflow ID
+                projection = StatusProjection.from_workflow(workflow)
+                pending_instance = Instance(
+                    id=wf_id, # Use the same ID as the Workflow
+                    spec_name=spec_name, # Get name from spec serialization
+                    spec_version=spec_obj.version,
+                    active_tasks=projection.ready_count,
+                    next_wakeup=projection.next_wakeup,
+                    # started is server_default
+                )
+                created.append((wf_id, pending_instance))
+                subscription_rows.extend(
+                    {'workflow_id': wf_id, 'message_name': name, 'correlations': correlations}
+                    for name, correlations in self._message_subscriptions(workflow).items()
+                )
+
+            self._store_new_serializations(pending)
+            self.db.session.add_all([instance for _, instance in created])
+            logger.info(f"Creating {len(created)} Instance record(s) for Spec ID: {spec_id}")
+            if subscription_rows:
+                self.db.session.flush()
+                self.db.session.execute(insert(MessageSubscription), subscription_rows)
+
+            if commit:
+                with metrics.timed(metrics.WORKFLOW_PHASE_SECONDS, span_name='workflow.commit', phase='commit'):
+                    self.db.session.commit()
+                logger.info(f"Committed creation of {len(created)} workflow(s) for Spec ID: {spec_id}")
+            else:
+                self.db.session.flush()
+            for workflow in workflows:
+                workflow._persistence_version = 1
+            return [wf_id for wf_id, _ in created]
         except Exception as e:
             self.db.session.rollback()
             logger.error(f"Error creating workflow for spec {spec_id}: {e}", exc_info=True)
             raise
 
+    @metrics.timed(metrics.WORKFLOW_PHASE_SECONDS, span_name='workflow.restore', phase='restore')
     def get_workflow(self, wf_id, include_dependencies=True):
         """Retrieves a workflow instance, optionally including subprocesses."""
         try:
@@ -299,14 +404,25 @@ class SqlSerializer(BpmnWorkflowSerializer):
             # Initial deserialization of the main workflow
             # The `from_dict` method might need modification if it expects subprocesses
             # to be passed in during deserialization.
-            workflow = self.from_dict(wf_obj.serialization)
+            # Reuse the cached, already restored spec instead of rebuilding it from JSON
+            spec_entry = None
+            if self.spec_cache is not None:
+                spec, subprocess_specs = self.get_workflow_spec(wf_obj.workflow_spec_id)
+                if spec is not None:
+                    spec_entry = spec, subprocess_specs
+
+            workflow = self.from_dict(self._load_serialization(wf_obj, spec_entry=spec_entry))
             workflow.id = wf_obj.id # Ensure ID is set on the object
+            # The version update_workflow expects to overwrite
+            workflow._persistence_version = wf_obj.version
 
             if include_dependencies:
                 # 1. Get Subprocess Specs (using the spec relationship)
-                spec_obj = wf_obj.workflow_spec # Access related spec via relationship
                 subprocess_specs = {}
-                if spec_obj:
+                if spec_entry is not None:
+                    subprocess_specs = dict(spec_entry[1])
+                elif wf_obj.workflow_spec:
+                    spec_obj = wf_obj.workflow_spec # Access related spec via relationship
                     # Use .all() on the lazy dynamic relationship
                     for dep in spec_obj.child_dependencies.all():
                         child_spec_record = dep.child_spec
@@ -340,11 +456,13 @@ class SqlSerializer(BpmnWorkflowSerializer):
                             sub_record = sub_workflows_map[task_id_uuid]
                             # Deserialize the subprocess, linking it to the parent task and top workflow
                             sp = self.from_dict(
-                                sub_record.serialization,
+                                self._load_serialization(sub_record, top=False),
                                 task=parent_task,
                                 top_workflow=workflow
                             )
                             sp.id = sub_record.id # Ensure ID is set
+                            # Same hookup the default converter does, so the parent task completes with the subprocess
+                            sp.completed_event.connect(parent_task.task_spec._on_subworkflow_completed, parent_task)
                             workflow.subprocesses[parent_task.id] = sp # Use original task ID as key
                         elif not parent_task:
                             logger.warning(f"Could not find parent task with id {task_id_uuid} in workflow {wf_id}")
@@ -356,6 +474,22 @@ class SqlSerializer(BpmnWorkflowSerializer):
             logger.error(f"Error getting workflow {wf_id}: {e}", exc_info=True)
             raise
 
+    def lock_workflow(self, wf_id, timeout=None):
+        """
+        Context manager that holds the advisory lock on a workflow while it is loaded, advanced
+        and saved, so two processes never work on the same instance at once.
+        Raises WorkflowLockTimeout if it is not free within timeout seconds (0 tries once).
+        """
+        return self.locks.hold(wf_id, timeout)
+
+    def lock_workflows(self, wf_ids):
+        """Context manager that locks whichever of wf_ids are free and yields the set of locked ids."""
+        return self.locks.hold_many(wf_ids)
+
+    def get_workflow_spec_id(self, wf_id):
+        """Returns the id of the spec (version) a stored workflow runs on, or None."""
+        return self.db.session.query(Workflow.workflow_spec_id).filter(Workflow.id == wf_id).scalar()
+
     def update_workflow(self, workflow, wf_id=None):
 
         """Updates a workflow instance and its subprocesses."""
@@ -363,17 +497,21 @@ class SqlSerializer(BpmnWorkflowSerializer):
             wf_id = workflow.id # Get ID from workflow object if not passed
         # Ensure wf_id is UUID
         wf_id = UUID(str(wf_id)) if not isinstance(wf_id, UUID) else wf_id
-        # Convert UUID to string for UserWorkflow lookup
-        wf_id_str = str(wf_id)
         try:
             # --- Update Main Workflow ---
             wf_obj = Workflow.query.get(wf_id)
             if not wf_obj:
                 raise ValueError(f"Workflow with id {wf_id} not found for update.")
+            new_version = self._bump_version(wf_id, workflow)
 
-            dct = self.to_dict(workflow) # Serialize the updated main workflow state
-            wf_obj.serialization = dct
+            with metrics.timed(metrics.WORKFLOW_PHASE_SECONDS, span_name='workflow.serialize', phase='serialize'):
+                dct = self.to_dict(workflow) # Serialize the updated main workflow state
+            self._store_serialization(wf_obj, dct)
             logger.debug(f"Updating main Workflow {wf_id} serialization.")
+            # Messages are caught by the top workflow, so subprocess catch events are included here
+            self._write_message_subscriptions(wf_id, workflow)
+            # Emails requested by send tasks are queued in the same commit as the state that requested them
+            self._write_outbox_emails(wf_id, workflow)
 
             # --- Update/Create Subprocesses ---
             if workflow.subprocesses:
@@ -393,12 +531,13 @@ class SqlSerializer(BpmnWorkflowSerializer):
 
                 for sp_task_id, sp_workflow in workflow.subprocesses.items():
                     sp_task_id_uuid = UUID(str(sp_task_id)) if not isinstance(sp_task_id, UUID) else sp_task_id
-                    sp_dct = self.to_dict(sp_workflow) # Serialize subprocess state
+                    with metrics.timed(metrics.WORKFLOW_PHASE_SECONDS, span_name='workflow.serialize', phase='serialize'):
+                        sp_dct = self.to_dict(sp_workflow) # Serialize subprocess state
 
                     if sp_task_id_uuid in existing_sp_map:
                         # Update existing subprocess workflow
                         sp_wf_obj = existing_sp_map[sp_task_id_uuid]
-                        sp_wf_obj.serialization = sp_dct
+                        self._store_serialization(sp_wf_obj, sp_dct, top=False)
                         logger.debug(f"Updating subprocess Workflow {sp_task_id_uuid} serialization.")
                     else:
                         # Create new subprocess workflow (e.g., if a new subworkflow task was reached)
@@ -407,88 +546,478 @@ class SqlSerializer(BpmnWorkflowSerializer):
                              raise ValueError(f"Cannot find spec dependency for new subprocess spec name '{sp_spec_name}'")
                         sp_spec_id = child_spec_map[sp_spec_name]
 
-                        sp_wf = Workflow(id=sp_task_id_uuid, workflow_spec_id=sp_spec_id, serialization=sp_dct)
+                        sp_wf = Workflow(id=sp_task_id_uuid, workflow_spec_id=sp_spec_id)
                         self.db.session.add(sp_wf)
+                        self._store_serialization(sp_wf, sp_dct, new=True, top=False)
                         logger.info(f"Creating new subprocess Workflow {sp_task_id_uuid} during update.")
 
-            # --- Update Instance Record ---
-            instance_obj = Instance.query.get(wf_id)
-            if instance_obj:
-                # Update active tasks count based on READY state using the helper
-                instance_obj.active_tasks = self._count_ready_tasks(workflow)
-                # Check if the workflow object has a completion timestamp attribute
-                if hasattr(workflow, 'completed_at') and workflow.completed_at:
-                    instance_obj.ended = workflow.completed_at
-                elif workflow.is_completed(): # Check completion status otherwise
-                    instance_obj.ended = db.func.now() # Set end time if completed now
-                else:
-                    instance_obj.ended = None # Ensure ended is null if not completed
-
-                # 'updated' column updates automatically via onupdate
-                logger.debug(f"Updating Instance {wf_id} record.")
-            else:
-                # This case might indicate an inconsistency, log a warning
-                logger.warning(f"Instance record for workflow {wf_id} not found during update.")
-                # Optionally create it if it should exist
-                # spec_name = wf_obj.workflow_spec.serialization.get('name', 'Unknown')
-                # instance = Instance(...)
-                # self.db.session.add(instance)
-
-            # --- Update UserWorkflow Record ---
-            user_workflow = UserWorkflow.query.filter_by(workflow_id=wf_id_str).first()
-            if user_workflow:
-                if workflow.is_completed():
-                    logger.info(f"Workflow {wf_id_str} completed. Updating UserWorkflow.")
-                    if workflow.success:
-                        completed_tasks = workflow.get_tasks(state=TaskState.COMPLETED)
-                        for completed_task in completed_tasks:
-                            if completed_task.task_spec.name.startswith('End') and completed_task.task_spec.name.endswith('Failed'):
-                                logger.info(f"Workflow {wf_id_str} failed gracefully.")
-                                user_workflow.workflow_status = UserWorkflowStatusEnum.FAILED
-                        if user_workflow.workflow_status != UserWorkflowStatusEnum.FAILED:
-                            logger.info(f"Workflow {wf_id_str} completed gracefully.")
-                            user_workflow.workflow_status = UserWorkflowStatusEnum.COMPLETED
-                    else:
-                        if user_workflow.workflow_status != UserWorkflowStatusEnum.TERMINATED:
-                            user_workflow.workflow_status = UserWorkflowStatusEnum.FAILED
-                    user_workflow.active_tasks = [] # Clear active tasks on completion
-                else:
-                    # Check if the status is already one of the terminal states before setting to RUNNING
-                    terminal_statuses = {
-                        UserWorkflowStatusEnum.TERMINATED,
-                        UserWorkflowStatusEnum.FAILED,
-                        UserWorkflowStatusEnum.CANCELLED,
-                        UserWorkflowStatusEnum.DELETED
-                    }
-                    if user_workflow.workflow_status not in terminal_statuses:
-                        logger.info(f"Workflow {wf_id_str} is running. Updating UserWorkflow.")
-                        user_workflow.workflow_status = UserWorkflowStatusEnum.RUNNING
-                        # Use TaskState.READY instead of STARTED directly
-                        started_tasks = [
-                            task.task_spec.name for task in workflow.get_tasks(state=TaskState.READY)
-                        ]
-                        user_workflow.active_tasks = started_tasks
-                        logger.debug(f"Setting active_tasks for {wf_id_str} to: {started_tasks}")
-                    else:
-                         logger.info(f"Workflow {wf_id_str} is in a terminal state ({user_workflow.workflow_status.value}). Skipping status update to RUNNING.")
-                         # Decide if active_tasks should be cleared or kept in terminal states other than COMPLETED/DELETED
-                         # user_workflow.active_tasks = [] # Optionally clear here too
+            # --- Update Instance and UserWorkflow Records ---
+            self._write_status_projection(wf_id, StatusProjection.from_workflow(workflow))
 
-
-                # Add to session to ensure changes are tracked
-                self.db.session.add(user_workflow)
-            else:
-                logger.warning(f"UserWorkflow record for workflow_id {wf_id_str} not found during update.")
-                # Consider if you need to create it here if it might be missing,
-                # though typically it should exist if created by `create_workflow` or another process.
-
-            self.db.session.commit()
+            with metrics.timed(metrics.WORKFLOW_PHASE_SECONDS, span_name='workflow.commit', phase='commit'):
+                self.db.session.commit()
+            workflow._persistence_version = new_version
             logger.info(f"Committed update for Workflow ID: {wf_id}")
+        except WorkflowConflictError as e:
+            self.db.session.rollback()
+            logger.warning(f"Not saving workflow {wf_id}: {e}")
+            raise
         except Exception as e:
             self.db.session.rollback()
             logger.error(f"Error updating workflow {wf_id}: {e}", exc_info=True)
             raise
 
+    def _bump_version(self, wf_id, workflow):
+        """
+        Increments _workflow.version if it still holds the version the workflow was loaded with
+        (UPDATE ... WHERE version = :expected) and returns the new version. Raises
+        WorkflowConflictError if another process saved the workflow in the meantime.
+        The UPDATE also row-locks the workflow until the transaction ends. Does NOT commit.
+        """
+        expected = getattr(workflow, '_persistence_version', None)
+        stmt = update(Workflow).where(Workflow.id == wf_id)
+        if expected is not None:
+            stmt = stmt.where(Workflow.version == expected)
+        new_version = self.db.session.execute(
+            stmt.values(version=Workflow.version + 1)
+            .returning(Workflow.version)
+            .execution_options(synchronize_session=False)
+        ).scalar()
+        if new_version is None:
+            raise WorkflowConflictError(wf_id, expected)
+        return new_version
+
+    def migrate_workflow(self, workflow, wf_id, spec_id, previous_subprocess_ids=(), commit=True):
+        """
+        Stores a workflow that was migrated to spec_id in place: the workflow, its subprocesses
+        and their tasks keep their ids, so UserWorkflow.workflow_id stays valid.
+        previous_subprocess_ids are the subprocess ids before the migration; records of
+        subprocesses the migration removed are deleted.
+        With commit=False the caller owns the transaction (and the rollback on error).
+        """
+        wf_id = UUID(str(wf_id)) if not isinstance(wf_id, UUID) else wf_id
+        try:
+            wf_obj = Workflow.query.get(wf_id)
+            if not wf_obj:
+                raise ValueError(f"Workflow with id {wf_id} not found for migration.")
+            spec_obj = WorkflowSpec.query.get(spec_id)
+            if not spec_obj:
+                raise ValueError(f"WorkflowSpec with id {spec_id} not found.")
+            new_version = self._bump_version(wf_id, workflow)
+            wf_obj.workflow_spec_id = spec_obj.id
+            self._rewrite_serialization(wf_obj, self.to_dict(workflow))
+            self._write_message_subscriptions(wf_id, workflow)
+
+            current_ids = {UUID(str(sp_id)) for sp_id in workflow.subprocesses}
+            removed_ids = {UUID(str(sp_id)) for sp_id in previous_subprocess_ids} - current_ids
+            if removed_ids:
+                Workflow.query.filter(Workflow.id.in_(removed_ids)).delete(synchronize_session=False)
+            if workflow.subprocesses:
+                child_spec_map = {
+                    dep.child_spec.name: dep.child_id
+                    for dep in spec_obj.child_dependencies.all() if dep.child_spec
+                }
+                existing_sp_map = {rec.id: rec for rec in Workflow.query.filter(Workflow.id.in_(current_ids))}
+                for sp_task_id, sp_workflow in workflow.subprocesses.items():
+                    sp_id = UUID(str(sp_task_id))
+                    sp_spec_id = child_spec_map.get(sp_workflow.spec.name)
+                    if sp_spec_id is None:
+                        raise ValueError(f"Cannot find spec dependency for subprocess spec name '{sp_workflow.spec.name}'")
+                    sp_dct = self.to_dict(sp_workflow)
+                    if sp_id in existing_sp_map:
+                        existing_sp_map[sp_id].workflow_spec_id = sp_spec_id
+                        self._rewrite_serialization(existing_sp_map[sp_id], sp_dct, top=False)
+                    else:
+                        sp_wf = Workflow(id=sp_id, workflow_spec_id=sp_spec_id)
+                        self.db.session.add(sp_wf)
+                        self._store_serialization(sp_wf, sp_dct, new=True, top=False)
+
+            self.db.session.execute(
+                update(Instance)
+                .where(Instance.id == wf_id)
+                .values(spec_name=spec_obj.name, spec_version=spec_obj.version)
+                .execution_options(synchronize_session=False)
+            )
+            self._write_status_projection(wf_id, StatusProjection.from_workflow(workflow))
+            if commit:
+                self.db.session.commit()
+                logger.info(f"Committed migration of Workflow ID: {wf_id} to spec {spec_id}")
+            else:
+                self.db.session.flush()
+            workflow._persistence_version = new_version
+        except Exception as e:
+            if commit:
+                self.db.session.rollback()
+            logger.error(f"Error migrating workflow {wf_id} to spec {spec_id}: {e}", exc_info=True)
+            raise
+
+    def _rewrite_serialization(self, wf_record, dct, top=True):
+        """
+        Like _store_serialization, but rewrites every task row in delta mode, so the stored
+        tasks are exactly those of the migrated workflow.
+        """
+        if self.persistence == PERSISTENCE_DELTA:
+            Task.query.filter(Task.workflow_id == wf_record.id).delete(synchronize_session=False)
+        self._store_serialization(wf_record, dct, top=top)
+
+    # --- Status Projection ---
+
+    def _write_status_projection(self, wf_id, projection):
+        """
+        Writes a StatusProjection to instance and userworkflows with a single statement
+        (the instance UPDATE runs as a data-modifying CTE). Does NOT commit.
+        """
+        if projection.completed:
+            if projection.success:
+                new_status = UserWorkflowStatusEnum.FAILED if projection.failed_end else UserWorkflowStatusEnum.COMPLETED
+                keep_statuses = []
+            else:
+                new_status = UserWorkflowStatusEnum.FAILED
+                keep_statuses = [UserWorkflowStatusEnum.TERMINATED]
+        else:
+            new_status = UserWorkflowStatusEnum.RUNNING
+            # Do not move a workflow out of a terminal state
+            keep_statuses = [
+                UserWorkflowStatusEnum.TERMINATED,
+                UserWorkflowStatusEnum.FAILED,
+                UserWorkflowStatusEnum.CANCELLED,
+                UserWorkflowStatusEnum.DELETED,
+            ]
+        kept = UserWorkflow.workflow_status.in_(keep_statuses) if keep_statuses else false()
+
+        instance_update = (
+            update(Instance)
+            .where(Instance.id == wf_id)
+            .values(
+                active_tasks=projection.ready_count,
+                next_wakeup=projection.next_wakeup,
+                ended=func.coalesce(Instance.ended, func.now()) if projection.completed else None,
+            )
+            .returning(Instance.id)
+            .cte('instance_update')
+        )
+        stmt = (
+            update(UserWorkflow)
+            .where(UserWorkflow.workflow_id == str(wf_id))
+            .values(
+                workflow_status=case((kept, UserWorkflow.workflow_status), else_=literal(new_status, UserWorkflow.workflow_status.type)),
+                # Active tasks are cleared on completion and only refreshed while running
+                active_tasks=[] if projection.completed else case(
+                    (kept, UserWorkflow.active_tasks), else_=literal(projection.active_tasks, UserWorkflow.active_tasks.type)
+                ),
+            )
+            .returning(UserWorkflow.id)
+            .add_cte(instance_update)
+            .execution_options(synchronize_session=False)
+        )
+        if self.db.session.execute(stmt).first() is None:
+            logger.warning(f"UserWorkflow record for workflow_id {wf_id} not found during update.")
+        logger.debug(
+            f"Status projection for {wf_id}: ready={projection.ready_count}, completed={projection.completed}, "
+            f"failed_end={projection.failed_end}, next_wakeup={projection.next_wakeup}"
+        )
+
+    # --- Message Correlation Index ---
+
+    def _message_subscriptions(self, workflow):
+        """Returns {message name: correlations} for the messages the workflow is waiting on."""
+        subscriptions = {}
+        for event in workflow.waiting_events():
+            if not event.event_type.endswith('MessageEventDefinition'):
+                continue
+            # event.value holds the catch event's correlation properties; without any, every message matches
+            subscriptions[event.name] = dict(event.correlations) if event.value else {}
+        return subscriptions
+
+    def _write_message_subscriptions(self, wf_id, workflow):
+        """Brings _message_subscription in line with the workflow's waiting message events. Does NOT commit."""
+        wanted = self._message_subscriptions(workflow)
+        stored = {
+            row.message_name: row.correlations
+            for row in MessageSubscription.query.filter_by(workflow_id=wf_id)
+        }
+        removed = [name for name in stored if name not in wanted]
+        if removed:
+            MessageSubscription.query.filter(
+                MessageSubscription.workflow_id == wf_id, MessageSubscription.message_name.in_(removed)
+            ).delete(synchronize_session=False)
+        changed = [
+            {'workflow_id': wf_id, 'message_name': name, 'correlations': correlations}
+            for name, correlations in wanted.items() if stored.get(name) != correlations
+        ]
+        if changed:
+            stmt = pg_insert(MessageSubscription).values(changed)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[MessageSubscription.workflow_id, MessageSubscription.message_name],
+                set_={'correlations': stmt.excluded.correlations}
+            )
+            self.db.session.execute(stmt)
+
+    def find_message_subscribers(self, message_name, correlations=None):
+        """
+        Returns the ids of workflows waiting on message_name whose correlations match.
+        correlations uses SpiffWorkflow's {key: {property: value}} shape; a workflow matches if it
+        has not been correlated yet or if any of the given keys equals its own.
+        Without correlations every waiting workflow is returned.
+        """
+        query = self.db.session.query(MessageSubscription.workflow_id).filter(
+            MessageSubscription.message_name == message_name
+        )
+        if correlations:
+            query = query.filter(or_(
+                MessageSubscription.correlations == {},
+                *[MessageSubscription.correlations.contains({key: value}) for key, value in correlations.items()]
+            ))
+        return [row.workflow_id for row in query.all()]
+
+    # --- Email Outbox ---
+
+    def _outbox_emails(self, wf_id, workflow):
+        """Returns email_outbox rows for the workflow's completed send tasks that carry an outbox email."""
+        rows = []
+        for task in workflow.get_tasks(state=TaskState.COMPLETED, spec_class=SendTask):
+            email = task.data.get(OUTBOX_EMAIL_VARIABLE)
+            if not email:
+                continue
+            if not isinstance(email, dict) or not email.get('to'):
+                raise ValueError(
+                    f"Send task '{task.task_spec.name}' of workflow {wf_id} has no recipient in '{OUTBOX_EMAIL_VARIABLE}'"
+                )
+            rows.append({
+                'workflow_id': wf_id,
+                'task_id': task.id,
+                'to_email': email['to'],
+                'subject': email.get('subject') or '',
+                'body': email.get('body') or '',
+                'completion_message': email.get('completion_message'),
+            })
+        return rows
+
+    def _write_outbox_emails(self, wf_id, workflow):
+        """
+        Queues the emails of completed send tasks. A send task's email is queued once: later saves
+        of the workflow find its row by (workflow_id, task_id) and leave it alone. Does NOT commit.
+        """
+        rows = self._outbox_emails(wf_id, workflow)
+        if rows:
+            stmt = pg_insert(OutboxEmail).values(rows).on_conflict_do_nothing(
+                index_elements=[OutboxEmail.workflow_id, OutboxEmail.task_id]
+            )
+            result = self.db.session.execute(stmt)
+            if result.rowcount:
+                logger.info(f"Queued {result.rowcount} email(s) for workflow {wf_id} in the outbox.")
+
+    # --- Delta Persistence Helpers ---
+
+    def _store_serialization(self, wf_record, dct, new=False, top=True):
+        """
+        Writes a workflow dict to its Workflow record.
+        In delta mode, tasks and workflow data are split out into their own tables and only
+        rows that changed since the last save are written (mirrors the SQLite update_workflow trigger).
+        Does NOT commit the session.
+        """
+        if self.persistence != PERSISTENCE_DELTA:
+            self._set_document(wf_record, dct)
+            return
+
+        tasks, data = self._split_serialization(wf_record, dct, top)
+        # The workflow row has to exist before task rows can reference it
+        self.db.session.flush()
+
+        self._write_task_delta(wf_record.id, tasks, new)
+        self._write_workflow_data_delta(wf_record.id, data, new)
+
+    def _store_new_serializations(self, pending):
+        """
+        Adds new Workflow records and writes their dicts, given as (record, dct, top) tuples.
+        In delta mode the task, task data and workflow data rows of all records are
+        inserted with one statement per table. Does NOT commit the session.
+        """
+        if self.persistence != PERSISTENCE_DELTA:
+            for wf_record, dct, _ in pending:
+                self._set_document(wf_record, dct)
+            self.db.session.add_all([wf_record for wf_record, _, _ in pending])
+            return
+
+        task_rows, task_data_rows, data_rows = [], [], []
+        for wf_record, dct, top in pending:
+            tasks, data = self._split_serialization(wf_record, dct, top)
+            for task_id, task_dct in tasks.items():
+                task_uuid = UUID(task_id)
+                task_data = task_dct.pop('data', {})
+                task_rows.append({'id': task_uuid, 'workflow_id': wf_record.id, 'serialization': task_dct})
+                task_data_rows.extend(
+                    {'task_id': task_uuid, 'workflow_id': wf_record.id, 'name': name, 'value': value}
+                    for name, value in task_data.items()
+                )
+            data_rows.extend(
+                {'workflow_id': wf_record.id, 'name': name, 'value': value}
+                for name, value in data.items()
+            )
+        self.db.session.add_all([wf_record for wf_record, _, _ in pending])
+        # The workflow rows have to exist before task rows can reference them
+        self.db.session.flush()
+
+        if task_rows:
+            self.db.session.execute(insert(Task), task_rows)
+        if task_data_rows:
+            self.db.session.execute(insert(TaskData), task_data_rows)
+        if data_rows:
+            self.db.session.execute(insert(WorkflowData), data_rows)
+
+    def _split_serialization(self, wf_record, dct, top):
+        """Pops tasks and data off a workflow dict and stores the remaining skeleton on the record."""
+        tasks = dct.pop('tasks', {})
+        data = dct.pop('data', {})
+        if top:
+            # The specs already live in _workflow_spec and subprocesses have their own records
+            dct.pop('spec', None)
+            dct.pop('subprocess_specs', None)
+            dct['subprocesses'] = {}
+        self._set_document(wf_record, dct)
+        return tasks, data
+
+    def _set_document(self, wf_record, dct):
+        """Stores dct on the record in the configured storage format, leaving it untouched if unchanged."""
+        if self.storage == STORAGE_BINARY:
+            encoded = self.binary_format.dumps(dct)
+            if wf_record.serialization_bin != encoded:
+                wf_record.serialization_bin = encoded
+            if wf_record.serialization is not None:
+                wf_record.serialization = None
+        else:
+            if wf_record.serialization != dct:
+                wf_record.serialization = dct
+            if wf_record.serialization_bin is not None:
+                wf_record.serialization_bin = None
+
+    def _get_document(self, wf_record):
+        """Returns a copy of the record's stored dict, whichever format it was written in."""
+        if wf_record.serialization_bin is not None:
+            return self.binary_format.loads(wf_record.serialization_bin)
+        return dict(wf_record.serialization)
+
+    def _write_task_delta(self, wf_id, tasks, new):
+        """
+        Inserts new tasks, rewrites tasks whose dict changed and deletes removed ones.
+        Tasks are compared as a whole, not by last_state_change: a task can change without
+        changing state (e.g. a waiting cycle timer counts down its cycles in internal_data).
+        A task's data rows are rewritten along with it.
+        """
+        stored = {}
+        if not new:
+            rows = self.db.session.query(Task.id, Task.serialization).filter(Task.workflow_id == wf_id).all()
+            stored = {task_id: serialization for task_id, serialization in rows}
+
+        inserts, updates, changed_ids, data_rows = [], [], [], []
+        for task_id, task_dct in tasks.items():
+            task_uuid = UUID(task_id)
+            task_data = task_dct.pop('data', {})
+            if task_uuid not in stored:
+                inserts.append({'id': task_uuid, 'workflow_id': wf_id, 'serialization': task_dct})
+            elif task_dct != stored[task_uuid]:
+                updates.append({'id': task_uuid, 'serialization': task_dct})
+                changed_ids.append(task_uuid)
+            else:
+                continue
+            data_rows.extend(
+                {'task_id': task_uuid, 'workflow_id': wf_id, 'name': name, 'value': value}
+                for name, value in task_data.items()
+            )
+
+        removed = set(stored) - {UUID(task_id) for task_id in tasks}
+        if removed:
+            # _task_data rows go with them via ON DELETE CASCADE
+            Task.query.filter(Task.id.in_(removed)).delete(synchronize_session=False)
+        if changed_ids:
+            TaskData.query.filter(TaskData.task_id.in_(changed_ids)).delete(synchronize_session=False)
+        if inserts:
+            self.db.session.execute(insert(Task), inserts)
+        if updates:
+            self.db.session.execute(update(Task), updates)
+        if data_rows:
+            self.db.session.execute(insert(TaskData), data_rows)
+        logger.debug(
+            f"Task delta for workflow {wf_id}: {len(inserts)} inserted, {len(updates)} updated, {len(removed)} removed."
+        )
+
+    def _write_workflow_data_delta(self, wf_id, data, new):
+        """Upserts workflow data keys whose value changed and deletes keys that were removed."""
+        stored = {}
+        if not new:
+            stored = {row.name: row.value for row in WorkflowData.query.filter_by(workflow_id=wf_id)}
+
+        changed = [
+            {'workflow_id': wf_id, 'name': name, 'value': value}
+            for name, value in data.items() if name not in stored or stored[name] != value
+        ]
+        removed = [name for name in stored if name not in data]
+        if removed:
+            WorkflowData.query.filter(
+                WorkflowData.workflow_id == wf_id, WorkflowData.name.in_(removed)
+            ).delete(synchronize_session=False)
+        if changed:
+            stmt = pg_insert(WorkflowData).values(changed)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[WorkflowData.workflow_id, WorkflowData.name],
+                set_={'value': stmt.excluded.value, 'last_updated': func.now()}
+            )
+            self.db.session.execute(stmt)
+
+    def _load_serialization(self, wf_record, top=True, spec_entry=None):
+        """
+        Returns the full workflow dict for a record, reassembling it from the task and
+        data tables if it was written in delta mode.
+        If spec_entry (spec, subprocess_specs) is given, the restored specs are used in place
+        of their serializations; the registry passes already restored objects through.
+        """
+        dct = self._get_document(wf_record)
+        if top and spec_entry is not None:
+            dct['spec'], dct['subprocess_specs'] = spec_entry[0], dict(spec_entry[1])
+        if 'tasks' in dct:
+            # Written in document mode
+            dct['tasks'] = self._tasks_in_tree_order(dct['tasks'], dct.get('root'))
+            return dct
+
+        task_data = {}
+        for row in TaskData.query.filter_by(workflow_id=wf_record.id):
+            task_data.setdefault(row.task_id, {})[row.name] = row.value
+        tasks = {}
+        for task in Task.query.filter_by(workflow_id=wf_record.id):
+            task_dct = dict(task.serialization)
+            task_dct['data'] = task_data.get(task.id, {})
+            tasks[task_dct['id']] = task_dct
+        dct['tasks'] = self._tasks_in_tree_order(tasks, dct.get('root'))
+        dct['data'] = {row.name: row.value for row in WorkflowData.query.filter_by(workflow_id=wf_record.id)}
+
+        if top and 'spec' not in dct:
+            spec_obj = wf_record.workflow_spec
+            dct['spec'] = spec_obj.serialization
+            dct['subprocess_specs'] = {
+                dep.child_spec.serialization['name']: dep.child_spec.serialization
+                for dep in spec_obj.child_dependencies.all()
+                if dep.child_spec and 'name' in dep.child_spec.serialization
+            }
+        return dct
+
+    @staticmethod
+    def _tasks_in_tree_order(tasks, root_id):
+        """
+        Returns the task dicts with every parent before its children. Spiff rebuilds a task's
+        data from its parent's, which only works if the parent was restored first, and
+        neither JSONB keys nor task rows keep the order the tasks were serialized in.
+        """
+        ordered = {}
+        pending = [root_id] if root_id in tasks else []
+        while pending:
+            task_id = pending.pop()
+            ordered[task_id] = tasks[task_id]
+            pending.extend(reversed([child for child in tasks[task_id]['children'] if child in tasks]))
+        # Tasks not reachable from the root (should not happen) keep their place at the end
+        for task_id, task_dct in tasks.items():
+            ordered.setdefault(task_id, task_dct)
+        return ordered
+
     def list_workflows(self, include_completed=False):
         """Lists workflow instances."""
         try:
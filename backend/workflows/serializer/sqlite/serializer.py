@@ -1,4 +1,4 @@
-import sqlite3, json
+import sqlite3
 import os
 import logging
 from uuid import uuid4, UUID
@@ -8,6 +8,8 @@ from SpiffWorkflow.bpmn.serializer.default.workflow import BpmnWorkflowConverter
 from SpiffWorkflow.bpmn.serializer.default.process_spec import BpmnProcessSpecConverter
 from SpiffWorkflow.bpmn.specs.mixins.subworkflow_task import SubWorkflowTask
 
+from ..codec import get_codec
+
 logger = logging.getLogger(__name__)
 
 class WorkflowConverter(BpmnWorkflowConverter):
@@ -42,11 +44,13 @@ class SqliteSerializer(BpmnWorkflowSerializer):
             db.executescript(fh.read())
             db.commit()
 
-    def __init__(self, dbname, **kwargs):
+    def __init__(self, dbname, codec=None, **kwargs):
         super().__init__(**kwargs)
         self.dbname = dbname
+        self.codec = codec or get_codec()
 
-    def create_workflow_spec(self, spec, dependencies):
+    def create_workflow_spec(self, spec, dependencies, content_hash=None):
+        # content_hash is not stored; only the SQL serializer keeps a spec registry
         spec_id, new = self.execute(self._create_workflow_spec, spec)
         if new and len(dependencies) > 0:
             pairs = self.get_spec_dependencies(spec_id, spec, dependencies)
@@ -208,8 +212,8 @@ class SqliteSerializer(BpmnWorkflowSerializer):
         conn.execute("pragma foreign_keys=on")
         sqlite3.register_adapter(UUID, lambda v: str(v))
         sqlite3.register_converter("uuid", lambda s: UUID(s.decode('utf-8')))
-        sqlite3.register_adapter(dict, lambda v: json.dumps(v))
-        sqlite3.register_converter("json", lambda s: json.loads(s))
+        sqlite3.register_adapter(dict, self.codec.dumps)
+        sqlite3.register_converter("json", self.codec.loads)
         
         cursor = conn.cursor()
         try: